@@ -1,6 +1,7 @@
 import argparse
+import pandas as pd
 
-from utils import experiments, downloader, evaluater, traverser, to_dataframe, trainer
+from utils import dedup, experiments, downloader, evaluater, traverser, to_dataframe, trainer
 from utils.sample import hello_world  # import of module from subfolder
 
 
@@ -63,6 +64,70 @@ if __name__ == "__main__":
         action="store_true",
         help="Use random deletion during --create_h5",
     )
+    parser.add_argument(
+        "--artifact_quota",
+        dest="artifact_quota",
+        action="store",
+        type=float,
+        help="Disk quota in GB of all datasets created with --create_h5. Least recently used datasets are removed when it is exceeded (default: 20)",
+    )
+    parser.add_argument(
+        "--language_threshold",
+        dest="language_threshold",
+        action="store",
+        type=float,
+        help="Drop rows during --create_h5 that are detected as German with a lower probability (e.g. 0.9), such as untranslated or empty texts",
+    )
+    parser.add_argument(
+        "--near_duplicates",
+        dest="near_duplicates",
+        action="store",
+        help="Find near-duplicate texts during --create_h5 with MinHash LSH. Options: 'drop' (keep the first row of every group), 'group' (keep near-duplicates in the same train/test split)",
+    )
+    parser.add_argument(
+        "--dedup_threshold",
+        dest="dedup_threshold",
+        action="store",
+        type=float,
+        help="Minimal Jaccard similarity of near-duplicate texts (default: 0.8)",
+    )
+    parser.add_argument(
+        "--leakage_report",
+        dest="leakage_report",
+        action="store_true",
+        help="Report test rows of the dataset given by --filename with a near-duplicate in the train set",
+    )
+    parser.add_argument(
+        "--virtual_augmentation",
+        dest="virtual_augmentation",
+        action="store_true",
+        help="With --random_swap/--random_deletion: store only the original rows in --create_h5, the swapped/deleted variants are generated on the fly per epoch during training",
+    )
+    parser.add_argument(
+        "--streaming",
+        dest="streaming",
+        action="store_true",
+        help="Create the dataset of --create_h5 in streaming mode: rows are processed in chunks by concurrent stages and appended to the .h5 file, so memory does not grow with the dataset size",
+    )
+    parser.add_argument(
+        "--num_shards",
+        dest="num_shards",
+        action="store",
+        type=int,
+        help="Write the dataset created with --create_h5 as NUM_SHARDS balanced shards, so downstream jobs can process the shards in parallel",
+    )
+    parser.add_argument(
+        "--append_rows",
+        dest="append_rows",
+        action="store",
+        help="Append the rows of a csv file (columns raw_text, rating, source) to the dataset given by --filename. Only the new rows are preprocessed, with the options the dataset was created with",
+    )
+    parser.add_argument(
+        "--convert_to_parquet",
+        dest="convert_to_parquet",
+        action="store_true",
+        help="Convert the h5 file given by --filename to the columnar parquet format",
+    )
     parser.add_argument(
         "--filename",
         dest="filename",
@@ -94,6 +159,12 @@ if __name__ == "__main__":
         action="store",
         help="Specify which vectorizer method to use. Options: 'tfidf', 'count', 'hash', 'word2vec', 'pretrained_word2vec'",
     )
+    parser.add_argument(
+        "--out_of_core",
+        dest="out_of_core",
+        action="store_true",
+        help="Stream the dataset in chunks through the hashing vectorizer into an SGD regression (--vectorizer hash, --method 'linear', 'lasso', 'ridge' or 'elastic-net')",
+    )
     parser.add_argument(
         "--method",
         dest="method",
@@ -147,12 +218,23 @@ if __name__ == "__main__":
         stem=False,
         swap=False,
         delete=False,
+        artifact_quota=20,
+        num_shards=None,
+        streaming=False,
+        virtual_augmentation=False,
+        language_threshold=None,
+        near_duplicates=None,
+        dedup_threshold=0.8,
+        leakage_report=False,
+        append_rows=None,
+        convert_to_parquet=False,
         filename=None,
         search=None,
         experiment=None,
         extra_feat=False,
         vectorizer=None,
         method=None,
+        out_of_core=False,
         save_name=None,
         conditional=False,
         pretask=[None, None],
@@ -198,8 +280,32 @@ if __name__ == "__main__":
             args.swap,
             args.delete,
             0.2,
+            quota=int(args.artifact_quota * 1024 ** 3),
+            num_shards=args.num_shards,
+            streaming=args.streaming,
+            virtual_augmentation=args.virtual_augmentation,
+            near_duplicates=args.near_duplicates,
+            dedup_threshold=args.dedup_threshold,
+            language_threshold=args.language_threshold,
+        )
+
+    # check for near-duplicates shared by train and test set
+    if args.leakage_report:
+        df_train, df_test = to_dataframe.read_augmented_h5(
+            args.filename, columns=["raw_text"]
+        )
+        dedup.leakage_report(
+            df_train["raw_text"], df_test["raw_text"], args.dedup_threshold
         )
 
+    # append new rows to an existing dataset
+    if args.append_rows is not None:
+        to_dataframe.append_new_rows(args.filename, pd.read_csv(args.append_rows))
+
+    # convert h5 file to parquet
+    if args.convert_to_parquet:
+        to_dataframe.convert_augmented_h5(args.filename)
+
     # hyperparameter search
     if args.search is not None:
         traverser.traverser(*args.search)
@@ -212,9 +318,18 @@ if __name__ == "__main__":
             experiments.benchmark_all(args.filename, True)
         # evaluate a regression method with a vectorization method
         if args.experiment == "evaluate":
-            MSE, RMSE, MAE, r_square = evaluater.evaluate_baseline(
-                args.vectorizer, args.method, args.filename, args.extra_feat
-            )
+            if args.out_of_core:
+                if args.vectorizer != "hash":
+                    raise ValueError(
+                        "--out_of_core is only available for the 'hash' vectorizer"
+                    )
+                MSE, RMSE, MAE, r_square = evaluater.evaluate_streamed(
+                    args.method, args.filename, args.extra_feat
+                )
+            else:
+                MSE, RMSE, MAE, r_square = evaluater.evaluate_baseline(
+                    args.vectorizer, args.method, args.filename, args.extra_feat
+                )
             print("MSE:", MSE)
             print("RMSE:", RMSE)
             print("MAE:", MAE)
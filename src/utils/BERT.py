@@ -10,6 +10,30 @@ import torch
 import numpy as np
 
 
+def encode_sentence(tokenizer, sentence):
+    """Prepare a single sentence for BERT input
+
+    Args:
+        tokenizer (BertTokenizer): BERT tokenizer
+        sentence (str): sentence to prepare for BERT input
+
+    Return:
+        input_tensor (pytorch tensor): BERT vocabulary indices of the sentence (1, 512)
+        segment_tensor (pytorch tensor): segment IDs of the sentence (1, 512)
+    """
+    # add special tokens + padding/truncated to token length of 512 + create segment ID + cast to PyTorch tensor
+    encoding = tokenizer.encode_plus(
+        sentence,
+        add_special_tokens=True,
+        max_length=512,
+        padding="max_length",
+        truncation=True,
+        return_attention_mask=True,
+        return_tensors="pt",
+    )
+    return encoding["input_ids"], encoding["attention_mask"]
+
+
 class BERT:
     def __init__(self):
         """BERT wrapper class
@@ -43,19 +67,10 @@ class BERT:
         input_lst = []
         segment_lst = []
 
-        # add special tokens + padding/truncated to token length of 512 + create segment ID + cast to PyTorch tensor
         for sentence in sentences:
-            encoding = self.tokenizer.encode_plus(
-                sentence,
-                add_special_tokens=True,
-                max_length=512,
-                padding="max_length",
-                truncation=True,
-                return_attention_mask=True,
-                return_tensors="pt",
-            )
-            input_lst.append(encoding["input_ids"])
-            segment_lst.append(encoding["attention_mask"])
+            input_tensor, segment_tensor = encode_sentence(self.tokenizer, sentence)
+            input_lst.append(input_tensor)
+            segment_lst.append(segment_tensor)
 
         # cast list to PyTorch tensor
         input_tensor = torch.cat(input_lst, dim=0)
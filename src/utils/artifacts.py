@@ -0,0 +1,214 @@
+import hashlib
+import json
+import os
+import shutil
+import time
+from os.path import abspath, dirname, exists, isdir, join
+
+from utils import cache
+
+
+# folder of the preprocessed datasets
+ARTIFACT_PATH = join(dirname(dirname(dirname(abspath(__file__)))), "data", "artifacts")
+
+# default disk quota of all artifacts (in bytes)
+DEFAULT_QUOTA = 20 * 1024 ** 3
+
+
+def artifact_key(source_paths, options, code_paths):
+    """Return the content address of a preprocessed dataset.
+
+    Args:
+        source_paths (list): files/folders of the source datasets
+        options (dict): preprocessing options (datasets, augmentation, test size, ...)
+        code_paths (list): source files of the preprocessing code
+
+    Return:
+        key (str): hex digest identifying the dataset
+    """
+    description = {
+        "sources": cache.checksum(source_paths),
+        "options": options,
+        "code": cache.checksum(code_paths),
+    }
+    return hashlib.sha1(
+        json.dumps(description, sort_keys=True).encode("utf-8")
+    ).hexdigest()[:20]
+
+
+def appended_key(path, row_hashes):
+    """Return the content address of an artifact after rows were appended to it.
+
+    Args:
+        path (str): path of the artifact before appending
+        row_hashes (list): row hashes of the appended rows
+
+    Return:
+        key (str): hex digest identifying the modified dataset
+    """
+    digest = hashlib.sha1(os.path.basename(path.rstrip("/\\")).encode("utf-8"))
+    for row_hash in row_hashes:
+        digest.update(str(row_hash).encode("ascii"))
+    return digest.hexdigest()[:20]
+
+
+class ArtifactStore:
+    def __init__(self, path=ARTIFACT_PATH, quota=DEFAULT_QUOTA):
+        """Content-addressed store of preprocessed datasets.
+
+        Every artifact is saved under its key (see artifact_key) in data/artifacts.
+        Filenames given by the user (e.g. --filename example.h5) are aliases of keys.
+        index.json keeps track of the artifacts, their size and last access time,
+        least recently used artifacts are evicted when the quota is exceeded.
+
+        Args:
+            path (str, optional): folder of the artifacts. Defaults to data/artifacts.
+            quota (int, optional): disk quota in bytes. Defaults to 20 GB.
+        """
+        self.path = path
+        self.quota = quota
+        self.index_path = join(path, "index.json")
+
+    def artifact_path(self, key, extension=".h5"):
+        """Path under which the artifact with the given key is stored."""
+        if not exists(self.path):
+            os.makedirs(self.path)
+        return join(self.path, key + extension)
+
+    def lookup(self, key):
+        """Return the path of an existing artifact (and mark it as used), None if it does not exist."""
+        index = self._load_index()
+        entry = index["artifacts"].get(key)
+        if entry is None or not exists(join(self.path, entry["file"])):
+            return None
+
+        entry["last_access"] = time.time()
+        self._save_index(index)
+        return join(self.path, entry["file"])
+
+    def add(self, key, path, options=None):
+        """Register an artifact written to path (see artifact_path)."""
+        index = self._load_index()
+        index["artifacts"][key] = {
+            "file": os.path.relpath(path, self.path),
+            "size": _size(path),
+            "last_access": time.time(),
+            "options": options,
+        }
+        self._save_index(index)
+
+    def alias(self, filename, key):
+        """Let filename resolve to the artifact with the given key."""
+        index = self._load_index()
+        index["aliases"][filename] = key
+        self._save_index(index)
+
+    def resolve(self, filename):
+        """Return the artifact path filename is an alias of, None if filename is no alias."""
+        key = self._load_index()["aliases"].get(filename)
+        if key is None:
+            return None
+        return self.lookup(key)
+
+    def rekey(self, filename, key, options=None):
+        """Move the artifact filename is an alias of to a new key.
+
+        Used after an artifact was modified in place (e.g. rows were appended),
+        so its old key no longer resolves to the modified content.
+
+        Args:
+            filename (str): alias of the artifact
+            key (str): new key of the artifact
+            options (dict, optional): new preprocessing options. Defaults to None (keep the options).
+
+        Return:
+            path (str): new path of the artifact, None if filename is no alias
+        """
+        index = self._load_index()
+        old_key = index["aliases"].get(filename)
+        if old_key is None or old_key not in index["artifacts"]:
+            return None
+
+        entry = index["artifacts"].pop(old_key)
+        extension = entry["file"][len(old_key) :]
+        path = join(self.path, key + extension)
+        os.replace(join(self.path, entry["file"]), path)
+
+        entry["file"] = key + extension
+        entry["size"] = _size(path)
+        entry["last_access"] = time.time()
+        if options is not None:
+            entry["options"] = options
+        index["artifacts"][key] = entry
+        index["aliases"] = {
+            alias: key if alias_key == old_key else alias_key
+            for alias, alias_key in index["aliases"].items()
+        }
+        self._save_index(index)
+
+        return path
+
+    def evict(self, quota=None):
+        """Remove least recently used artifacts until their total size fits into quota.
+
+        The most recently used artifact is never removed.
+
+        Args:
+            quota (int, optional): disk quota in bytes. Defaults to the quota of the store.
+        """
+        if quota is None:
+            quota = self.quota
+
+        index = self._load_index()
+        entries = sorted(
+            index["artifacts"].items(), key=lambda item: item[1]["last_access"]
+        )
+        total = sum(entry["size"] for key, entry in entries)
+
+        for key, entry in entries[:-1]:
+            if total <= quota:
+                break
+            print(
+                "Evicting artifact {} ({:.1f} MB)".format(
+                    key, entry["size"] / 1024 ** 2
+                )
+            )
+            path = join(self.path, entry["file"])
+            if isdir(path):
+                shutil.rmtree(path, ignore_errors=True)
+            elif exists(path):
+                os.remove(path)
+            total -= entry["size"]
+            del index["artifacts"][key]
+            index["aliases"] = {
+                filename: alias_key
+                for filename, alias_key in index["aliases"].items()
+                if alias_key != key
+            }
+
+        self._save_index(index)
+
+    def _load_index(self):
+        if not exists(self.index_path):
+            return {"artifacts": {}, "aliases": {}}
+        with open(self.index_path) as file:
+            return json.load(file)
+
+    def _save_index(self, index):
+        if not exists(self.path):
+            os.makedirs(self.path)
+        # write to a temporary file first, so a crash never leaves a broken index
+        with open(self.index_path + ".tmp", "w") as file:
+            json.dump(index, file, indent=2)
+        os.replace(self.index_path + ".tmp", self.index_path)
+
+
+def _size(path):
+    """Size of a file or folder in bytes."""
+    if not isdir(path):
+        return os.path.getsize(path)
+    return sum(
+        os.path.getsize(join(root, filename))
+        for root, dirs, files in os.walk(path)
+        for filename in files
+    )
@@ -0,0 +1,152 @@
+import numpy as np
+from torch.utils.data import Dataset
+
+
+def _augment_count(size, aug_p=0.3, aug_min=1, aug_max=10):
+    """Number of words to augment in a text of size words (like nlpaug)."""
+    count = int(size * aug_p)
+    return min(max(count, aug_min), aug_max, size)
+
+
+def swap_words(text, rng, aug_p=0.3, aug_min=1, aug_max=10):
+    """Swap randomly selected words with one of their neighbours.
+
+    Args:
+        text (str): sentence/document
+        rng (numpy Generator): random number generator
+        aug_p (float, optional): ratio of words to swap. Defaults to 0.3.
+        aug_min (int, optional): minimal number of words to swap. Defaults to 1.
+        aug_max (int, optional): maximal number of words to swap. Defaults to 10.
+
+    Return:
+        text (str): text with swapped words
+    """
+    words = text.split()
+    if len(words) < 2:
+        return text
+
+    count = _augment_count(len(words), aug_p, aug_min, aug_max)
+    for index in rng.choice(len(words), count, replace=False):
+        if index == 0 or (index < len(words) - 1 and rng.random() < 0.5):
+            other = index + 1
+        else:
+            other = index - 1
+        words[index], words[other] = words[other], words[index]
+
+    return " ".join(words)
+
+
+def delete_words(text, rng, aug_p=0.3, aug_min=1, aug_max=10):
+    """Delete randomly selected words (at least one word is kept).
+
+    Args:
+        text (str): sentence/document
+        rng (numpy Generator): random number generator
+        aug_p (float, optional): ratio of words to delete. Defaults to 0.3.
+        aug_min (int, optional): minimal number of words to delete. Defaults to 1.
+        aug_max (int, optional): maximal number of words to delete. Defaults to 10.
+
+    Return:
+        text (str): text without the deleted words
+    """
+    words = text.split()
+    if len(words) < 2:
+        return text
+
+    count = min(_augment_count(len(words), aug_p, aug_min, aug_max), len(words) - 1)
+    keep = np.ones(len(words), dtype=bool)
+    keep[rng.choice(len(words), count, replace=False)] = False
+
+    return " ".join(word for word, kept in zip(words, keep) if kept)
+
+
+class VirtualAugmentation:
+    def __init__(self, swap=False, delete=False, seed=0):
+        """Random word swap/deletion applied when a row is accessed instead of stored copies.
+
+        The stored dataset (create_h5 with --randword_swap/--randword_del) would
+        contain every row in the variants original, swapped, deleted and swapped +
+        deleted. Here every access of a row returns one of these variants, chosen
+        and generated deterministically from seed, epoch and row index. Every
+        epoch therefore sees a different, but reproducible, augmentation while
+        only the original rows are stored, tokenized and embedded.
+
+        Args:
+            swap (bool, optional): randomly swap words. Defaults to False.
+            delete (bool, optional): randomly delete words. Defaults to False.
+            seed (int, optional): seed of the augmentation. Defaults to 0.
+        """
+        self.seed = seed
+        self.variants = [[]]
+        if swap:
+            self.variants.append([swap_words])
+        if delete:
+            self.variants.append([delete_words])
+        if swap and delete:
+            self.variants.append([swap_words, delete_words])
+
+    def augment(self, text, index, epoch=0):
+        """Return the augmented variant of a row for the given epoch.
+
+        Args:
+            text (str): original text of the row
+            index (int): index of the row in the dataset
+            epoch (int, optional): current epoch. Defaults to 0.
+
+        Return:
+            text (str): augmented text
+        """
+        rng = np.random.default_rng([self.seed, epoch, index])
+        for transform in self.variants[rng.integers(len(self.variants))]:
+            text = transform(text, rng)
+        return text
+
+
+class AugmentedTextDataset(Dataset):
+    def __init__(
+        self,
+        texts,
+        tensors,
+        augmentation,
+        encode,
+        epoch=0,
+        augment_texts=None,
+        postprocess=None,
+    ):
+        """PyTorch dataset augmenting and encoding texts when they are accessed.
+
+        Replaces a TensorDataset of pre-encoded texts. Call set_epoch at the
+        beginning of every epoch to draw the augmentation of that epoch
+        (DataLoader workers are started per epoch and see the new epoch).
+
+        Args:
+            texts (array-like): original texts
+            tensors (list): tensors with one row per text (labels, extra features, ...)
+            augmentation (VirtualAugmentation): augmentation applied to the texts
+            encode (function): takes a text and returns its input and segment tensor (e.g. BERT.encode_sentence with the tokenizer bound)
+            epoch (int, optional): current epoch. Defaults to 0.
+            augment_texts (array-like, optional): texts to augment instead of texts, e.g. the texts before lemmatization/stemming. Defaults to None (augment texts).
+            postprocess (function, optional): applied to the augmented texts, e.g. to_dataframe.postprocess_text. Defaults to None.
+        """
+        self.texts = texts
+        self.tensors = tensors
+        self.augmentation = augmentation
+        self.encode = encode
+        self.epoch = epoch
+        self.augment_texts = texts if augment_texts is None else augment_texts
+        self.postprocess = postprocess
+
+    def set_epoch(self, epoch):
+        self.epoch = epoch
+
+    def __len__(self):
+        return len(self.texts)
+
+    def __getitem__(self, index):
+        text = self.augmentation.augment(self.augment_texts[index], index, self.epoch)
+        if self.postprocess is not None:
+            text = self.postprocess(text)
+        input_tensor, segment_tensor = self.encode(text)
+        return (input_tensor[0], segment_tensor[0]) + tuple(
+            tensor[index] for tensor in self.tensors
+        )
@@ -0,0 +1,475 @@
+import functools
+import hashlib
+import json
+import os
+import pickle
+import shutil
+import sqlite3
+import threading
+from os.path import abspath, dirname, exists, isdir, join
+
+import numpy as np
+import pandas as pd
+from scipy.sparse import csr_matrix, issparse
+from utils import split, storage
+
+
+# folder of the preprocessed source datasets
+SOURCE_CACHE_PATH = join(dirname(dirname(dirname(abspath(__file__)))), "data", "cache")
+
+# checksums of files that did not change since they were hashed
+_checksums = {}
+
+
+def file_signature(path):
+    """Return (modification time, size) of a file, or of all files in a folder.
+
+    Args:
+        path (str): path of a file or folder
+
+    Return:
+        signature (tuple): changes whenever the file (or a file in the folder) is modified
+    """
+    if isdir(path):
+        return tuple(
+            (filename,) + file_signature(join(path, filename))
+            for filename in sorted(os.listdir(path))
+        )
+    stat = os.stat(path)
+    return (stat.st_mtime_ns, stat.st_size)
+
+
+def checksum(paths):
+    """Return a SHA-1 checksum over the content of files and folders.
+
+    Folders are hashed recursively including the relative file names.
+    Checksums are remembered as long as modification time and size of a file do not change.
+
+    Args:
+        paths (list): paths of files or folders
+
+    Return:
+        checksum (str): hex digest
+    """
+    digest = hashlib.sha1()
+    for path in paths:
+        if isdir(path):
+            for root, dirs, files in os.walk(path):
+                dirs.sort()
+                for filename in sorted(files):
+                    file_path = join(root, filename)
+                    digest.update(os.path.relpath(file_path, path).encode("utf-8"))
+                    digest.update(_file_checksum(file_path).encode("ascii"))
+        else:
+            digest.update(_file_checksum(path).encode("ascii"))
+
+    return digest.hexdigest()
+
+
+def _file_checksum(path):
+    """SHA-1 checksum of a single file, read in blocks."""
+    signature = (abspath(path),) + file_signature(path)
+    if signature not in _checksums:
+        digest = hashlib.sha1()
+        with open(path, "rb") as file:
+            for block in iter(lambda: file.read(1024 * 1024), b""):
+                digest.update(block)
+        _checksums[signature] = digest.hexdigest()
+    return _checksums[signature]
+
+
+def cached_source(name, version, source_paths):
+    """Decorator caching the dataframe returned by a dataset loader.
+
+    On the first call the loader runs and its result is written as parquet file to
+    data/cache. The cache entry is keyed by the checksum of the source files and the
+    loader version, later calls read the cache entry instead of parsing the sources.
+    Increase version whenever the output of the loader changes.
+
+    Args:
+        name (str): name of the dataset
+        version (int): version of the loader
+        source_paths (function): returns the list of files/folders the loader reads
+
+    Return:
+        decorator (function): wraps a loader without arguments, the wrapped loader
+                              also provides iterate(chunksize) to stream the cache entry
+    """
+
+    def decorator(loader):
+        @functools.wraps(loader)
+        def wrapper():
+            paths = source_paths()
+            if all(exists(path) for path in paths):
+                cache_path = _source_cache_path(name, version, paths)
+                if exists(cache_path):
+                    print("Reading in cached {}".format(name))
+                    return storage.ParquetBackend().read(cache_path, "data")
+
+            df = loader()
+
+            # sources are available now (the loader downloads missing datasets)
+            if all(exists(path) for path in paths):
+                _remove_source_cache(name)
+                storage.ParquetBackend().write(
+                    _source_cache_path(name, version, paths), {"data": df}
+                )
+
+            return df
+
+        def iterate(chunksize=10000):
+            """Iterate over the cached dataframe in chunks of chunksize rows.
+
+            The loader runs once if there is no cache entry yet.
+            """
+            paths = source_paths()
+            if not all(exists(path) for path in paths) or not exists(
+                _source_cache_path(name, version, paths)
+            ):
+                df = wrapper()
+                paths = source_paths()
+                if not all(exists(path) for path in paths):
+                    for start in range(0, len(df), chunksize):
+                        yield df.iloc[start : start + chunksize]
+                    return
+
+            cache_path = _source_cache_path(name, version, paths)
+            backend = storage.ParquetBackend()
+            for chunk in backend.iterate(cache_path, "data", chunksize):
+                yield chunk
+
+        wrapper.iterate = iterate
+        return wrapper
+
+    return decorator
+
+
+def _source_cache_path(name, version, paths):
+    """Path of the cache entry of a dataset loader."""
+    return join(
+        SOURCE_CACHE_PATH,
+        "{}-v{}-{}.parquet".format(name, version, checksum(paths)[:16]),
+    )
+
+
+def _remove_source_cache(name):
+    """Remove outdated cache entries of a dataset loader."""
+    if not exists(SOURCE_CACHE_PATH):
+        return
+    for filename in os.listdir(SOURCE_CACHE_PATH):
+        if filename.startswith(name + "-v"):
+            shutil.rmtree(join(SOURCE_CACHE_PATH, filename), ignore_errors=True)
+
+
+def cached_features(name, texts, compute):
+    """Compute per-row features, reusing features of rows computed before.
+
+    Features are persisted in data/cache/features/<name>.sqlite keyed by the row
+    hash of the text (see split.row_hashes). Rows shared by several dataset
+    variants or experiments are therefore only computed once, compute is only
+    called on unseen texts. Only the rows of texts are read and only new rows are
+    written, so chunked callers (streaming, out-of-core evaluation) need memory
+    and I/O proportional to the chunk, not to the whole store.
+
+    Args:
+        name (str): name of the feature set (e.g. "sentencestats")
+        texts (array-like): sentences/documents
+        compute (function): takes a pandas Series of texts and returns a dataframe with one row per text
+
+    Return:
+        features (pandas dataframe): features of all texts in the order of texts
+    """
+    path = join(SOURCE_CACHE_PATH, "features", name + ".sqlite")
+    if not exists(dirname(path)):
+        os.makedirs(dirname(path))
+    hashes = split.row_hashes(texts)
+
+    # first occurrence of every row hash
+    unique, first = np.unique(hashes.astype(str), return_index=True)
+
+    connection = sqlite3.connect(path, timeout=600)
+    try:
+        features = _select_features(connection, unique)
+        unseen = ~pd.Index(unique).isin(features.index)
+
+        if unseen.any():
+            print("Computing {} features of {} new rows".format(name, unseen.sum()))
+            new = compute(pd.Series(np.asarray(texts, dtype=object)[first[unseen]]))
+            new.index = unique[unseen].astype(object)
+            _insert_features(connection, new)
+            features = new if len(features) == 0 else pd.concat([features, new])
+    finally:
+        connection.close()
+
+    return features.loc[hashes].reset_index(drop=True)
+
+
+def _select_features(connection, hashes):
+    """Read the stored features of the given row hashes (missing rows are left out)."""
+    has_table = connection.execute(
+        "SELECT name FROM sqlite_master WHERE type='table' AND name='columns'"
+    ).fetchone()
+    if has_table is None:
+        return pd.DataFrame(index=pd.Index([], dtype=object))
+
+    dtypes = dict(
+        connection.execute("SELECT name, dtype FROM columns ORDER BY position")
+    )
+    connection.execute(
+        "CREATE TEMP TABLE IF NOT EXISTS wanted (row_hash TEXT PRIMARY KEY)"
+    )
+    connection.execute("DELETE FROM wanted")
+    connection.executemany(
+        "INSERT OR IGNORE INTO wanted VALUES (?)", ((str(h),) for h in hashes)
+    )
+    features = pd.read_sql_query(
+        "SELECT features.* FROM features JOIN wanted USING (row_hash)", connection
+    )
+    features.index = features.pop("row_hash").values.astype(object)
+    return features[list(dtypes)].astype(dtypes)
+
+
+def _insert_features(connection, features):
+    """Store features indexed by row hash, rows stored concurrently by another process are kept."""
+    columns = list(features.columns)
+    quoted = ", ".join('"{}"'.format(column) for column in columns)
+    with connection:
+        connection.execute(
+            "CREATE TABLE IF NOT EXISTS features (row_hash TEXT PRIMARY KEY, {})".format(
+                quoted
+            )
+        )
+        connection.execute(
+            "CREATE TABLE IF NOT EXISTS columns (position INTEGER PRIMARY KEY, name TEXT, dtype TEXT)"
+        )
+        connection.executemany(
+            "INSERT OR IGNORE INTO columns VALUES (?, ?, ?)",
+            [
+                (position, column, str(features[column].dtype))
+                for position, column in enumerate(columns)
+            ],
+        )
+        # tolist converts numpy scalars to python types sqlite can store
+        connection.executemany(
+            "INSERT OR IGNORE INTO features VALUES ({})".format(
+                ", ".join("?" * (len(columns) + 1))
+            ),
+            zip(
+                [str(row_hash) for row_hash in features.index],
+                *[features[column].tolist() for column in columns]
+            ),
+        )
+
+
+def texts_checksum(texts):
+    """Return a SHA-1 checksum over texts (order matters).
+
+    Args:
+        texts (array-like): sentences/documents
+
+    Return:
+        checksum (str): hex digest
+    """
+    digest = hashlib.sha1()
+    for row_hash in split.row_hashes(texts):
+        digest.update(row_hash.encode("ascii"))
+    return digest.hexdigest()
+
+
+def cached_vectorizer(name, texts, params, fit):
+    """Fit a vectorizer, or load the vectorizer and features fitted on the same texts before.
+
+    Entries are persisted in data/cache/vectorizers keyed by the checksum of the
+    training texts, name and params. The fitted vectorizer is pickled, the feature
+    matrix is saved as .npy arrays (data, indices and indptr for sparse matrices)
+    and memory-mapped when it is loaded again. Vectorizers with word vectors
+    (see word2vec.word2vec.save_vectors) save them separately, they are memory-mapped
+    as well. Features that can not be memory-mapped (object arrays) are returned
+    without caching them.
+
+    Args:
+        name (str): name of the vectorizer (e.g. "tfidf")
+        texts (array-like): training sentences/documents
+        params (dict): everything else the fitted vectorizer depends on, including a version of the features (must be JSON serializable, other values are converted with str)
+        fit (function): takes texts and returns features and the fitted vectorizer
+
+    Return:
+        features (scipy sparse matrix (csr) or numpy array): features of texts
+        vectorizer (object): fitted vectorizer, its attribute cache_key_ identifies the entry (see cached_transform)
+    """
+    digest = hashlib.sha1(
+        json.dumps(
+            {"name": name, "params": params}, sort_keys=True, default=str
+        ).encode("utf-8")
+    )
+    digest.update(texts_checksum(texts).encode("ascii"))
+    key = "{}-{}".format(name, digest.hexdigest()[:16])
+    path = join(SOURCE_CACHE_PATH, "vectorizers", key)
+
+    # the pickled vectorizer is written last and marks a complete entry
+    if exists(join(path, "vectorizer.pkl")):
+        print("Reading in cached {} vectorizer".format(name))
+        with open(join(path, "vectorizer.pkl"), "rb") as file:
+            vectorizer = pickle.load(file)
+        if hasattr(vectorizer, "load_vectors"):
+            vectorizer.load_vectors(join(path, "vectors.kv"))
+        return _load_matrix(join(path, "features")), vectorizer
+
+    features, vectorizer = fit(texts)
+    if not _storable(features):
+        return features, vectorizer
+    vectorizer.cache_key_ = key
+
+    if not exists(path):
+        os.makedirs(path)
+    _save_matrix(join(path, "features"), features)
+    if hasattr(vectorizer, "save_vectors"):
+        vectorizer.save_vectors(join(path, "vectors.kv"))
+    with open(join(path, "vectorizer.pkl"), "wb") as file:
+        pickle.dump(vectorizer, file)
+
+    return features, vectorizer
+
+
+def cached_transform(vectorizer, texts, transform):
+    """Transform texts with a vectorizer of cached_vectorizer, reusing earlier results.
+
+    Args:
+        vectorizer (object): fitted vectorizer returned by cached_vectorizer
+        texts (array-like): sentences/documents
+        transform (function): takes texts and returns their features
+
+    Return:
+        features (scipy sparse matrix (csr) or numpy array): features of texts
+    """
+    key = getattr(vectorizer, "cache_key_", None)
+    if key is None:
+        return transform(texts)
+
+    path = join(
+        SOURCE_CACHE_PATH,
+        "vectorizers",
+        key,
+        "transform-{}".format(texts_checksum(texts)[:16]),
+    )
+    if exists(path + ".json"):
+        return _load_matrix(path)
+
+    features = transform(texts)
+    if _storable(features):
+        _save_matrix(path, features)
+    return features
+
+
+def _storable(matrix):
+    """True for sparse matrices and numeric arrays, object arrays (e.g. ragged rows) can not be memory-mapped."""
+    if issparse(matrix):
+        return True
+    try:
+        return np.asarray(matrix).dtype != object
+    except ValueError:
+        # newer numpy versions refuse to build ragged arrays
+        return False
+
+
+def _save_matrix(path, matrix):
+    """Save a CSR matrix or numpy array as .npy files, path.json is written last."""
+    if issparse(matrix):
+        matrix = csr_matrix(matrix)
+        np.save(path + ".data.npy", matrix.data)
+        np.save(path + ".indices.npy", matrix.indices)
+        np.save(path + ".indptr.npy", matrix.indptr)
+        info = {"format": "csr", "shape": list(matrix.shape)}
+    else:
+        np.save(path + ".npy", np.asarray(matrix))
+        info = {"format": "dense"}
+    with open(path + ".json", "w") as file:
+        json.dump(info, file)
+
+
+def _load_matrix(path):
+    """Memory-map a matrix saved by _save_matrix."""
+    with open(path + ".json") as file:
+        info = json.load(file)
+    if info["format"] == "dense":
+        return np.load(path + ".npy", mmap_mode="r")
+    return csr_matrix(
+        (
+            np.load(path + ".data.npy", mmap_mode="r"),
+            np.load(path + ".indices.npy", mmap_mode="r"),
+            np.load(path + ".indptr.npy", mmap_mode="r"),
+        ),
+        shape=tuple(info["shape"]),
+        copy=False,
+    )
+
+
+class DatasetCache:
+    """Process-wide cache of decoded datasets.
+
+    Keeps the dataframes read from a dataset file in memory. An entry is
+    invalidated as soon as modification time or size of the file changes.
+    Hits and misses are counted to check how many reads were saved.
+    """
+
+    def __init__(self):
+        self.hits = 0
+        self.misses = 0
+        self._entries = {}
+        self._lock = threading.Lock()
+
+    def read(self, path, key, columns=None, sources=None, where=None):
+        """Read a dataframe through the storage backend of path, or return the cached copy.
+
+        Args:
+            path (str): path of the dataset file
+            key (str): key of the dataframe (e.g. "train" or "test")
+            columns (list, optional): only read these columns. Defaults to None (all columns).
+            sources (list, optional): only read rows with these source ids. Defaults to None (all rows).
+            where (str, optional): query on the source and rating columns. Defaults to None.
+
+        Return:
+            df (pandas dataframe): shallow copy of the cached dataframe
+        """
+        cache_key = (
+            path,
+            key,
+            None if columns is None else tuple(columns),
+            None if sources is None else tuple(sources),
+            where,
+        )
+        signature = file_signature(path)
+
+        with self._lock:
+            entry = self._entries.get(cache_key)
+            if entry is not None and entry[0] == signature:
+                self.hits += 1
+                return entry[1].copy(deep=False)
+            self.misses += 1
+
+        df = storage.get_backend(path).read(path, key, columns, sources, where)
+
+        with self._lock:
+            self._entries[cache_key] = (signature, df)
+
+        return df.copy(deep=False)
+
+    def info(self):
+        """Return hits, misses and number of cached dataframes."""
+        with self._lock:
+            return {
+                "hits": self.hits,
+                "misses": self.misses,
+                "entries": len(self._entries),
+            }
+
+    def clear(self):
+        """Remove all cached dataframes and reset the counters."""
+        with self._lock:
+            self._entries.clear()
+            self.hits = 0
+            self.misses = 0
+
+
+# cache shared by all readers of the process
+datasets = DatasetCache()
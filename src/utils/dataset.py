@@ -0,0 +1,89 @@
+from utils import storage
+
+
+class LazyDataset:
+    def __init__(self, path, key, sources=None):
+        """Lazy view on a dataframe stored in a dataset file.
+
+        Nothing is read on construction. Columns, row slices and batches are
+        read from the file when they are accessed, so memory only grows with the
+        data that is actually used. Columns accessed by name are kept in memory.
+
+        Args:
+            path (str): path of the dataset file (.h5 or .parquet)
+            key (str): key of the dataframe (e.g. "train" or "test")
+            sources (list, optional): restrict the view to rows of these source ids. Defaults to None (all rows).
+        """
+        self.path = path
+        self.key = key
+        self.sources = None if sources is None else list(sources)
+        self.backend = storage.get_backend(path)
+        self._columns = {}
+        self._len = None
+
+    @property
+    def columns(self):
+        """Column names of the stored dataframe."""
+        return self.backend.columns(self.path, self.key)
+
+    def __len__(self):
+        if self._len is None:
+            self._len = self.backend.nrows(self.path, self.key, self.sources)
+        return self._len
+
+    def __getitem__(self, column):
+        """Return a column as pandas Series (read once, then kept in memory)."""
+        if column not in self._columns:
+            self._columns[column] = self.backend.read(
+                self.path, self.key, [column], self.sources
+            )[column]
+        return self._columns[column]
+
+    def __getattr__(self, column):
+        # allow attribute access to columns like for dataframes (e.g. dataset.raw_text)
+        if column.startswith("_") or column not in self.columns:
+            raise AttributeError(column)
+        return self[column]
+
+    def rows(self, start=None, stop=None, columns=None):
+        """Read the rows start to stop (exclusive) as pandas dataframe.
+
+        Args:
+            start (int, optional): first row. Defaults to None (first row of the view).
+            stop (int, optional): last row (exclusive). Defaults to None (end of the view).
+            columns (list, optional): only read these columns. Defaults to None (all columns).
+
+        Return:
+            df (pandas dataframe): the selected rows
+        """
+        return self.backend.read(
+            self.path, self.key, columns, self.sources, start=start, stop=stop
+        )
+
+    def by_source(self, source):
+        """Return a lazy view restricted to the rows of one or several source ids."""
+        if isinstance(source, (list, tuple)):
+            sources = list(source)
+        else:
+            sources = [source]
+        if self.sources is not None:
+            sources = [s for s in sources if s in self.sources]
+        return LazyDataset(self.path, self.key, sources)
+
+    def iter_batches(self, batch_size=1024, columns=None):
+        """Iterate over the view in batches of pandas dataframes.
+
+        Args:
+            batch_size (int, optional): number of rows per batch. Defaults to 1024.
+            columns (list, optional): only read these columns. Defaults to None (all columns).
+
+        Return:
+            batches (generator): yields pandas dataframes with at most batch_size rows
+        """
+        return self.backend.iterate(
+            self.path, self.key, batch_size, columns, self.sources
+        )
+
+    def to_pandas(self, columns=None):
+        """Materialize the whole view (or some columns) as pandas dataframe."""
+        return self.backend.read(self.path, self.key, columns, self.sources)
@@ -0,0 +1,245 @@
+import numpy as np
+import pandas as pd
+from scipy.sparse import coo_matrix
+from scipy.sparse.csgraph import connected_components
+
+
+# shift of the multiply-shift hash functions (64 bit products, 32 bit hashes)
+_SHIFT = np.uint64(32)
+
+
+class MinHashLSH:
+    def __init__(
+        self, threshold=0.8, num_perm=128, shingle_size=5, seed=0, batch_bytes=32768
+    ):
+        """Near-duplicate detection with MinHash signatures and locality sensitive hashing.
+
+        Texts are split into overlapping character shingles (byte k-grams). Every
+        text gets a MinHash signature of num_perm universal hash functions, the
+        fraction of equal signature entries estimates the Jaccard similarity of
+        two shingle sets. Signatures are cut into bands, texts sharing a band are
+        candidates and candidates with an estimated similarity of at least
+        threshold are near-duplicates. Runtime grows linearly with the number of
+        texts instead of comparing all pairs.
+
+        Texts contained in much longer texts (e.g. a dw paragraph and its article)
+        have a low Jaccard similarity, such texts are grouped by their parent
+        (see groups).
+
+        Args:
+            threshold (float, optional): minimal Jaccard similarity of near-duplicates. Defaults to 0.8.
+            num_perm (int, optional): number of hash functions (signature length). Defaults to 128.
+            shingle_size (int, optional): number of bytes per shingle. Defaults to 5.
+            seed (int, optional): seed of the hash functions. Defaults to 0.
+            batch_bytes (int, optional): number of text bytes hashed at once (small batches stay in the CPU cache). Defaults to 32768.
+        """
+        if not 0 < threshold <= 1:
+            raise ValueError(
+                "threshold {} invalid. Please choose a similarity in (0, 1].".format(
+                    threshold
+                )
+            )
+        self.threshold = threshold
+        self.num_perm = num_perm
+        self.shingle_size = shingle_size
+        self.batch_bytes = batch_bytes
+        self.bands, self.rows = _band_layout(num_perm, threshold)
+
+        # odd multipliers of the multiply-shift hash functions
+        rng = np.random.RandomState(seed)
+        self.a = rng.randint(0, 2 ** 63, size=num_perm, dtype=np.uint64)
+        self.a = self.a * np.uint64(2) + np.uint64(1)
+        self.b = rng.randint(0, 2 ** 63, size=num_perm, dtype=np.uint64)
+
+    def signatures(self, texts):
+        """Compute the MinHash signatures of texts.
+
+        Args:
+            texts (array-like): sentences/documents
+
+        Return:
+            signatures (numpy array): uint32 array of shape (number of texts, num_perm)
+        """
+        k = self.shingle_size
+        signatures = []
+        batch = []
+        size = 0
+        for text in texts:
+            # texts shorter than one shingle are padded to a single shingle
+            batch.append(str(text).encode("utf-8").ljust(k))
+            size += len(batch[-1])
+            if size >= self.batch_bytes:
+                signatures.append(self._batch_signatures(batch))
+                batch = []
+                size = 0
+        if batch or not signatures:
+            signatures.append(self._batch_signatures(batch))
+
+        return np.concatenate(signatures)
+
+    def groups(self, texts, parents=None):
+        """Group near-duplicate texts.
+
+        Args:
+            texts (array-like): sentences/documents
+            parents (array-like, optional): id of the document every text was taken from, texts with the same parent are grouped as well (e.g. dw paragraphs and their article). Missing values (NaN) have no parent. Defaults to None.
+
+        Return:
+            groups (numpy array): for every text the index of the first text of its group
+        """
+        signatures = self.signatures(texts)
+        n = len(signatures)
+
+        # texts sharing all entries of a band are candidates, every candidate is
+        # compared with the first text of the bucket only (linear in the bucket size)
+        sources = []
+        targets = []
+        for band in range(self.bands):
+            columns = slice(band * self.rows, (band + 1) * self.rows)
+            keys = np.ascontiguousarray(signatures[:, columns]).view(
+                np.dtype((np.void, 4 * self.rows))
+            )[:, 0]
+            _, first, inverse = np.unique(keys, return_index=True, return_inverse=True)
+            representative = first[inverse]
+            candidates = np.nonzero(representative != np.arange(n))[0]
+            similarity = (
+                signatures[candidates] == signatures[representative[candidates]]
+            ).mean(axis=1)
+            similar = similarity >= self.threshold
+            sources.append(candidates[similar])
+            targets.append(representative[candidates][similar])
+
+        # texts taken from the same document are connected to its first text
+        if parents is not None:
+            has_parent = np.nonzero(pd.notna(np.asarray(parents)))[0]
+            _, first, inverse = np.unique(
+                np.asarray(parents)[has_parent], return_index=True, return_inverse=True
+            )
+            sources.append(has_parent)
+            targets.append(has_parent[first[inverse]])
+
+        sources = np.concatenate(sources) if sources else np.array([], dtype=np.int64)
+        targets = np.concatenate(targets) if targets else np.array([], dtype=np.int64)
+        graph = coo_matrix(
+            (np.ones(len(sources), dtype=np.int8), (sources, targets)), shape=(n, n)
+        )
+        _, labels = connected_components(graph, directed=False)
+
+        # name every group after its first text
+        _, first, inverse = np.unique(labels, return_index=True, return_inverse=True)
+        return first[inverse]
+
+    def _batch_signatures(self, encoded):
+        """MinHash signatures of a batch of utf-8 encoded texts."""
+        k = self.shingle_size
+        if len(encoded) == 0:
+            return np.empty((0, self.num_perm), dtype=np.uint32)
+
+        lengths = np.array([len(text) for text in encoded], dtype=np.int64)
+        starts = np.concatenate([[0], np.cumsum(lengths)[:-1]])
+        buffer = np.frombuffer(b"".join(encoded), dtype=np.uint8).astype(np.uint64)
+
+        # polynomial hash of every k-byte window of the concatenated texts
+        # (integer overflow wraps around, i.e. arithmetic modulo 2^64)
+        powers = np.array([pow(257, j, 2 ** 64) for j in range(k)], dtype=np.uint64)
+        windows = np.lib.stride_tricks.sliding_window_view(buffer, k)
+        shingles = (windows * powers).sum(axis=1)
+
+        # keep the windows lying inside a single text
+        text_ids = np.repeat(np.arange(len(encoded)), lengths)[: len(shingles)]
+        offsets = np.arange(len(shingles)) - starts[text_ids]
+        shingles = shingles[offsets <= lengths[text_ids] - k]
+        counts = lengths - k + 1
+        boundaries = np.concatenate([[0], np.cumsum(counts)[:-1]])
+
+        signatures = np.empty((len(encoded), self.num_perm), dtype=np.uint32)
+        # a few hash functions at a time, so the hashed shingles fit into memory
+        for start in range(0, self.num_perm, 16):
+            a = self.a[start : start + 16, None]
+            b = self.b[start : start + 16, None]
+            hashed = a * shingles[None, :]
+            hashed += b
+            hashed >>= _SHIFT
+            signatures[:, start : start + 16] = np.minimum.reduceat(
+                hashed, boundaries, axis=1
+            ).T
+        return signatures
+
+
+def _band_layout(num_perm, threshold):
+    """Choose the number of bands and rows per band.
+
+    Texts with Jaccard similarity s become candidates with probability
+    1 - (1 - s^rows)^bands, which rises steeply around (1 / bands)^(1 / rows).
+    The layout with the highest such point not above threshold is chosen, so
+    near-duplicates are found with high probability; false candidates are
+    removed by comparing their signatures.
+    """
+    layout = (num_perm, 1)
+    for rows in range(1, num_perm + 1):
+        if num_perm % rows != 0:
+            continue
+        bands = num_perm // rows
+        if (1 / bands) ** (1 / rows) <= threshold:
+            layout = (bands, rows)
+    return layout
+
+
+def drop_near_duplicates(df, threshold=0.8, num_perm=128, shingle_size=5):
+    """Keep only the first row of every group of near-duplicate texts.
+
+    Args:
+        df (pandas dataframe): dataframe with columns raw_text and source (and optionally parent, see MinHashLSH.groups)
+        threshold (float, optional): minimal Jaccard similarity of near-duplicates. Defaults to 0.8.
+        num_perm (int, optional): number of hash functions. Defaults to 128.
+        shingle_size (int, optional): number of bytes per shingle. Defaults to 5.
+
+    Return:
+        df (pandas dataframe): dataframe without near-duplicates
+    """
+    groups = MinHashLSH(threshold, num_perm, shingle_size).groups(
+        df["raw_text"], df.get("parent")
+    )
+    keep = groups == np.arange(len(df))
+
+    dropped = pd.Series(~keep).groupby(np.asarray(df["source"])).sum()
+    for source, count in dropped.items():
+        print("Dropped {} near-duplicate rows of source {}".format(int(count), source))
+
+    return df[keep]
+
+
+def leakage_report(
+    train_texts, test_texts, threshold=0.8, num_perm=128, shingle_size=5
+):
+    """Count test rows having a near-duplicate in the train set.
+
+    Args:
+        train_texts (array-like): texts of the train set
+        test_texts (array-like): texts of the test set
+        threshold (float, optional): minimal Jaccard similarity of near-duplicates. Defaults to 0.8.
+        num_perm (int, optional): number of hash functions. Defaults to 128.
+        shingle_size (int, optional): number of bytes per shingle. Defaults to 5.
+
+    Return:
+        report (dict): number of test rows, leaked test rows and their ratio
+    """
+    texts = np.concatenate(
+        [np.asarray(train_texts, dtype=object), np.asarray(test_texts, dtype=object)]
+    )
+    groups = MinHashLSH(threshold, num_perm, shingle_size).groups(texts)
+
+    train_groups = np.unique(groups[: len(train_texts)])
+    leaked = np.isin(groups[len(train_texts) :], train_groups)
+
+    report = {
+        "test_rows": int(len(leaked)),
+        "leaked_rows": int(leaked.sum()),
+        "leaked_ratio": float(leaked.mean()) if len(leaked) > 0 else 0.0,
+    }
+    print(
+        "{} of {} test rows ({:.1%}) have a near-duplicate in the train set".format(
+            report["leaked_rows"], report["test_rows"], report["leaked_ratio"]
+        )
+    )
+    return report
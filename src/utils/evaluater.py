@@ -3,6 +3,7 @@ from tqdm import tqdm
 import numpy as np
 import pandas as pd
 import torch
+from scipy.sparse import csr_matrix, hstack
 from sklearn.metrics import (
     homogeneity_score,
     mean_absolute_error,
@@ -11,7 +12,9 @@ from sklearn.metrics import (
     silhouette_score,
 )
 from sklearn.model_selection import train_test_split
+from sklearn.preprocessing import StandardScaler
 from utils import (
+    cache,
     clustering,
     preprocessing,
     regression,
@@ -22,6 +25,30 @@ from utils import (
     normalization
 )
 
+# datasets that the virtual augmentation warning was printed for
+_warned_virtual = set()
+
+
+def _warn_virtual_augmentation(filename):
+    """Print a warning once per dataset if its random word swap/deletion is virtual.
+
+    Datasets created with --virtual_augmentation only store the original rows,
+    the swapped/deleted copies are drawn by the BERT trainer. The baselines
+    train on the stored rows, so they are trained without these augmentations.
+    """
+    if filename in _warned_virtual:
+        return
+    options = to_dataframe.dataset_metadata(filename).get("options", {})
+    if options.get("virtual_augmentation") and (
+        options.get("randword_swap") or options.get("randword_del")
+    ):
+        print(
+            "Warning: {} was created with virtual augmentation, the baseline is trained without random word swap/deletion.".format(
+                filename
+            )
+        )
+    _warned_virtual.add(filename)
+
 
 def evaluate_clustering(
     vec="tfidf", cluster="kmeans", dim_reduc="PCA", stopword="nltk"
@@ -110,7 +137,10 @@ def evaluate_baseline(
     """
 
     # read data
-    df_train, df_test = to_dataframe.read_augmented_h5(filename)
+    _warn_virtual_augmentation(filename)
+    df_train, df_test = to_dataframe.read_augmented_h5(
+        filename, columns=["raw_text", "rating"]
+    )
 
     # stopwords
     stopword_lst = preprocessing.get_stopwords()
@@ -119,18 +149,31 @@ def evaluate_baseline(
     X_train, vec_object = vectorizer.vectorizer_wrapper(
         df_train.raw_text, vec, stopword_lst, True
     )
-    X_test = vec_object.transform(df_test.raw_text)
+    X_test = vectorizer.transform(vec_object, df_test.raw_text)
 
     # add engineered features
     if engineered_features:
-        extra_train_feat = sentencestats.construct_features(df_train.raw_text)
-        extra_test_feat = sentencestats.construct_features(df_test.raw_text)
+        extra_train_feat = cache.cached_features(
+            "sentencestats", df_train.raw_text, sentencestats.construct_features
+        )
+        extra_test_feat = cache.cached_features(
+            "sentencestats", df_test.raw_text, sentencestats.construct_features
+        )
+        # scale the engineered columns to the range of the word features
+        scaler = StandardScaler().fit(extra_train_feat)
+        extra_train_feat = vectorizer.compact(scaler.transform(extra_train_feat))
+        extra_test_feat = vectorizer.compact(scaler.transform(extra_test_feat))
         if vec == "word2vec" or vec == "pretrained_word2vec":
             X_train = np.concatenate((np.array(X_train), extra_train_feat), axis=1)
             X_test = np.concatenate((np.array(X_test), extra_test_feat), axis=1)
         else:
-            X_train = np.concatenate((X_train.toarray(), extra_train_feat), axis=1)
-            X_test = np.concatenate((X_test.toarray(), extra_test_feat), axis=1)
+            # stay sparse, memory grows with the non-zeros instead of the vocabulary
+            X_train = vectorizer.compact(
+                hstack((X_train, csr_matrix(extra_train_feat)), format="csr")
+            )
+            X_test = vectorizer.compact(
+                hstack((X_test, csr_matrix(extra_test_feat)), format="csr")
+            )
 
     # labels
     y_train = df_train.rating.values
@@ -154,6 +197,103 @@ def evaluate_baseline(
         return MSE, RMSE, MAE, r_square
 
 
+def evaluate_streamed(
+    method="linear",
+    filename="all_data.h5",
+    engineered_features=False,
+    return_pred=False,
+    chunksize=10000,
+    epochs=5,
+):
+    """Out-of-core baseline regression with the hashing vectorizer.
+       Train and test set are streamed from the dataset file in chunks, every chunk is
+       vectorized by the stateless hashing vectorizer and an SGD regression is trained
+       with partial_fit, so memory does not depend on the size of the dataset.
+
+    Args:
+        method (str, optional): regression method to use (options: 'linear', 'lasso', 'ridge', 'elastic-net'). Defaults to 'linear'.
+        filename (str, optional): name of h5 file to load (run preprocessing first)
+        engineered_features (bool, optional): contenate engineered features to vectorized sentence
+        return_pred (bool, optional): return predictions, instead of metrics
+        chunksize (int, optional): number of rows per chunk. Defaults to 10000.
+        epochs (int, optional): number of passes over the train set. Defaults to 5.
+
+    Return:
+        MSE (double): Mean Square Error
+        RMSE (double): Root Mean Square Error
+        MAE (double): Mean Absolute Error
+        r_square (double): R Square
+    """
+
+    # stateless vectorizer, every chunk is transformed on its own
+    vec_object = vectorizer.TextVectorizer(
+        vectorizer.hashing_vectorizer(preprocessing.get_stopwords())
+    )
+
+    _warn_virtual_augmentation(filename)
+    columns = ["raw_text", "rating"]
+    train_set, _ = to_dataframe.load_augmented(filename)
+    starts = np.arange(0, len(train_set), chunksize)
+
+    def chunks(key, rng=None):
+        """Yield the chunks of the train or test set, in random order if rng is given."""
+        if rng is None:
+            return to_dataframe.iter_augmented_h5(filename, key, chunksize, columns)
+        return (
+            train_set.rows(start, start + chunksize, columns)
+            for start in rng.permutation(starts)
+        )
+
+    def features(key, scaler=None, rng=None):
+        """Yield features and labels of the chunks of the train or test set."""
+        for chunk in chunks(key, rng):
+            X = vec_object.transform(chunk.raw_text, persist=False)
+            if scaler is not None:
+                extra_feat = cache.cached_features(
+                    "sentencestats", chunk.raw_text, sentencestats.construct_features
+                )
+                extra_feat = vectorizer.compact(scaler.transform(extra_feat))
+                X = vectorizer.compact(
+                    hstack((X, csr_matrix(extra_feat)), format="csr")
+                )
+            yield X, chunk.rating.values
+
+    # scale the engineered columns to the range of the word features
+    scaler = None
+    if engineered_features:
+        scaler = StandardScaler()
+        for chunk in chunks("train"):
+            scaler.partial_fit(
+                cache.cached_features(
+                    "sentencestats", chunk.raw_text, sentencestats.construct_features
+                )
+            )
+
+    # training
+    reg = regression.incremental(method)
+    rng = np.random.RandomState(0)
+    for epoch in range(epochs):
+        # the rows are sorted by dataset, shuffle the order of the chunks and the
+        # rows within a chunk, so SGD does not drift towards the last dataset
+        for X, y in features("train", scaler, rng):
+            order = rng.permutation(len(y))
+            reg.partial_fit(X[order], y[order])
+
+    # testing
+    pred = []
+    y_test = []
+    for X, y in features("test", scaler):
+        pred.append(reg.predict(X))
+        y_test.append(y)
+    pred = np.concatenate(pred)
+    y_test = np.concatenate(y_test)
+
+    if return_pred:
+        return pred
+    else:
+        return evaluate(y_test, pred)
+
+
 def evaluate(label, pred):
     """Generic evaluation of regression metrics
 
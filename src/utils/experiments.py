@@ -5,7 +5,7 @@ from os.path import abspath, dirname, exists, join
 import numpy as np
 import pandas as pd
 from tqdm import tqdm
-from utils import evaluater, preprocessing, vectorizer, visualizer
+from utils import cache, evaluater, preprocessing, vectorizer, visualizer
 
 
 def benchmark_all(filename, engineered_features=False):
@@ -22,23 +22,33 @@ def benchmark_all(filename, engineered_features=False):
     vec_lst = [
         "tfidf",
         "count",
+        "hash",
         "word2vec",
         "pretrained_word2vec",
-    ]  # hashing vectorizer omitted, because out of memory
+    ]
     reg_lst = ["linear", "lasso", "ridge", "elastic-net", "random-forest"]
+    # hashing features are streamed out-of-core into SGD regressions
+    streamed_reg_lst = ["linear", "lasso", "ridge", "elastic-net"]
 
     # run benchmark
     for vec in vec_lst:
         print("Benchmark {} vectorizer:".format(vec))
 
+        methods = streamed_reg_lst if vec == "hash" else reg_lst
+
         # keep track of results
-        results = np.zeros((len(reg_lst), 4))
+        results = np.zeros((len(methods), 4))
 
         # evaluation
-        for i, method in enumerate(tqdm(reg_lst)):
-            MSE, RMSE, MAE, r_square = evaluater.evaluate_baseline(
-                vec, method, filename, engineered_features
-            )
+        for i, method in enumerate(tqdm(methods)):
+            if vec == "hash":
+                MSE, RMSE, MAE, r_square = evaluater.evaluate_streamed(
+                    method, filename, engineered_features
+                )
+            else:
+                MSE, RMSE, MAE, r_square = evaluater.evaluate_baseline(
+                    vec, method, filename, engineered_features
+                )
             results[i][0] = MSE
             results[i][1] = RMSE
             results[i][2] = MAE
@@ -46,7 +56,7 @@ def benchmark_all(filename, engineered_features=False):
 
         # save results
         df = pd.DataFrame(
-            results, index=reg_lst, columns=["MSE", "RMSE", "MAE", "r_square"]
+            results, index=methods, columns=["MSE", "RMSE", "MAE", "r_square"]
         )
         path = join(
             dirname(dirname(dirname(abspath(__file__)))), "result", "vectorizer"
@@ -61,9 +71,13 @@ def benchmark_all(filename, engineered_features=False):
             df.to_csv(join(path, "{}_{}.csv".format(filename, vec)))
         print("Save results to: {}".format(join(path, "{}.csv".format(vec))))
 
-        # visualize vectorization
-        visualizer.visualize_vectorizer(vec, "PCA", filename=filename)
-        visualizer.visualize_vectorizer(vec, "TSNE", filename=filename)
+        # visualize vectorization (needs the dense hashing features in memory)
+        if vec != "hash":
+            visualizer.visualize_vectorizer(vec, "PCA", filename=filename)
+            visualizer.visualize_vectorizer(vec, "TSNE", filename=filename)
 
         # release memory
         gc.collect()
+
+    # all evaluations and visualizations share the datasets read once
+    print("Dataset cache: {}".format(cache.datasets.info()))
@@ -0,0 +1,92 @@
+import functools
+from concurrent.futures import ProcessPoolExecutor
+
+import numpy as np
+import pandas as pd
+from langdetect import DetectorFactory, detect_langs
+from langdetect.lang_detect_exception import LangDetectException
+from utils import cache
+
+
+def _probability(text, language="de"):
+    """Probability that text is written in language (0 for texts without letters)."""
+    try:
+        for candidate in detect_langs(text):
+            if candidate.lang == language:
+                return candidate.prob
+    except LangDetectException:
+        pass
+    return 0.0
+
+
+def _detect_batch(texts, language="de"):
+    """Language probabilities of a batch of texts (run in a worker process)."""
+    # langdetect is random, fix the seed to get the same result for the same text
+    DetectorFactory.seed = 0
+    return [_probability(text, language) for text in texts]
+
+
+def language_probabilities(texts, language="de", batch_size=500, processes=None):
+    """Detect the probability of every text being written in language.
+
+    Args:
+        texts (array-like): sentences/documents
+        language (str, optional): ISO 639-1 code of the language. Defaults to "de".
+        batch_size (int, optional): number of texts per batch sent to a worker process. Defaults to 500.
+        processes (int, optional): number of worker processes. Defaults to None (number of CPUs).
+
+    Return:
+        probabilities (numpy array): probability per text
+    """
+    texts = [str(text) for text in texts]
+    batches = [texts[i : i + batch_size] for i in range(0, len(texts), batch_size)]
+    detect = functools.partial(_detect_batch, language=language)
+
+    if len(batches) <= 1:
+        results = [detect(batch) for batch in batches]
+    else:
+        with ProcessPoolExecutor(max_workers=processes) as executor:
+            results = list(executor.map(detect, batches))
+
+    return np.array(
+        [probability for result in results for probability in result], dtype=np.float32
+    )
+
+
+def filter_language(df, language="de", threshold=0.9, processes=None):
+    """Drop rows whose text is not written in language with at least threshold probability.
+
+    Detected probabilities are cached per row hash (see cache.cached_features),
+    so every text is only detected once across datasets and runs.
+
+    Args:
+        df (pandas dataframe): dataframe with columns raw_text and source
+        language (str, optional): ISO 639-1 code of the language to keep. Defaults to "de".
+        threshold (float, optional): minimal probability of language. Defaults to 0.9.
+        processes (int, optional): number of worker processes. Defaults to None (number of CPUs).
+
+    Return:
+        df (pandas dataframe): rows written in language
+    """
+    probabilities = cache.cached_features(
+        "langdetect_" + language,
+        df["raw_text"],
+        lambda texts: pd.DataFrame(
+            {
+                "probability": language_probabilities(
+                    texts, language, processes=processes
+                )
+            }
+        ),
+    )["probability"].values
+    keep = probabilities >= threshold
+
+    dropped = pd.Series(~keep).groupby(np.asarray(df["source"])).sum()
+    for source, count in dropped.items():
+        print(
+            "Dropped {} rows of source {} not detected as '{}'".format(
+                int(count), source, language
+            )
+        )
+
+    return df[keep]
@@ -0,0 +1,195 @@
+import math
+import numbers
+import os
+from concurrent.futures import ProcessPoolExecutor
+
+import numpy as np
+import scipy.sparse as sp
+from sklearn.feature_extraction.text import TfidfTransformer, TfidfVectorizer
+
+
+def _shards(texts, processes=None, min_shard_size=5000):
+    """Cut texts into one shard per worker process (at least min_shard_size texts each)."""
+    workers = processes or os.cpu_count() or 1
+    size = max(min_shard_size, math.ceil(len(texts) / workers))
+    return [texts[start : start + size] for start in range(0, len(texts), size)]
+
+
+def _map(function, vec, shards, processes=None):
+    """Apply function(vec, shard) to every shard, in worker processes if there are several."""
+    if len(shards) <= 1:
+        return [function(vec, shard) for shard in shards]
+    with ProcessPoolExecutor(max_workers=processes) as executor:
+        return list(executor.map(function, [vec] * len(shards), shards))
+
+
+def _count_shard(vec, texts):
+    """Term counts of a shard with a vocabulary local to the shard (run in a worker process)."""
+    analyze = vec.build_analyzer()
+    vocabulary = {}
+    indices = []
+    values = []
+    indptr = [0]
+    for text in texts:
+        counts = {}
+        for term in analyze(text):
+            index = vocabulary.setdefault(term, len(vocabulary))
+            counts[index] = counts.get(index, 0) + 1
+        indices.extend(counts.keys())
+        values.extend(counts.values())
+        indptr.append(len(indices))
+
+    return (
+        list(vocabulary),
+        np.array(indices, dtype=np.int64),
+        np.array(values, dtype=np.int64),
+        np.array(indptr, dtype=np.int64),
+    )
+
+
+def _transform_shard(vec, texts):
+    """Transform a shard with a fitted vectorizer (run in a worker process)."""
+    return vec.transform(texts)
+
+
+def _limit_features(X, vocabulary, max_df, min_df, max_features):
+    """Remove terms by document frequency and keep the max_features most frequent terms (like sklearn)."""
+    n_doc = X.shape[0]
+    high = max_df if isinstance(max_df, numbers.Integral) else max_df * n_doc
+    low = min_df if isinstance(min_df, numbers.Integral) else min_df * n_doc
+    if high < low:
+        raise ValueError("max_df corresponds to < documents than min_df")
+
+    dfs = np.bincount(X.indices, minlength=X.shape[1])
+    mask = (dfs <= high) & (dfs >= low)
+    if max_features is not None and mask.sum() > max_features:
+        tfs = np.asarray(X.sum(axis=0)).ravel()
+        top = np.nonzero(mask)[0][(-tfs[mask]).argsort()[:max_features]]
+        mask = np.zeros(len(dfs), dtype=bool)
+        mask[top] = True
+
+    kept = np.nonzero(mask)[0]
+    if len(kept) == 0:
+        raise ValueError(
+            "After pruning, no terms remain. Try a lower min_df or a higher max_df."
+        )
+
+    new_indices = np.cumsum(mask) - 1
+    removed = set()
+    for term, index in list(vocabulary.items()):
+        if mask[index]:
+            vocabulary[term] = int(new_indices[index])
+        else:
+            del vocabulary[term]
+            removed.add(term)
+
+    return X[:, kept], removed
+
+
+def fit_transform(vec, texts, processes=None, min_shard_size=5000):
+    """Fit a CountVectorizer or TfidfVectorizer in parallel processes.
+
+    The texts are sharded across a process pool. Every worker counts the terms
+    of its shard with a local vocabulary, the local vocabularies are merged into
+    the sorted global vocabulary and the term counts are stacked into one CSR
+    matrix. Pruning (min_df, max_df, max_features) and the IDF are computed on
+    the merged counts, so vocabulary, IDF and features are the same as with
+    vec.fit_transform(texts).
+
+    Args:
+        vec (CountVectorizer or TfidfVectorizer): unfitted vectorizer without a fixed vocabulary, fitted in place
+        texts (array-like): sentences/documents
+        processes (int, optional): number of worker processes. Defaults to None (number of CPUs).
+        min_shard_size (int, optional): minimal number of texts per worker process. Defaults to 5000.
+
+    Return:
+        features [scipy sparse matrix (csr)]: document-term matrix with dimension (number of sentences, size of vocabulary)
+    """
+    if vec.vocabulary is not None:
+        raise ValueError(
+            "fit_transform does not support vectorizers with a fixed vocabulary"
+        )
+
+    texts = list(texts)
+    shards = _map(
+        _count_shard, vec, _shards(texts, processes, min_shard_size), processes
+    )
+
+    # global term ids in order of first appearance, like sklearn before sorting
+    appearance = {}
+    for local_terms, _, _, _ in shards:
+        for term in local_terms:
+            appearance.setdefault(term, len(appearance))
+    if len(appearance) == 0:
+        raise ValueError(
+            "empty vocabulary; perhaps the documents only contain stop words"
+        )
+
+    indices = []
+    indptr = [np.zeros(1, dtype=np.int64)]
+    for local_terms, local_indices, _, local_indptr in shards:
+        mapping = np.array([appearance[term] for term in local_terms], dtype=np.int64)
+        indices.append(mapping[local_indices])
+        indptr.append(local_indptr[1:] + indptr[-1][-1])
+    X = sp.csr_matrix(
+        (
+            np.concatenate([shard[2] for shard in shards]).astype(vec.dtype),
+            np.concatenate(indices),
+            np.concatenate(indptr),
+        ),
+        shape=(len(texts), len(appearance)),
+    )
+    X.sort_indices()
+
+    # renumber the terms alphabetically, the order within rows is kept (as in
+    # sklearn, so that sums over rows are bit-identical)
+    vocabulary = {}
+    sorted_ids = np.empty(len(appearance), dtype=X.indices.dtype)
+    for index, term in enumerate(sorted(appearance)):
+        vocabulary[term] = index
+        sorted_ids[appearance[term]] = index
+    X.indices = sorted_ids.take(X.indices)
+
+    if vec.binary:
+        X.data.fill(1)
+    X, removed = _limit_features(
+        X, vocabulary, vec.max_df, vec.min_df, vec.max_features
+    )
+
+    # state of a fitted vectorizer
+    vec.vocabulary_ = vocabulary
+    vec.fixed_vocabulary_ = False
+    vec.stop_words_ = removed
+
+    if isinstance(vec, TfidfVectorizer):
+        tfidf = TfidfTransformer(
+            norm=vec.norm,
+            use_idf=vec.use_idf,
+            smooth_idf=vec.smooth_idf,
+            sublinear_tf=vec.sublinear_tf,
+        ).fit(X)
+        vec._tfidf = tfidf
+        X = tfidf.transform(X, copy=False)
+
+    return X
+
+
+def transform(vec, texts, processes=None, min_shard_size=5000):
+    """Transform texts with a fitted (or stateless) vectorizer in parallel processes.
+
+    Args:
+        vec (object): fitted sklearn vectorizer (or HashingVectorizer)
+        texts (array-like): sentences/documents
+        processes (int, optional): number of worker processes. Defaults to None (number of CPUs).
+        min_shard_size (int, optional): minimal number of texts per worker process. Defaults to 5000.
+
+    Return:
+        features [scipy sparse matrix (csr)]: document-term matrix of texts
+    """
+    texts = list(texts)
+    if len(texts) == 0:
+        # HashingVectorizer has n_features, the other vectorizers a vocabulary
+        columns = getattr(vec, "n_features", None) or len(vec.vocabulary_)
+        return sp.csr_matrix((0, columns), dtype=vec.dtype)
+    shards = _shards(texts, processes, min_shard_size)
+    return sp.vstack(_map(_transform_shard, vec, shards, processes), format="csr")
@@ -0,0 +1,169 @@
+import queue
+import threading
+import time
+from collections import deque
+from concurrent.futures import ProcessPoolExecutor
+
+
+# marks the end of the stream in a queue
+_DONE = object()
+
+
+class Stage:
+    def __init__(self, name, function, processes=0):
+        """Step of a streaming pipeline.
+
+        Every stage runs in its own thread, takes chunks from the queue of the
+        previous stage, applies function and puts the result into its own queue.
+        With processes > 0 the chunks are processed by that many worker processes
+        (function must be picklable then), the order of the chunks is kept.
+
+        Args:
+            name (str): name of the stage (printed in the summary)
+            function (function): takes a chunk and returns the processed chunk
+            processes (int, optional): number of worker processes. Defaults to 0 (run in the stage thread).
+        """
+        self.name = name
+        self.function = function
+        self.processes = processes
+        self.chunks = 0
+        self.seconds = 0.0
+
+
+def run_pipeline(chunks, stages, sink, queue_size=4):
+    """Stream chunks through stages into sink.
+
+    The stages are connected by bounded queues, so at most queue_size chunks wait
+    between two stages and memory does not grow with the number of chunks. All
+    stages run concurrently, the sink (e.g. a writer appending to disk) runs in
+    the calling thread. If a stage or the sink fails, the pipeline is stopped and
+    the exception is raised.
+
+    Args:
+        chunks (iterable): input chunks (e.g. a generator reading a file in chunks)
+        stages (list): list of Stage
+        sink (function): called with every chunk leaving the last stage
+        queue_size (int, optional): maximal number of chunks per queue. Defaults to 4.
+    """
+    queues = [queue.Queue(maxsize=queue_size) for _ in range(len(stages) + 1)]
+    stop = threading.Event()
+    errors = []
+
+    threads = [
+        threading.Thread(
+            target=_feed, args=(chunks, queues[0], stop, errors), daemon=True
+        )
+    ]
+    for stage, inbox, outbox in zip(stages, queues[:-1], queues[1:]):
+        threads.append(
+            threading.Thread(
+                target=_run_stage,
+                args=(stage, inbox, outbox, stop, errors),
+                name=stage.name,
+                daemon=True,
+            )
+        )
+    for thread in threads:
+        thread.start()
+
+    try:
+        while True:
+            chunk = _get(queues[-1], stop)
+            if chunk is _DONE:
+                break
+            sink(chunk)
+    except Exception as error:
+        errors.append(error)
+        stop.set()
+
+    for thread in threads:
+        thread.join()
+
+    if errors:
+        raise errors[0]
+
+    for stage in stages:
+        print(
+            "Stage {}: {} chunks, {:.1f} s busy".format(
+                stage.name, stage.chunks, stage.seconds
+            )
+        )
+
+
+def _feed(chunks, outbox, stop, errors):
+    """Put the input chunks into the first queue."""
+    try:
+        for chunk in chunks:
+            if not _put(outbox, chunk, stop):
+                return
+        _put(outbox, _DONE, stop)
+    except Exception as error:
+        errors.append(error)
+        stop.set()
+
+
+def _run_stage(stage, inbox, outbox, stop, errors):
+    """Apply a stage to every chunk of inbox and put the results into outbox."""
+    executor = None
+    if stage.processes > 0:
+        executor = ProcessPoolExecutor(max_workers=stage.processes)
+    pending = deque()
+
+    try:
+        while True:
+            chunk = _get(inbox, stop)
+            if chunk is _DONE:
+                break
+
+            start = time.perf_counter()
+            if executor is None:
+                result = stage.function(chunk)
+                stage.seconds += time.perf_counter() - start
+                stage.chunks += 1
+                if not _put(outbox, result, stop):
+                    return
+            else:
+                pending.append(executor.submit(stage.function, chunk))
+                # keep every worker busy, but not more chunks in flight
+                if len(pending) >= stage.processes:
+                    result = pending.popleft().result()
+                    stage.seconds += time.perf_counter() - start
+                    stage.chunks += 1
+                    if not _put(outbox, result, stop):
+                        return
+
+        while pending:
+            start = time.perf_counter()
+            result = pending.popleft().result()
+            stage.seconds += time.perf_counter() - start
+            stage.chunks += 1
+            if not _put(outbox, result, stop):
+                return
+        _put(outbox, _DONE, stop)
+    except Exception as error:
+        errors.append(error)
+        stop.set()
+    finally:
+        if executor is not None:
+            executor.shutdown()
+
+
+def _put(outbox, item, stop):
+    """Put item into a bounded queue, give up if the pipeline was stopped."""
+    while not stop.is_set():
+        try:
+            outbox.put(item, timeout=0.1)
+            return True
+        except queue.Full:
+            pass
+    return False
+
+
+def _get(inbox, stop):
+    """Get the next item of a queue, _DONE if the pipeline was stopped."""
+    while not stop.is_set():
+        try:
+            return inbox.get(timeout=0.1)
+        except queue.Empty:
+            pass
+    return _DONE
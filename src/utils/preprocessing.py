@@ -3,6 +3,7 @@ from os.path import abspath, dirname, join
 import nltk
 import spacy
 import stop_words
+from utils import tokenization
 
 
 def get_stopwords(source="spacy"):
@@ -61,19 +62,5 @@ def tokenizer(df, method="spacy"):
         corpus (list): 2d python list (list containing list of tokens for each sentence)
     """
 
-    if method == "nltk":
-        data = df.apply(lambda x: str(x).lower()).to_list()
-        corpus = [nltk.word_tokenize(line, language="german") for line in data]
-        return corpus
-    elif method == "spacy":
-        data = df.apply(lambda x: str(x).lower()).to_list()
-        nlp = spacy.load("de_core_news_sm", disable=["tagger", "parser", "ner"])
-        corpus = [
-            [token.text for token in nlp(line) if token.text if len(token.text) > 1]
-            for line in data
-        ]
-        return corpus
-    else:
-        raise ValueError(
-            "method {} is not implemented. Please select one of following options: 'ntlk', 'spacy'"
-        )
+    # tokenized once per dataset and cached (see tokenization.tokenize)
+    return tokenization.tokenize(df, method).documents()
@@ -1,5 +1,11 @@
 from sklearn.ensemble import RandomForestRegressor
-from sklearn.linear_model import ElasticNet, Lasso, LinearRegression, Ridge
+from sklearn.linear_model import (
+    ElasticNet,
+    Lasso,
+    LinearRegression,
+    Ridge,
+    SGDRegressor,
+)
 
 
 def baseline(data, labels, method="linear"):
@@ -34,3 +40,31 @@ def baseline(data, labels, method="linear"):
         )
 
     return reg
+
+
+def incremental(method="linear"):
+    """SGD variants of the baseline regressions, trained chunk by chunk with partial_fit.
+
+    Args:
+        method (str, optional): regression method to use (options: 'linear', 'lasso', 'ridge', 'elastic-net'). Defaults to 'linear'.
+
+    Return:
+        reg (object): untrained SGDRegressor with the penalty of method
+    """
+
+    if method == "linear":
+        reg = SGDRegressor(penalty="l2", alpha=0.0, random_state=0)
+    elif method == "lasso":
+        reg = SGDRegressor(penalty="l1", random_state=0)
+    elif method == "ridge":
+        reg = SGDRegressor(penalty="l2", random_state=0)
+    elif method == "elastic-net":
+        reg = SGDRegressor(penalty="elasticnet", random_state=0)
+    else:
+        raise ValueError(
+            "Incremental regression {} is unknown. Please choose: 'linear', 'lasso', 'ridge', 'elastic-net'".format(
+                method
+            )
+        )
+
+    return reg
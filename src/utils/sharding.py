@@ -0,0 +1,108 @@
+import os
+import pickle
+from concurrent.futures import ProcessPoolExecutor
+from os.path import exists, join
+
+import numpy as np
+import pandas as pd
+import scipy.sparse as sp
+from utils import storage
+
+
+def run_shard(function, path, index, key="train", columns=None, output_dir=None):
+    """Apply a function to one shard of a sharded dataset.
+
+    Can be used to process the shards in parallel processes or on several
+    machines sharing a file system (each job runs one shard with output_dir set,
+    merge_shard_outputs combines the results afterwards).
+
+    Args:
+        function (function): takes the dataframe of the shard and returns a dataframe, numpy array or scipy sparse matrix with one row per dataframe row
+        path (str): path of the sharded dataset (.h5.shards or .parquet.shards)
+        index (int): index of the shard
+        key (str, optional): key of the dataframe. Defaults to "train".
+        columns (list, optional): only read these columns. Defaults to None (all columns).
+        output_dir (str, optional): if given, the output is pickled to output_dir/shard-XXX.pkl. Defaults to None.
+
+    Return:
+        row_ids (numpy array): positions of the shard rows in the unsharded dataframe
+        output: output of function
+    """
+    if columns is not None and "row_id" not in columns:
+        columns = list(columns) + ["row_id"]
+
+    df = storage.get_backend(path).read_shard(path, index, key, columns)
+    row_ids = df["row_id"].values
+    output = function(df)
+
+    if output_dir is not None:
+        if not exists(output_dir):
+            os.makedirs(output_dir)
+        with open(join(output_dir, "shard-{:03d}.pkl".format(index)), "wb") as file:
+            pickle.dump((row_ids, output), file)
+
+    return row_ids, output
+
+
+def map_shards(function, path, key="train", columns=None, processes=None):
+    """Apply a function to every shard in parallel processes and merge the outputs.
+
+    Args:
+        function (function): module-level function (must be picklable), see run_shard
+        path (str): path of the sharded dataset
+        key (str, optional): key of the dataframe. Defaults to "train".
+        columns (list, optional): only read these columns. Defaults to None (all columns).
+        processes (int, optional): number of worker processes. Defaults to None (number of CPUs).
+
+    Return:
+        output: outputs of all shards merged in the order of the unsharded dataframe
+    """
+    num_shards = storage.get_backend(path).num_shards_of(path)
+
+    with ProcessPoolExecutor(max_workers=processes) as executor:
+        futures = [
+            executor.submit(run_shard, function, path, index, key, columns)
+            for index in range(num_shards)
+        ]
+        results = [future.result() for future in futures]
+
+    return merge_outputs(results)
+
+
+def merge_outputs(results):
+    """Merge the outputs of several shards in the order of the unsharded dataframe.
+
+    Args:
+        results (list): list of (row_ids, output) tuples returned by run_shard
+
+    Return:
+        output: merged dataframe, numpy array or scipy sparse (csr) matrix
+    """
+    row_ids = np.concatenate([row_id for row_id, output in results])
+    outputs = [output for row_id, output in results]
+    order = np.argsort(row_ids, kind="mergesort")
+
+    if isinstance(outputs[0], (pd.DataFrame, pd.Series)):
+        return pd.concat(outputs, ignore_index=True).iloc[order].reset_index(drop=True)
+    elif sp.issparse(outputs[0]):
+        return sp.vstack(outputs, format="csr")[order]
+    else:
+        return np.concatenate([np.asarray(output) for output in outputs])[order]
+
+
+def merge_shard_outputs(output_dir):
+    """Merge the outputs pickled by run_shard(..., output_dir=output_dir).
+
+    Args:
+        output_dir (str): folder containing shard-XXX.pkl files
+
+    Return:
+        output: merged output (see merge_outputs)
+    """
+    results = []
+    for filename in sorted(os.listdir(output_dir)):
+        if filename.startswith("shard-") and filename.endswith(".pkl"):
+            with open(join(output_dir, filename), "rb") as file:
+                results.append(pickle.load(file))
+
+    return merge_outputs(results)
@@ -0,0 +1,203 @@
+import hashlib
+import os
+from os.path import abspath, dirname, exists, join
+
+import numpy as np
+import pandas as pd
+
+
+# folder of the persisted split manifests
+SPLIT_PATH = join(dirname(dirname(dirname(abspath(__file__)))), "data", "splits")
+
+
+def row_hashes(texts):
+    """Return a hash for every text, used to identify rows across dataset variants.
+
+    Args:
+        texts (array-like): sentences/documents
+
+    Return:
+        hashes (numpy array): 16 character hex digest (SHA-1) per text
+    """
+    return np.array(
+        [hashlib.sha1(str(text).encode("utf-8")).hexdigest()[:16] for text in texts],
+        dtype=object,
+    )
+
+
+def rating_bins(ratings):
+    """Bin ratings by rounding them to the next integer (missing ratings get bin -1)."""
+    return np.nan_to_num(
+        np.round(np.asarray(ratings, dtype=np.float64)), nan=-1
+    ).astype(np.int64)
+
+
+def manifest_path(test_size=0.1, seed=0):
+    """Path of the split manifest for the given test size and seed."""
+    # v3: rows are stratified by source and rating bin (see assign_splits)
+    return join(SPLIT_PATH, "split-v3-test{}-seed{}.parquet".format(test_size, seed))
+
+
+def load_manifest(test_size=0.1, seed=0):
+    """Load the persisted split manifest.
+
+    Args:
+        test_size (float, optional): ratio of test to train set. Defaults to 0.1.
+        seed (int, optional): seed of the split. Defaults to 0.
+
+    Return:
+        manifest (pandas Series): maps row hash to 'train' or 'test' (empty if no manifest exists yet)
+    """
+    rows = _load_rows(test_size, seed)
+    return pd.Series(rows["split"].values, index=rows["row_hash"].values)
+
+
+def assign_splits(hashes, sources, ratings, test_size=0.1, seed=0, assigned=None):
+    """Assign rows to train or test, stratified by source and rating bin.
+
+    Within every stratum (source, rating bin) the rows are ordered by a seeded
+    hash of their row hash and the first rows go to test, so that the stratum
+    (including the rows assigned before) has round(test_size * size) test rows.
+    Rows assigned before keep their assignment, therefore appended rows only
+    fill up the test rows of their strata.
+
+    Args:
+        hashes (array-like): row hashes (see row_hashes)
+        sources (array-like): source of every row
+        ratings (array-like): rating of every row
+        test_size (float, optional): ratio of test to train set. Defaults to 0.1.
+        seed (int, optional): seed of the split. Defaults to 0.
+        assigned (pandas dataframe, optional): rows assigned before (columns split, source, bin). Defaults to None.
+
+    Return:
+        rows (pandas dataframe): columns row_hash, split ('train' or 'test'), source and bin of every distinct row hash
+    """
+    rows = pd.DataFrame(
+        {
+            "row_hash": np.asarray(hashes, dtype=object),
+            "source": np.asarray(sources, dtype=np.int64),
+            "bin": rating_bins(ratings),
+        }
+    ).drop_duplicates("row_hash")
+    rows["order"] = [
+        hashlib.sha1("{}:{}".format(seed, row_hash).encode("ascii")).hexdigest()
+        for row_hash in rows["row_hash"]
+    ]
+    rows = rows.sort_values("order", kind="mergesort")
+
+    strata = rows.groupby(["source", "bin"], sort=False)
+    rank = strata.cumcount().values
+    size = strata["row_hash"].transform("size").values
+
+    # rows of the same strata assigned before
+    assigned_size = np.zeros(len(rows))
+    assigned_test = np.zeros(len(rows))
+    if assigned is not None and len(assigned) > 0:
+        counts = (
+            assigned.assign(test=assigned["split"] == "test")
+            .groupby(["source", "bin"])["test"]
+            .agg(["size", "sum"])
+            .reindex(pd.MultiIndex.from_arrays([rows["source"], rows["bin"]]))
+            .fillna(0)
+        )
+        assigned_size = counts["size"].values
+        assigned_test = counts["sum"].values
+
+    # half rounded up, so a stratum of 5 rows gets a test row at test_size 0.1
+    num_test = np.floor(test_size * (size + assigned_size) + 0.5) - assigned_test
+    rows["split"] = np.where(rank < num_test, "test", "train")
+
+    return rows[["row_hash", "split", "source", "bin"]].reset_index(drop=True)
+
+
+def extend_manifest(hashes, sources, ratings, test_size=0.1, seed=0, save=True):
+    """Add rows missing in the persisted split manifest and return the manifest.
+
+    Rows already contained in the manifest keep their assignment, new rows are
+    assigned with assign_splits and the manifest is saved again.
+
+    Args:
+        hashes (array-like): row hashes (see row_hashes)
+        sources (array-like): source of every row
+        ratings (array-like): rating of every row
+        test_size (float, optional): ratio of test to train set. Defaults to 0.1.
+        seed (int, optional): seed of the split. Defaults to 0.
+        save (bool, optional): save the extended manifest. Defaults to True (False only returns it, the assignment is the same when it is saved later).
+
+    Return:
+        manifest (pandas Series): maps row hash to 'train' or 'test'
+    """
+    hashes = np.asarray(hashes, dtype=object)
+    rows = _load_rows(test_size, seed)
+
+    new = ~pd.Index(hashes).isin(rows["row_hash"])
+    if new.any():
+        rows = pd.concat(
+            [
+                rows,
+                assign_splits(
+                    hashes[new],
+                    np.asarray(sources)[new],
+                    np.asarray(ratings)[new],
+                    test_size,
+                    seed,
+                    rows,
+                ),
+            ],
+            ignore_index=True,
+        )
+        if save:
+            print("Assigning {} new rows to the split manifest".format(new.sum()))
+            if not exists(SPLIT_PATH):
+                os.makedirs(SPLIT_PATH)
+            rows.to_parquet(manifest_path(test_size, seed), index=False)
+
+    return pd.Series(rows["split"].values, index=rows["row_hash"].values)
+
+
+def _load_rows(test_size=0.1, seed=0):
+    """Load the rows of the persisted split manifest (columns row_hash, split, source, bin)."""
+    path = manifest_path(test_size, seed)
+    if not exists(path):
+        return pd.DataFrame(
+            {
+                "row_hash": pd.Series([], dtype=object),
+                "split": pd.Series([], dtype=object),
+                "source": pd.Series([], dtype=np.int64),
+                "bin": pd.Series([], dtype=np.int64),
+            }
+        )
+    return pd.read_parquet(path)
+
+
+def split_rows(df, test_size=0.1, seed=0):
+    """Return 'train' or 'test' for every row of df using the persisted split manifest.
+
+    Only TextComplexityDE19 rows (source 0) are split, the other rows are always
+    used for training and are not added to the manifest. Rows already contained
+    in the manifest keep their assignment, new rows are assigned with
+    assign_splits and added to the manifest. Therefore all dataset variants
+    (backtranslation, lemmatization, ...) share the same test set.
+
+    Args:
+        df (pandas dataframe): dataframe with columns raw_text, rating, source
+        test_size (float, optional): ratio of test to train set. Defaults to 0.1.
+        seed (int, optional): seed of the split. Defaults to 0.
+
+    Return:
+        splits (numpy array): 'train' or 'test' for every row of df
+    """
+    splits = np.full(len(df), "train", dtype=object)
+    text_comp = (df["source"] == 0).values
+    if text_comp.any():
+        hashes = row_hashes(df["raw_text"][text_comp])
+        manifest = extend_manifest(
+            hashes,
+            df["source"][text_comp].values,
+            df["rating"][text_comp].values,
+            test_size,
+            seed,
+        )
+        splits[text_comp] = manifest.reindex(hashes).values
+
+    return splits
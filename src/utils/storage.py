@@ -0,0 +1,733 @@
+import json
+import os
+from os.path import exists, join
+
+import numpy as np
+import pandas as pd
+import pyarrow as pa
+import pyarrow.parquet as pq
+
+
+class StorageBackend:
+    """Interface of a storage backend for the train/test datasets.
+
+    A dataset file contains several dataframes (e.g. "train" and "test"),
+    each of them stored under a key. Backends implement writing all dataframes
+    at once and reading a single key, optionally restricted to some columns
+    and to rows of some sources.
+    """
+
+    extension = None
+
+    def write(self, path, frames):
+        """Write dataframes to path.
+
+        Args:
+            path (str): path of the dataset file
+            frames (dict): maps key to pandas dataframe
+        """
+        raise NotImplementedError
+
+    def append(self, path, key, df):
+        """Append rows to the dataframe stored under key.
+
+        Args:
+            path (str): path of the dataset file
+            key (str): key of the dataframe (e.g. "train" or "test")
+            df (pandas dataframe): rows to append
+        """
+        raise NotImplementedError
+
+    def check_append(self, path, key, df):
+        """Raise a ValueError if df can not be appended to key (checked before any side effect).
+
+        Args:
+            path (str): path of the dataset file
+            key (str): key of the dataframe (e.g. "train" or "test")
+            df (pandas dataframe): rows to append
+        """
+        if type(self).append is StorageBackend.append:
+            raise ValueError(
+                "Rows can not be appended to {} files ({}). Please convert it to .h5 first.".format(
+                    self.extension, path
+                )
+            )
+
+    def read(
+        self, path, key, columns=None, sources=None, where=None, start=None, stop=None
+    ):
+        """Read the dataframe stored under key.
+
+        Args:
+            path (str): path of the dataset file
+            key (str): key of the dataframe (e.g. "train" or "test")
+            columns (list, optional): only read these columns. Defaults to None (all columns).
+            sources (list, optional): only read rows with these source ids. Defaults to None (all rows).
+            where (str, optional): query on the source and rating columns, e.g. "rating >= 2 & rating < 4". Defaults to None.
+            start (int, optional): first row to read (counted after filtering by source). Defaults to None.
+            stop (int, optional): read up to this row (exclusive). Defaults to None.
+
+        Return:
+            df (pandas dataframe): dataframe stored under key
+        """
+        raise NotImplementedError
+
+    def columns(self, path, key):
+        """Return the column names of the dataframe stored under key."""
+        raise NotImplementedError
+
+    def nrows(self, path, key, sources=None):
+        """Return the number of rows stored under key (of the given sources)."""
+        raise NotImplementedError
+
+    def iterate(self, path, key, chunksize, columns=None, sources=None, where=None):
+        """Iterate over the dataframe stored under key in chunks.
+
+        Args:
+            path (str): path of the dataset file
+            key (str): key of the dataframe (e.g. "train" or "test")
+            chunksize (int): number of rows per chunk
+            columns (list, optional): only read these columns. Defaults to None (all columns).
+            sources (list, optional): only read rows with these source ids. Defaults to None (all rows).
+            where (str, optional): query on the source and rating columns. Defaults to None.
+
+        Return:
+            chunks (generator): yields pandas dataframes with at most chunksize rows
+        """
+        raise NotImplementedError
+
+    def keys(self, path):
+        """Return the keys of all dataframes stored in path."""
+        raise NotImplementedError
+
+    def metadata(self, path):
+        """Return the metadata stored with the dataset (empty dict if there is none)."""
+        raise NotImplementedError
+
+    def set_metadata(self, path, metadata):
+        """Store metadata (e.g. preprocessing options and version) with the dataset.
+
+        Args:
+            path (str): path of the dataset file
+            metadata (dict): JSON serializable metadata
+        """
+        raise NotImplementedError
+
+
+class HDF5Backend(StorageBackend):
+    """HDF5 storage through pandas.HDFStore.
+
+    Dataframes are written in table format with blosc:zstd compression, so they
+    can be appended to in chunks and queried with where= on the source and
+    rating columns. Files written in the old fixed format can still be read.
+    """
+
+    extension = ".h5"
+
+    # columns that can be used in where= queries
+    data_columns = ["source", "rating"]
+
+    # string columns with a fixed width (see text_itemsize)
+    text_columns = ["raw_text", "augment_text"]
+
+    def __init__(
+        self, chunksize=50000, complib="blosc:zstd", complevel=5, text_itemsize=4096
+    ):
+        """
+        Args:
+            chunksize (int, optional): number of rows written per chunk. Defaults to 50000.
+            complib (str, optional): compression library. Defaults to "blosc:zstd".
+            complevel (int, optional): compression level (0-9). Defaults to 5.
+            text_itemsize (int, optional): minimal number of bytes reserved for raw_text (and augment_text). The width is fixed by the first write, appended texts can not be longer (the padding is compressed away). Defaults to 4096.
+        """
+        self.chunksize = chunksize
+        self.complib = complib
+        self.complevel = complevel
+        self.text_itemsize = text_itemsize
+
+    def write(self, path, frames):
+        with pd.HDFStore(
+            path, mode="w", complib=self.complib, complevel=self.complevel
+        ) as store:
+            for key, df in frames.items():
+                self._append(store, key, df)
+
+    def append(self, path, key, df):
+        self.check_append(path, key, df)
+        with pd.HDFStore(
+            path, mode="a", complib=self.complib, complevel=self.complevel
+        ) as store:
+            self._append(store, key, df)
+
+    def check_append(self, path, key, df):
+        columns = [column for column in self.text_columns if column in df.columns]
+        if len(columns) == 0 or not exists(path):
+            return
+        with pd.HDFStore(path, mode="r") as store:
+            if key not in store:
+                return
+            storer = store.get_storer(key)
+            widths = {column: self._text_itemsize(storer, column) for column in columns}
+        for column, width in widths.items():
+            longest = longest_text(df, column)
+            if width is not None and longest > width:
+                raise ValueError(
+                    "{} of {} bytes does not fit into the {} column of {} ({} bytes). Please write the dataset again with a larger text_itemsize.".format(
+                        column, longest, column, path, width
+                    )
+                )
+
+    def read(
+        self, path, key, columns=None, sources=None, where=None, start=None, stop=None
+    ):
+        with pd.HDFStore(path, mode="r") as store:
+            if store.get_storer(key).is_table:
+                query = self._where(sources, where)
+                if query is None:
+                    return store.select(key, columns=columns, start=start, stop=stop)
+                if start is None and stop is None:
+                    return store.select(key, where=query, columns=columns)
+                # start and stop refer to the filtered rows
+                coordinates = store.select_as_coordinates(key, where=query)[start:stop]
+                if len(coordinates) == 0:
+                    # an empty list of coordinates would select the whole table
+                    return store.select(key, start=0, stop=0, columns=columns)
+                return store.select(key, where=coordinates, columns=columns)
+            df = store[key]
+
+        # fixed format can only be read as a whole, select rows and columns in memory
+        if where is not None:
+            raise ValueError(
+                "where= queries require table format. Please convert {} first.".format(
+                    path
+                )
+            )
+        if sources is not None:
+            df = df[df["source"].isin(sources)]
+        if columns is not None:
+            df = df[columns]
+
+        return df.iloc[start:stop]
+
+    def columns(self, path, key):
+        with pd.HDFStore(path, mode="r") as store:
+            if store.get_storer(key).is_table:
+                return list(store.select(key, start=0, stop=0).columns)
+            return list(store[key].columns)
+
+    def nrows(self, path, key, sources=None):
+        with pd.HDFStore(path, mode="r") as store:
+            storer = store.get_storer(key)
+            if storer.is_table:
+                if sources is None:
+                    return storer.nrows
+                return len(store.select_as_coordinates(key, where=self._where(sources)))
+        return len(self.read(path, key, ["source"], sources))
+
+    def iterate(self, path, key, chunksize, columns=None, sources=None, where=None):
+        with pd.HDFStore(path, mode="r") as store:
+            if not store.get_storer(key).is_table:
+                raise ValueError(
+                    "Iterating requires table format. Please convert {} first.".format(
+                        path
+                    )
+                )
+            for chunk in store.select(
+                key,
+                where=self._where(sources, where),
+                columns=columns,
+                iterator=True,
+                chunksize=chunksize,
+            ):
+                yield chunk
+
+    def keys(self, path):
+        with pd.HDFStore(path, mode="r") as store:
+            # categorical columns store their categories in .../meta/... nodes
+            return [key.lstrip("/") for key in store.keys() if "/meta/" not in key]
+
+    def metadata(self, path):
+        # stored as JSON string in an attribute of the root node
+        with pd.HDFStore(path, mode="r") as store:
+            attrs = store.root._v_attrs
+            if "metadata" not in attrs:
+                return {}
+            return json.loads(attrs["metadata"])
+
+    def set_metadata(self, path, metadata):
+        with pd.HDFStore(path, mode="a") as store:
+            store.root._v_attrs["metadata"] = json.dumps(metadata, sort_keys=True)
+
+    def _append(self, store, key, df):
+        """Append df to key of an open store in table format."""
+        min_itemsize = {
+            column: max(longest_text(df, column), self.text_itemsize)
+            for column in self.text_columns
+            if column in df.columns
+        }
+
+        if len(df) == 0:
+            # pandas silently skips empty frames in table format, write a
+            # placeholder row and remove it to get an empty table of the same schema
+            if key not in store:
+                self._append(store, key, _placeholder_row(df))
+                store.remove(key, start=0, stop=1)
+            return
+
+        store.append(
+            key,
+            df,
+            format="table",
+            data_columns=[column for column in self.data_columns if column in df],
+            min_itemsize=min_itemsize or None,
+            chunksize=self.chunksize,
+            index=False,
+        )
+
+    @staticmethod
+    def _text_itemsize(storer, column="raw_text"):
+        """Width of a string column of a table in bytes (None for fixed format)."""
+        if not storer.is_table:
+            return None
+        for axis in storer.values_axes:
+            if column in axis.values:
+                return axis.itemsize
+        return None
+
+    def _where(self, sources=None, where=None):
+        """Combine a source selection and a where query to one query."""
+        conditions = []
+        if sources is not None:
+            conditions.append("source in {}".format([int(s) for s in sources]))
+        if where is not None:
+            conditions.append("({})".format(where))
+
+        if len(conditions) == 0:
+            return None
+        return " & ".join(conditions)
+
+
+class ParquetBackend(StorageBackend):
+    """Columnar storage with Apache Arrow/Parquet.
+
+    The dataset is a folder containing one parquet file per key. Rows are
+    grouped by source, so that every row group contains a single source and
+    filtering by source only reads the matching row groups. Files are read
+    memory-mapped and only the requested columns are decoded.
+    """
+
+    extension = ".parquet"
+
+    def __init__(self, row_group_size=10000, compression="zstd"):
+        """
+        Args:
+            row_group_size (int, optional): maximum number of rows per row group. Defaults to 10000.
+            compression (str, optional): parquet compression codec. Defaults to "zstd".
+        """
+        self.row_group_size = row_group_size
+        self.compression = compression
+
+    def write(self, path, frames):
+        if not exists(path):
+            os.makedirs(path)
+
+        for key, df in frames.items():
+            table = pa.Table.from_pandas(df, preserve_index=False)
+            with pq.ParquetWriter(
+                join(path, key + self.extension),
+                table.schema,
+                compression=self.compression,
+            ) as writer:
+                if "source" in df.columns and len(df) > 0:
+                    # one row group (or more) per source to allow row group filtering
+                    for source in sorted(df["source"].unique()):
+                        writer.write_table(
+                            pa.Table.from_pandas(
+                                df[df["source"] == source],
+                                schema=table.schema,
+                                preserve_index=False,
+                            ),
+                            row_group_size=self.row_group_size,
+                        )
+                else:
+                    writer.write_table(table, row_group_size=self.row_group_size)
+
+    def read(
+        self, path, key, columns=None, sources=None, where=None, start=None, stop=None
+    ):
+        if where is not None:
+            raise ValueError(
+                "where= queries are only supported by HDF5 files, use sources to filter parquet files."
+            )
+
+        if start is not None or stop is not None:
+            return self._read_rows(path, key, columns, sources, start, stop)
+
+        filters = None
+        if sources is not None:
+            filters = [("source", "in", list(sources))]
+
+        table = pq.read_table(
+            join(path, key + self.extension),
+            columns=columns,
+            filters=filters,
+            memory_map=True,
+        )
+        return table.to_pandas()
+
+    def _read_rows(self, path, key, columns, sources, start, stop):
+        """Read the rows start to stop of the view, decoding only the row groups containing them."""
+        parquet_file = pq.ParquetFile(join(path, key + self.extension), memory_map=True)
+        counts = self._row_group_rows(parquet_file, sources)
+        start, stop, _ = slice(start, stop).indices(int(counts.sum()))
+        stop = max(stop, start)
+
+        # row groups overlapping the rows start to stop (of the filtered view)
+        ends = np.cumsum(counts)
+        begins = ends - counts
+        groups = np.nonzero((counts > 0) & (ends > start) & (begins < stop))[0]
+
+        # the source column is needed for filtering even if it is not requested
+        read_columns = columns
+        if sources is not None and columns is not None and "source" not in columns:
+            read_columns = list(columns) + ["source"]
+        if len(groups) == 0:
+            df = parquet_file.schema_arrow.empty_table().to_pandas()
+        else:
+            df = parquet_file.read_row_groups(
+                groups.tolist(), columns=read_columns
+            ).to_pandas()
+        if sources is not None:
+            df = df[df["source"].isin(sources)]
+        if columns is not None:
+            df = df[list(columns)]
+
+        offset = begins[groups[0]] if len(groups) > 0 else 0
+        return df.iloc[start - offset : stop - offset].reset_index(drop=True)
+
+    @staticmethod
+    def _row_group_rows(parquet_file, sources=None):
+        """Number of rows of the given sources in every row group of parquet_file.
+
+        Row groups contain a single source (see write), so the counts are taken
+        from the row group statistics; the source column is only read for row
+        groups without statistics.
+        """
+        metadata = parquet_file.metadata
+        counts = np.array(
+            [metadata.row_group(i).num_rows for i in range(metadata.num_row_groups)],
+            dtype=np.int64,
+        )
+        if sources is None:
+            return counts
+
+        index = parquet_file.schema_arrow.get_field_index("source")
+        for i in range(metadata.num_row_groups):
+            statistics = metadata.row_group(i).column(index).statistics
+            if (
+                statistics is not None
+                and statistics.has_min_max
+                and statistics.min == statistics.max
+            ):
+                if statistics.min not in sources:
+                    counts[i] = 0
+            else:
+                source = parquet_file.read_row_group(i, columns=["source"])
+                counts[i] = int(source.to_pandas()["source"].isin(sources).sum())
+        return counts
+
+    def columns(self, path, key):
+        return pq.read_schema(join(path, key + self.extension)).names
+
+    def nrows(self, path, key, sources=None):
+        parquet_file = pq.ParquetFile(join(path, key + self.extension), memory_map=True)
+        return int(self._row_group_rows(parquet_file, sources).sum())
+
+    def iterate(self, path, key, chunksize, columns=None, sources=None, where=None):
+        if where is not None:
+            raise ValueError(
+                "where= queries are only supported by HDF5 files, use sources to filter parquet files."
+            )
+
+        # the source column is needed for filtering even if it is not requested
+        read_columns = columns
+        if sources is not None and columns is not None and "source" not in columns:
+            read_columns = list(columns) + ["source"]
+
+        parquet_file = pq.ParquetFile(join(path, key + self.extension), memory_map=True)
+        for batch in parquet_file.iter_batches(
+            batch_size=chunksize, columns=read_columns
+        ):
+            chunk = batch.to_pandas()
+            if sources is not None:
+                chunk = chunk[chunk["source"].isin(sources)]
+                if len(chunk) == 0:
+                    continue
+            if columns is not None:
+                chunk = chunk[columns]
+            yield chunk
+
+    def keys(self, path):
+        return sorted(
+            filename[: -len(self.extension)]
+            for filename in os.listdir(path)
+            if filename.endswith(self.extension)
+        )
+
+    def metadata(self, path):
+        if not exists(join(path, "metadata.json")):
+            return {}
+        with open(join(path, "metadata.json")) as file:
+            return json.load(file)
+
+    def set_metadata(self, path, metadata):
+        with open(join(path, "metadata.json"), "w") as file:
+            json.dump(metadata, file, indent=2, sort_keys=True)
+
+
+class ShardedBackend(StorageBackend):
+    """Dataset split into several balanced shard files.
+
+    The dataset is a folder containing manifest.json and one file per shard
+    (shard-000.h5, shard-001.h5, ...). Rows are distributed round-robin within
+    every source, so all shards have the same size and source proportions.
+    Every row keeps its position in the unsharded dataframe in the row_id column.
+    Reading the whole dataset merges all shards in the original order, single
+    shards can be read with read_shard (e.g. by parallel jobs).
+    """
+
+    extension = ".shards"
+    manifest = "manifest.json"
+
+    def __init__(self, num_shards=4, shard_extension=".h5"):
+        """
+        Args:
+            num_shards (int, optional): number of shards to write. Defaults to 4.
+            shard_extension (str, optional): storage format of the shards ('.h5' or '.parquet'). Defaults to '.h5'.
+        """
+        self.num_shards = num_shards
+        self.shard_extension = shard_extension
+
+    def write(self, path, frames):
+        if not exists(path):
+            os.makedirs(path)
+
+        shards = [{} for _ in range(self.num_shards)]
+        rows = {}
+        for key, df in frames.items():
+            df = df.assign(row_id=np.arange(len(df), dtype=np.int64))
+            shard_ids = self.assign_shards(df, self.num_shards)
+            for index in range(self.num_shards):
+                shards[index][key] = df[shard_ids == index]
+            rows[key] = [
+                int((shard_ids == index).sum()) for index in range(self.num_shards)
+            ]
+
+        for index, shard in enumerate(shards):
+            shard_path = self.shard_path(path, index)
+            get_backend(shard_path).write(shard_path, shard)
+
+        self._save_manifest(
+            path,
+            {
+                "num_shards": self.num_shards,
+                "shard_extension": self.shard_extension,
+                "rows": rows,
+            },
+        )
+
+    def append(self, path, key, df):
+        self.check_append(path, key, df)
+        manifest = self._load_manifest(path)
+        rows = manifest["rows"][key]
+
+        # new rows continue the row ids and go to the smallest shard
+        index = int(np.argmin(rows))
+        start = sum(rows)
+        df = df.assign(row_id=np.arange(start, start + len(df), dtype=np.int64))
+        shard_path = self.shard_path(path, index, manifest)
+        get_backend(shard_path).append(shard_path, key, df)
+
+        rows[index] += len(df)
+        self._save_manifest(path, manifest)
+
+    def check_append(self, path, key, df):
+        # every shard could receive the rows
+        for index in range(self.num_shards_of(path)):
+            shard_path = self.shard_path(path, index)
+            get_backend(shard_path).check_append(shard_path, key, df)
+
+    def read(
+        self, path, key, columns=None, sources=None, where=None, start=None, stop=None
+    ):
+        read_columns = columns
+        if columns is not None and "row_id" not in columns:
+            read_columns = list(columns) + ["row_id"]
+
+        df = pd.concat(
+            [
+                self.read_shard(path, index, key, read_columns, sources, where)
+                for index in range(self.num_shards_of(path))
+            ],
+            ignore_index=True,
+        )
+
+        # restore the order of the unsharded dataframe
+        df = df.sort_values("row_id", kind="mergesort").reset_index(drop=True)
+        if columns is None:
+            df = df.drop(columns="row_id")
+        else:
+            df = df[columns]
+
+        return df.iloc[start:stop]
+
+    def read_shard(self, path, index, key, columns=None, sources=None, where=None):
+        """Read the dataframe stored under key of a single shard.
+
+        Args:
+            path (str): path of the sharded dataset
+            index (int): index of the shard
+            key (str): key of the dataframe (e.g. "train" or "test")
+            columns (list, optional): only read these columns. Defaults to None (all columns).
+            sources (list, optional): only read rows with these source ids. Defaults to None (all rows).
+            where (str, optional): query on the source and rating columns. Defaults to None.
+
+        Return:
+            df (pandas dataframe): rows of the shard
+        """
+        shard_path = self.shard_path(path, index)
+        return get_backend(shard_path).read(shard_path, key, columns, sources, where)
+
+    def iterate(self, path, key, chunksize, columns=None, sources=None, where=None):
+        # chunks are yielded shard by shard
+        for index in range(self.num_shards_of(path)):
+            shard_path = self.shard_path(path, index)
+            for chunk in get_backend(shard_path).iterate(
+                shard_path, key, chunksize, columns, sources, where
+            ):
+                yield chunk
+
+    def columns(self, path, key):
+        shard_path = self.shard_path(path, 0)
+        return [
+            column
+            for column in get_backend(shard_path).columns(shard_path, key)
+            if column != "row_id"
+        ]
+
+    def nrows(self, path, key, sources=None):
+        if sources is None:
+            return sum(self._load_manifest(path)["rows"][key])
+        return sum(
+            get_backend(self.shard_path(path, index)).nrows(
+                self.shard_path(path, index), key, sources
+            )
+            for index in range(self.num_shards_of(path))
+        )
+
+    def keys(self, path):
+        return sorted(self._load_manifest(path)["rows"].keys())
+
+    def metadata(self, path):
+        return self._load_manifest(path).get("metadata", {})
+
+    def set_metadata(self, path, metadata):
+        manifest = self._load_manifest(path)
+        manifest["metadata"] = metadata
+        self._save_manifest(path, manifest)
+
+    def num_shards_of(self, path):
+        """Return the number of shards of a sharded dataset."""
+        return self._load_manifest(path)["num_shards"]
+
+    def shard_path(self, path, index, manifest=None):
+        """Return the path of a single shard."""
+        if manifest is None and exists(join(path, self.manifest)):
+            manifest = self._load_manifest(path)
+        extension = self.shard_extension
+        if manifest is not None:
+            extension = manifest["shard_extension"]
+        return join(path, "shard-{:03d}{}".format(index, extension))
+
+    @staticmethod
+    def assign_shards(df, num_shards):
+        """Distribute the rows of df round-robin within every source to num_shards shards."""
+        if "source" not in df.columns:
+            return np.arange(len(df)) % num_shards
+        return df.groupby("source", sort=False).cumcount().values % num_shards
+
+    def _load_manifest(self, path):
+        with open(join(path, self.manifest)) as file:
+            return json.load(file)
+
+    def _save_manifest(self, path, manifest):
+        with open(join(path, self.manifest), "w") as file:
+            json.dump(manifest, file, indent=2)
+
+
+def longest_text(df, column="raw_text"):
+    """Length of the longest text of a column of df in bytes (UTF-8 encoded)."""
+    longest = df[column].str.encode("utf-8").str.len().max()
+    return 0 if pd.isna(longest) else int(longest)
+
+
+def _placeholder_row(df):
+    """Single row with the columns and dtypes of df."""
+    values = {}
+    for column, dtype in df.dtypes.items():
+        if isinstance(dtype, pd.CategoricalDtype):
+            value = dtype.categories[0]
+        elif pd.api.types.is_bool_dtype(dtype):
+            value = False
+        elif pd.api.types.is_numeric_dtype(dtype):
+            value = 0
+        else:
+            value = ""
+        values[column] = pd.Series([value], dtype=dtype)
+    return pd.DataFrame(values, columns=df.columns)
+
+
+def get_backend(path):
+    """Select the storage backend based on the file extension of path.
+
+    Args:
+        path (str): path or filename of the dataset ('.h5', '.hdf5' or '.parquet')
+
+    Return:
+        backend (StorageBackend): storage backend for the given path
+    """
+    path = path.rstrip("/\\")
+    if path.endswith(".h5") or path.endswith(".hdf5"):
+        return HDF5Backend()
+    elif path.endswith(".parquet"):
+        return ParquetBackend()
+    elif path.endswith(ShardedBackend.extension):
+        # e.g. example.h5.shards contains the shards example.h5.shards/shard-000.h5, ...
+        shard_backend = get_backend(path[: -len(ShardedBackend.extension)])
+        return ShardedBackend(shard_extension=shard_backend.extension)
+    else:
+        raise ValueError(
+            "File extension of {} unknown. Please choose one of the following extensions: '.h5', '.hdf5', '.parquet', '.h5.shards', '.parquet.shards'".format(
+                path
+            )
+        )
+
+
+def convert(src_path, dst_path):
+    """Convert a dataset from one storage format to another (e.g. .h5 to .parquet).
+
+    Args:
+        src_path (str): path of the existing dataset
+        dst_path (str): path of the converted dataset, the extension selects the target format
+    """
+    src_backend = get_backend(src_path)
+    dst_backend = get_backend(dst_path)
+
+    frames = {
+        key: src_backend.read(src_path, key) for key in src_backend.keys(src_path)
+    }
+    dst_backend.write(dst_path, frames)
+
+    metadata = src_backend.metadata(src_path)
+    if metadata:
+        dst_backend.set_metadata(dst_path, metadata)
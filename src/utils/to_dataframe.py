@@ -1,21 +1,76 @@
+import functools
+import numpy as np
 import pandas as pd
 import os
-from os.path import join, abspath, dirname, isfile
+import shutil
+import uuid
+from concurrent.futures import ThreadPoolExecutor
+from os.path import join, abspath, dirname, exists, isdir, isfile
 from google_trans_new import google_translator
-from sklearn.model_selection import train_test_split
 import nlpaug.augmenter.word as naw
 import spacy
 from nltk.stem import SnowballStemmer
-from utils import downloader, exploration, normalization
+from utils import (
+    artifacts,
+    cache,
+    dataset,
+    dedup,
+    downloader,
+    exploration,
+    language,
+    normalization,
+    pipeline,
+    split,
+    storage,
+)
 
 # from preprocessing import get_stopwords
 
 
+# compact dtypes of the dataset columns
+SOURCE_DTYPE = pd.CategoricalDtype(categories=[0, 1, 2])
+RATING_DTYPE = np.float32
+TEXT_DTYPE = "string"
+
+# augmentation and lemmatization models, loaded once per (worker) process
+_models = {}
+
+
+def _text_comp19_sources():
+    """Files read by text_comp19_to_df."""
+    return [
+        join(
+            dirname(dirname(dirname(abspath(__file__)))),
+            "data",
+            "TextComplexityDE19/ratings.csv",
+        )
+    ]
+
+
+def _weebit_sources():
+    """Folders read by weebit_to_df."""
+    return [
+        join(
+            dirname(dirname(dirname(abspath(__file__)))),
+            "data",
+            "WeebitDataset",
+            "Texts-SeparatedByReadingLevel",
+        )
+    ]
+
+
+def _dw_sources():
+    """Files read by dw_to_df."""
+    return [join(dirname(dirname(dirname(abspath(__file__)))), "data", "dw.h5")]
+
+
+@cache.cached_source("TextComplexityDE19", 1, _text_comp19_sources)
 def text_comp19_to_df():
 
     """
     Returns a pandas Dataframe object with
-    the data of the TextComplexityDE19 dataset
+    the data of the TextComplexityDE19 dataset.
+    The result is cached in data/cache until ratings.csv changes.
     """
 
     # Path to relevant csv file
@@ -84,12 +139,31 @@ def replace_rating(x):
     else:
         return 0
 
+def read_weebit_file(path):
+
+    """
+    Reads one .txt file of the Weebit dataset and returns (rating, text).
+    The first line of each file contains the difficulty of the file,
+    the remaining lines are joined to the text.
+    """
+    # read and decode the whole file at once
+    with open(path, "rb") as file:
+        lines = file.read().decode("windows-1252").splitlines(keepends=True)
+
+    if len(lines) == 0:
+        return 0, ""
+
+    return replace_rating(lines[0]), "".join(lines[1:])
+
+
+@cache.cached_source("Weebit", 2, _weebit_sources)
 def weebit_to_df():
 
     """
     Returns a pandas Dataframe object with
     the translated data (from english to german)
     of the Weebit dataset.
+    The result is cached in data/cache until the Weebit files change.
     """
 
     # List paths of all .txt files
@@ -122,41 +196,29 @@ def weebit_to_df():
     # Check for availability of Weebit dataset
     print("Check for weebit dataset")
     if not (
-        isfile(elementary_path) and isfile(advanced_path) and isfile(intermediate_path)
+        isdir(elementary_path) and isdir(advanced_path) and isdir(intermediate_path)
     ):
         downloader.download_Weebit()
 
-    # create dictionary for creation of dataframe
-    data_dict = {"raw_text": [], "rating": [], "source": []}
-
-    # Read in .txt files and write to dataframe
-    for path in path_list:
-        for filename in os.listdir(path):
-            full_path_to_file = os.path.join(path, filename)
-
-            # omit first line of each file, it contains the difficulty of the file
-            omit = True
-            str_list = []
-
-            with open(full_path_to_file, encoding="windows-1252") as file:
-                for line in file:
-                    if omit:
-                        omit = False
-                        # write difficulty to dataframe
-                        data_dict["rating"].append(replace_rating(line))
-                        continue
-                    str_list.append(replace_rating(line))
-
-            # flatten list of line to one big string
-            text = ""
-            for i in range(0, len(str_list)):
-                text += str_list[i]
-
-            # create dataframe out of dictionary
-            data_dict["raw_text"].append(text)
-            data_dict["source"].append(1)
-
-    weebit_data = pd.DataFrame(data_dict)
+    # list all .txt files in a fixed order (os.listdir order depends on the file system)
+    file_paths = [
+        join(path, filename)
+        for path in path_list
+        for filename in sorted(os.listdir(path))
+    ]
+
+    # read in .txt files in parallel, map keeps the order of file_paths
+    with ThreadPoolExecutor(max_workers=min(32, 4 * os.cpu_count())) as executor:
+        rows = list(executor.map(read_weebit_file, file_paths))
+
+    # create dataframe
+    weebit_data = pd.DataFrame(
+        {
+            "raw_text": [text for rating, text in rows],
+            "rating": [rating for rating, text in rows],
+            "source": 1,
+        }
+    )
 
     # translate weebit dataset to german
     print("Translating Weebit dataset to german...")
@@ -182,14 +244,19 @@ def store_translated_weebit_h5():
     # define path of .HDF5 file
     h5_path = join(dirname(dirname(dirname(abspath(__file__)))), "data", filename)
 
-    translated_weebit.to_hdf(h5_path, key="Weebit", mode="w")
+    storage.HDF5Backend().write(
+        h5_path, {"Weebit": storable_dtypes(compact_dtypes(translated_weebit))}
+    )
 
 
+@cache.cached_source("dw", 2, _dw_sources)
 def dw_to_df():
 
     """ "
     Returns a pandas Dataframe object with
-    the data of the dw dataset
+    the data of the dw dataset.
+    The column parent identifies the article (url) of every text and paragraph.
+    The result is cached in data/cache until dw.h5 changes.
     """
 
     # .h5 file path
@@ -212,7 +279,10 @@ def dw_to_df():
     # merge dataframes on url and append paragraphs and text to one dataframe
     merged = text_df.merge(pages_df, left_on="url", right_on="url")
     merged2 = paragraphs_df.merge(pages_df, left_on="url", right_on="url")
-    joined = merged.append(merged2, ignore_index=True)
+    joined = pd.concat([merged, merged2], ignore_index=True)
+
+    # paragraphs repeat the text of their article (see dedup.MinHashLSH.groups)
+    joined["parent"] = pd.factorize(joined["url"])[0].astype(np.int32)
 
     # Rename, delete columns and insert source of this dataframe for consistency
     dw_set = joined.drop(
@@ -236,90 +306,136 @@ def dw_to_df():
     return dw_set
 
 
-def all_data(use_textcomp19=False, use_weebit=False, use_dw=False):
+def memory_usage_mb(df):
+    """Return the deep memory usage of a dataframe in megabytes.
+
+    Args:
+        df (pandas dataframe): dataframe to measure
 
+    Return:
+        memory (float): memory usage in MB (including the content of object columns)
     """
-    returns one dataframe for all datasets specified with true as arguments.
-    The datasets are also cleared of "\n" and other special symbols,
-    numbers, whitespace sequences.
-    Also word count and flesch readability index is added to data.
+    return df.memory_usage(deep=True).sum() / 1024 ** 2
+
+
+def compact_dtypes(df):
+    """Cast the dataset columns to compact dtypes.
+
+    source is stored as a small categorical, rating as float32 and raw_text
+    as pandas string dtype. Columns that are not present are left untouched.
+
+    Args:
+        df (pandas dataframe): dataframe with (some of) the columns raw_text, rating, source
+
+    Return:
+        df (pandas dataframe): dataframe with compact dtypes
     """
+    dtypes = {}
+    if "source" in df.columns:
+        dtypes["source"] = SOURCE_DTYPE
+    if "rating" in df.columns:
+        dtypes["rating"] = RATING_DTYPE
+    if "raw_text" in df.columns:
+        dtypes["raw_text"] = TEXT_DTYPE
 
-    # load all datasets into dataframes and store them in variables
-    if use_textcomp19 == True:
-        text_comp19 = text_comp19_to_df()
+    return df.astype(dtypes, copy=False)
 
-    if use_dw == True:
-        dw = dw_to_df()
 
-    if use_weebit == True:
-        # check if translated weebit dataset exists as .h5 file.
-        print("Check if translated weebit dataset exists...")
+def storable_dtypes(df):
+    """Cast compact dtypes back to dtypes supported by every HDF5 format.
 
-        # define filename of .HDF5 file
-        filename = "Weebit_translated.h5"
+    HDF5 can not store string extension columns and categorical columns only in
+    table format, therefore source is written as int8 and raw_text as object column.
 
-        # define path of .HDF5 file
-        h5_path = join(dirname(dirname(dirname(abspath(__file__)))), "data", filename)
+    Args:
+        df (pandas dataframe): dataframe with compact dtypes
 
-        if isfile(h5_path):
-            # read in .HDF5 file
-            weebit_h5obj = pd.HDFStore(h5_path, "r")
-            weebit = weebit_h5obj["Weebit"]
+    Return:
+        df (pandas dataframe): dataframe that can be written with DataFrame.to_hdf
+    """
+    dtypes = {}
+    if "source" in df.columns:
+        dtypes["source"] = np.int8
+    if "rating" in df.columns:
+        dtypes["rating"] = RATING_DTYPE
+    if "raw_text" in df.columns:
+        dtypes["raw_text"] = object
 
-        else:
-            # store the translated weebit dataset in a .h5 file
-            store_translated_weebit_h5()
-            # read in .HDF5 file
-            weebit_h5obj = pd.HDFStore(h5_path, "r")
-            weebit = weebit_h5obj["Weebit"]
+    return df.astype(dtypes, copy=False)
+
+
+def assemble_datasets(frames):
+    """Concatenate the dataframes of several datasets in one allocation.
 
-    # append all dataframes to one dataframe
-    if use_dw and use_weebit and use_textcomp19:
-        all_dataset = text_comp19.append(weebit, ignore_index=True)
-        all_dataset = all_dataset.append(dw, ignore_index=True)
+    Every dataframe is cast to compact dtypes before the concatenation, so the
+    combined corpus is never materialized with the original wide dtypes.
+    The memory saved compared to the input dataframes is printed.
+
+    Args:
+        frames (list): list of pandas dataframes with columns raw_text, rating, source
 
-    if use_textcomp19 and not use_weebit and not use_dw:
-        all_dataset = text_comp19
+    Return:
+        dataset (pandas dataframe): one dataframe containing all rows of the given dataframes
+    """
+    if len(frames) == 0:
+        raise ValueError(
+            "No dataset selected. Please select at least one of the following datasets: 'TextComplexityDE19', 'Weebit', 'dw'"
+        )
+
+    memory_before = sum(memory_usage_mb(frame) for frame in frames)
+    dataset = pd.concat(
+        [compact_dtypes(frame) for frame in frames], ignore_index=True, copy=False
+    )
+    memory_after = memory_usage_mb(dataset)
 
-    if use_weebit and not use_textcomp19 and not use_dw:
-        all_dataset = weebit
+    print(
+        "Assembled {} rows: {:.1f} MB -> {:.1f} MB (saved {:.1f} MB)".format(
+            len(dataset), memory_before, memory_after, memory_before - memory_after
+        )
+    )
 
-    if use_dw and not use_textcomp19 and not use_weebit:
-        all_dataset = dw
+    return dataset
 
-    if use_dw and use_weebit and not use_textcomp19:
-        all_dataset = dw.append(weebit, ignore_index=True)
 
-    if use_textcomp19 and use_weebit and not use_dw:
-        all_dataset = text_comp19.append(weebit, ignore_index=True)
+def clean_texts(all_dataset, verbose=True):
+    """Clear the texts of "\n" and other special symbols, numbers, whitespace sequences.
 
-    if use_textcomp19 and use_dw and not use_weebit:
-        all_dataset = text_comp19.append(dw, ignore_index=True)
+    Used by all_data and applied chunk by chunk in streaming mode.
 
+    Args:
+        all_dataset (pandas dataframe): dataframe with columns raw_text, rating, source
+        verbose (bool, optional): print every cleaning step. Defaults to True.
 
+    Return:
+        all_dataset (pandas dataframe): dataframe with cleaned, lower case texts in compact dtypes
+    """
     # delete "\n" and other special symbols
-    print("removing newline command")
+    if verbose:
+        print("removing newline command")
     all_dataset.replace("\n", "", regex=True, inplace=True)
 
     # remove numbers from data
-    print("removing numbers from data")
+    if verbose:
+        print("removing numbers from data")
     all_dataset.raw_text.replace(r"\d", "", regex=True, inplace=True)
 
     # remove punctuation from data
-    print("removing punctuation from data")
+    if verbose:
+        print("removing punctuation from data")
     all_dataset["raw_text"] = all_dataset["raw_text"].apply(
         lambda x: exploration.remove_punctuation(x)
     )
 
     # remove whitespace from data
-    print("removing whitespace sequences from data")
+    if verbose:
+        print("removing whitespace sequences from data")
     all_dataset["raw_text"] = all_dataset["raw_text"].apply(
         lambda x: exploration.remove_whitespace(x)
     )
 
     # Normalize Sentences
-    print("Normalizing sentences")
+    if verbose:
+        print("Normalizing sentences")
     all_dataset["raw_text"] = all_dataset["raw_text"].apply(lambda x: x.lower())
 
     # add word count to data
@@ -330,6 +446,68 @@ def all_data(use_textcomp19=False, use_weebit=False, use_dw=False):
     # print("adding flesch readability index to data")
     # all_dataset['flesch_readablty'] = all_dataset['raw_text'].apply(textstat.flesch_reading_ease)
 
+    # the cleaning steps above return object columns, cast text back to compact dtype
+    all_dataset = compact_dtypes(all_dataset)
+
+    return all_dataset
+
+
+def all_data(
+    use_textcomp19=False, use_weebit=False, use_dw=False, language_threshold=None
+):
+
+    """
+    returns one dataframe for all datasets specified with true as arguments.
+    The datasets are also cleared of "\n" and other special symbols,
+    numbers, whitespace sequences.
+    Also word count and flesch readability index is added to data.
+    If language_threshold is given, rows detected as German with a lower
+    probability (e.g. untranslated or empty texts) are dropped.
+    """
+
+    # load all datasets into dataframes and store them in variables
+    if use_textcomp19 == True:
+        text_comp19 = text_comp19_to_df()
+
+    if use_dw == True:
+        dw = dw_to_df()
+
+    if use_weebit == True:
+        # check if translated weebit dataset exists as .h5 file.
+        print("Check if translated weebit dataset exists...")
+
+        # define filename of .HDF5 file
+        filename = "Weebit_translated.h5"
+
+        # define path of .HDF5 file
+        h5_path = join(dirname(dirname(dirname(abspath(__file__)))), "data", filename)
+
+        if not isfile(h5_path):
+            # store the translated weebit dataset in a .h5 file
+            store_translated_weebit_h5()
+
+        # read in .HDF5 file
+        weebit = pd.read_hdf(h5_path, "Weebit")
+
+    # concatenate all requested datasets in one allocation
+    frames = []
+    if use_textcomp19:
+        frames.append(text_comp19)
+    if use_weebit:
+        frames.append(weebit)
+    if use_dw:
+        frames.append(dw)
+    all_dataset = assemble_datasets(frames)
+
+    all_dataset = clean_texts(all_dataset)
+
+    # drop non-German and empty texts before any expensive preprocessing step
+    if language_threshold is not None:
+        print("Detecting language of texts")
+        all_dataset = language.filter_language(
+            all_dataset, "de", language_threshold
+        ).reset_index(drop=True)
+
     return all_dataset
 
 
@@ -343,6 +521,11 @@ def augmented_all(
     randword_swap=False,
     randword_del=False,
     test_size=0.1,
+    seed=0,
+    near_duplicates=None,
+    dedup_threshold=0.8,
+    language_threshold=None,
+    keep_augment_text=False,
 ):
 
     """
@@ -355,6 +538,17 @@ def augmented_all(
     randword_swap : enables randomly swapping words around sentences
     randword_del : enalbles randomly deleting words from sentences
     test_size : gives the ratio of test to train set
+    seed : seed of the train-test split, rows keep their split across all
+           variants created with the same test_size and seed (see split.py)
+    near_duplicates : None, "drop" (keep the first row of near-duplicate texts) or
+                      "group" (near-duplicates end up in the same split)
+    dedup_threshold : minimal Jaccard similarity of near-duplicates (see dedup.py)
+    language_threshold : drop rows detected as German with a lower probability
+                         (default None, no language filter)
+    keep_augment_text : keep the train texts before lemmatization/stemming in the
+                        column augment_text (for virtual augmentation)
+
+    Both sets contain a row_hash column identifying the text of each row.
 
     train_set, test_set = augmented_all()
 
@@ -363,124 +557,485 @@ def augmented_all(
     # Perform a Train-Test Split keeping dataset proportions the same
     print("perform train-test split keeping dataset proportions the same")
 
-    all_dataset = all_data(use_textcomp19, use_weebit, use_dw)
-    print("#####################",all_dataset[all_dataset["source"]==1])
+    all_dataset = all_data(use_textcomp19, use_weebit, use_dw, language_threshold)
 
-    if use_textcomp19:
-        text_comp_train, text_comp_test = train_test_split(
-            all_dataset[all_dataset["source"] == 0], test_size=test_size
+    # find near-duplicates (e.g. dw paragraphs and their text) before splitting
+    if near_duplicates == "drop":
+        all_dataset = dedup.drop_near_duplicates(
+            all_dataset, dedup_threshold
+        ).reset_index(drop=True)
+    elif near_duplicates == "group":
+        groups = dedup.MinHashLSH(dedup_threshold).groups(
+            all_dataset["raw_text"], all_dataset.get("parent")
+        )
+    elif near_duplicates is not None:
+        raise ValueError(
+            "near_duplicates {} unknown. Please choose one of the following options: 'drop', 'group'".format(
+                near_duplicates
+            )
         )
+    # the article ids of the dw rows are not stored
+    all_dataset = all_dataset.drop(columns="parent", errors="ignore")
+
+    # only TextComplexityDE19 provides a test set, the other datasets are used for training
+    train_frames = []
+    test_frames = []
+
+    # the split manifest is persisted and shared by all dataset variants
+    splits = split.split_rows(all_dataset, test_size, seed)
+    if near_duplicates == "group":
+        # all rows of a group follow the split of the first row of the group,
+        # groups containing Weebit or dw rows (always used for training) go to train
+        splits = splits[groups]
+        train_only = (all_dataset["source"] != 0).values
+        splits = np.where(np.isin(groups, groups[train_only]), "train", splits)
+
+    if use_textcomp19:
+        text_comp = (all_dataset["source"] == 0).values
+        train_frames.append(all_dataset[text_comp & (splits == "train")])
+        test_frames.append(all_dataset[text_comp & (splits == "test")])
 
     if use_weebit:
-        weebit_train = all_dataset[all_dataset["source"] == 1]
-        print(weebit_train)
+        train_frames.append(all_dataset[all_dataset["source"] == 1])
 
     if use_dw:
         dw_train = all_dataset[all_dataset["source"] == 2]
+        train_frames.append(dw_train)
+        if not use_textcomp19 and not use_weebit:
+            # added so that dataset with only dw can be created
+            test_frames.append(dw_train)
+
+    if len(test_frames) == 0:
+        # only Weebit (and dw) selected, they are used for training only
+        names = [
+            name for name, used in [("Weebit", use_weebit), ("dw", use_dw)] if used
+        ]
+        print("No {} test set available!".format(" and ".join(names)))
+        test_frames.append(all_dataset.iloc[0:0])
 
-    if use_textcomp19 and not use_weebit and not use_dw:                                  #0
-        all_dataset_train = text_comp_train
-        all_dataset_test = text_comp_test
+    all_dataset_train = assemble_datasets(train_frames)
+    all_dataset_test = assemble_datasets(test_frames)
 
-    if use_weebit and not use_textcomp19 and not use_dw:                                   #1
-        print("No weebit test set available!")
-        all_dataset_train = weebit_train
+    if near_duplicates is not None:
+        dedup.leakage_report(
+            all_dataset_train["raw_text"], all_dataset_test["raw_text"], dedup_threshold
+        )
 
-    if use_dw and not use_weebit and not use_textcomp19:                                  #2
-        print("No dw test set available!")
-        all_dataset_train = dw_train
-        all_dataset_test = dw_train # added so that dataset with only dw can be created
+    ## Augmentation of data (the same stages as in streaming mode, applied to the whole dataset)
+    print("Start augmenting Data...")
+    frames = {"train": all_dataset_train, "test": all_dataset_test}
 
-    if use_textcomp19 and use_weebit and not use_dw:                                       #01
-        all_dataset_train = text_comp_train.append(weebit_train, ignore_index=True)
-        all_dataset_test = text_comp_test
+    # Back and forth translation, random word swap and random word deletion
+    if backtrans or randword_swap or randword_del:
+        frames = _augment_chunk(
+            frames, backtrans, randword_swap, randword_del, use_weebit, verbose=True
+        )
 
-    if use_weebit and use_dw and not use_textcomp19:                                        #12
-        print("No weebit and dw test set available!")
-        all_dataset_train = weebit_train.append(dw_train, ignore_index=True)
+    if keep_augment_text:
+        frames = _keep_augment_text(frames)
 
-    if use_textcomp19 and use_dw and not use_weebit:                                        #02
-        all_dataset_train = text_comp_train.append(dw_train, ignore_index=True)
-        all_dataset_test = text_comp_test
+    # Lemmatization using spacy
+    if lemmatization == True:
+        print("lemmatizing")
+        frames = _lemmatize_chunk(frames)
 
-    if use_textcomp19 and use_weebit and use_dw:                                           # 012
-        all_dataset_train = text_comp_train.append(weebit_train, ignore_index=True)
-        all_dataset_train = all_dataset_train.append(dw_train, ignore_index=True)
+    # Stemming using
+    if stemming == True:
+        print("stemming")
+        frames = _stem_chunk(frames)
+
+    all_dataset_train = frames["train"]
+    all_dataset_test = frames["test"]
+
+    # identify rows by their final text, used as key by feature caches
+    all_dataset_train["row_hash"] = split.row_hashes(all_dataset_train["raw_text"])
+    all_dataset_test["row_hash"] = split.row_hashes(all_dataset_test["raw_text"])
+
+    return compact_dtypes(all_dataset_train), compact_dtypes(all_dataset_test)
+
+
+def _model(name):
+    """Return the augmentation/lemmatization model name, loaded once per process."""
+    if name not in _models:
+        if name == "backtrans":
+            _models[name] = naw.BackTranslationAug(
+                from_model_name="transformer.wmt19.de-en",
+                to_model_name="transformer.wmt19.en-de",
+            )
+        elif name == "swap":
+            _models[name] = naw.RandomWordAug(action="swap")
+        elif name == "delete":
+            _models[name] = naw.RandomWordAug()
+        elif name == "lemma":
+            _models[name] = spacy.load("de_core_news_sm")
+        elif name == "stem":
+            _models[name] = SnowballStemmer("german")
+    return _models[name]
+
+
+def iter_source_chunks(
+    use_textcomp19=False, use_weebit=False, use_dw=False, chunksize=10000
+):
+    """Yield the selected datasets in chunks, dataset by dataset like in all_data.
 
-        all_dataset_test = text_comp_test
+    TextComplexityDE19 and dw are streamed from their source cache, Weebit from
+    the translated Weebit file (see store_translated_weebit_h5).
 
-    ## Augmentation of data
-    print("Start augmenting Data...")
+    Args:
+        use_textcomp19 (bool, optional): stream TextComplexityDE19. Defaults to False.
+        use_weebit (bool, optional): stream Weebit. Defaults to False.
+        use_dw (bool, optional): stream dw. Defaults to False.
+        chunksize (int, optional): number of rows per chunk. Defaults to 10000.
 
-    # Back and forth translation of data
-    if backtrans == True:
+    Return:
+        chunks (generator): yields pandas dataframes with columns raw_text, rating, source
+    """
+    if use_textcomp19:
+        for chunk in text_comp19_to_df.iterate(chunksize):
+            yield chunk
 
-        print("Back and forth translation...")
-        back_translation_aug = naw.BackTranslationAug(
-            from_model_name="transformer.wmt19.de-en",
-            to_model_name="transformer.wmt19.en-de",
+    if use_weebit:
+        h5_path = join(
+            dirname(dirname(dirname(abspath(__file__)))), "data", "Weebit_translated.h5"
         )
-        if use_weebit:
-            translated = all_dataset_train[all_dataset_train["source"] != 1]
+        if not isfile(h5_path):
+            store_translated_weebit_h5()
+
+        with pd.HDFStore(h5_path, mode="r") as store:
+            is_table = store.get_storer("Weebit").is_table
+
+        if is_table:
+            for chunk in storage.HDF5Backend().iterate(h5_path, "Weebit", chunksize):
+                yield chunk
         else:
-            translated = all_dataset_train
+            # files written before the table format can only be read as a whole
+            weebit = pd.read_hdf(h5_path, "Weebit")
+            for start in range(0, len(weebit), chunksize):
+                yield weebit.iloc[start : start + chunksize]
+
+    if use_dw:
+        for chunk in dw_to_df.iterate(chunksize):
+            # the article ids are only used to find near-duplicates (see augmented_all)
+            yield chunk.drop(columns="parent", errors="ignore")
+
+
+def _split_chunk(chunk, manifest, only_dw=False):
+    """Split a cleaned chunk into train and test rows with the split manifest (like augmented_all)."""
+    splits = np.full(len(chunk), "train", dtype=object)
+    text_comp = (chunk["source"] == 0).values
+    if text_comp.any():
+        splits[text_comp] = manifest.reindex(
+            split.row_hashes(chunk["raw_text"][text_comp])
+        ).values
+        missing = pd.isna(splits[text_comp]).sum()
+        if missing > 0:
+            raise ValueError(
+                "{} TextComplexityDE19 rows are not in the split manifest. Please assign them with split.extend_manifest first.".format(
+                    missing
+                )
+            )
+
+    frames = {"train": chunk[splits == "train"], "test": chunk[splits == "test"]}
+    if only_dw:
+        # added so that dataset with only dw can be created
+        frames["test"] = chunk[chunk["source"] == 2]
+
+    return frames
+
+
+def _augment_chunk(
+    frames,
+    backtrans=False,
+    randword_swap=False,
+    randword_del=False,
+    use_weebit=False,
+    verbose=False,
+):
+    """Augment the train rows of a chunk (or of the whole dataset in augmented_all).
 
+    Every step appends an augmented copy of the train rows: backtranslation
+    (without the Weebit rows, which were translated already), then random word
+    swap and random word deletion of all rows so far.
+    """
+    train = frames["train"]
+
+    if backtrans:
+        if verbose:
+            print("Back and forth translation...")
+        if use_weebit:
+            translated = train[train["source"] != 1].copy()
+        else:
+            translated = train.copy()
         translated["raw_text"] = translated["raw_text"].apply(
-            lambda x: back_translation_aug.augment(x)
+            lambda x: _model("backtrans").augment(x)
+        )
+        train = pd.concat([train, translated], ignore_index=True, copy=False)
+
+    if randword_swap:
+        if verbose:
+            print("Random word swap")
+        swapped_data = train.copy()
+        swapped_data["raw_text"] = train["raw_text"].apply(
+            lambda x: _model("swap").augment(x)
         )
+        train = pd.concat([train, swapped_data], ignore_index=True, copy=False)
+
+    if randword_del:
+        if verbose:
+            print("Random word deletion")
+        rand_deleted_data = train.copy()
+        rand_deleted_data["raw_text"] = train["raw_text"].apply(
+            lambda x: _model("delete").augment(x)
+        )
+        train = pd.concat([train, rand_deleted_data], ignore_index=True, copy=False)
 
-        all_dataset_train = all_dataset_train.append(translated, ignore_index=True)
+    return {"train": train, "test": frames["test"]}
 
-    # Random word swap
-    if randword_swap == True:
-        print("Random word swap")
-        aug1 = naw.RandomWordAug(action="swap")
-        swapped_data = all_dataset_train
-        swapped_data["raw_text"] = all_dataset_train["raw_text"].apply(
-            lambda x: aug1.augment(x)
-        )
-        all_dataset_train = all_dataset_train.append(swapped_data, ignore_index=True)
 
-    # Random word deletion
-    if randword_del == True:
+def _lemmatize(text):
+    """Lemmatize a text using spacy."""
+    return " ".join([y.lemma_ for y in _model("lemma")(text)])
 
-        print("Random word deletion")
-        aug2 = naw.RandomWordAug()
-        rand_deleted_data = all_dataset_train
-        rand_deleted_data["raw_text"] = all_dataset_train["raw_text"].apply(
-            lambda x: aug2.augment(x)
-        )
-        all_dataset_train = all_dataset_train.append(
-            rand_deleted_data, ignore_index=True
-        )
 
-    # Lemmatization using spacy
-    if lemmatization == True:
+def _stem(text):
+    """Stem a text."""
+    return _model("stem").stem(text)
+
+
+def postprocess_text(text, lemmatization=False, stemming=False):
+    """Lemmatize and/or stem a single text like the rows of a stored dataset.
+
+    Used to process texts augmented on the fly (see augmentation.AugmentedTextDataset)
+    in the same order as the stored augmented copies: augmentation first, then
+    lemmatization and stemming.
+    """
+    if lemmatization:
+        text = _lemmatize(text)
+    if stemming:
+        text = _stem(text)
+    return text
 
-        print("lemmatizing")
-        nlp = spacy.load("de_core_news_sm")
-        all_dataset_train["raw_text"] = all_dataset_train["raw_text"].apply(
-            lambda x: " ".join([y.lemma_ for y in nlp(x)])
-        )
 
-        all_dataset_test["raw_text"] = all_dataset_test["raw_text"].apply(
-            lambda x: " ".join([y.lemma_ for y in nlp(x)])
+def _keep_augment_text(frames):
+    """Keep the train texts before lemmatization/stemming in the column augment_text.
+
+    Datasets with virtual augmentation and lemmatization/stemming need them to
+    augment the texts on the fly before lemmatizing/stemming them.
+    """
+    return {
+        key: df.assign(augment_text=df["raw_text"]) if key == "train" else df
+        for key, df in frames.items()
+    }
+
+
+def _lemmatize_chunk(frames):
+    """Lemmatize train and test rows of a chunk using spacy."""
+    return {
+        key: df.assign(raw_text=df["raw_text"].apply(_lemmatize))
+        for key, df in frames.items()
+    }
+
+
+def _stem_chunk(frames):
+    """Stem train and test rows of a chunk."""
+    return {
+        key: df.assign(raw_text=df["raw_text"].apply(_stem))
+        for key, df in frames.items()
+    }
+
+
+def _finish_chunk(frames):
+    """Add the row hashes and cast a chunk to the dtypes written to disk."""
+    return {
+        key: storable_dtypes(
+            compact_dtypes(df.assign(row_hash=split.row_hashes(df["raw_text"])))
         )
+        for key, df in frames.items()
+    }
 
-    # Stemming using
-    if stemming == True:
 
-        print("stemming")
-        stemmer = SnowballStemmer("german")
-        all_dataset_train["raw_text"] = all_dataset_train["raw_text"].apply(
-            lambda x: stemmer.stem(x)
+def _stream_manifest(
+    use_textcomp19, use_weebit, use_dw, test_size, seed, language_threshold, chunksize
+):
+    """Assign the TextComplexityDE19 rows of the streamed sources to the split manifest."""
+    print("Preparing split manifest...")
+    hashes = []
+    ratings = []
+    for chunk in iter_source_chunks(use_textcomp19, use_weebit, use_dw, chunksize):
+        text_comp = chunk[chunk["source"] == 0]
+        if len(text_comp) > 0:
+            text_comp = clean_texts(text_comp.copy(), verbose=False)
+            if language_threshold is not None:
+                text_comp = language.filter_language(
+                    text_comp, "de", language_threshold
+                )
+            hashes.append(split.row_hashes(text_comp["raw_text"]))
+            ratings.append(text_comp["rating"].values)
+
+    if len(hashes) == 0:
+        return split.load_manifest(test_size, seed)
+    hashes = np.concatenate(hashes)
+    return split.extend_manifest(
+        hashes, np.zeros(len(hashes)), np.concatenate(ratings), test_size, seed
+    )
+
+
+def stream_augmented_h5(
+    h5_path,
+    use_textcomp19=False,
+    use_weebit=False,
+    use_dw=False,
+    backtrans=False,
+    lemmatization=False,
+    stemming=False,
+    randword_swap=False,
+    randword_del=False,
+    test_size=0.1,
+    seed=0,
+    language_threshold=None,
+    chunksize=10000,
+    processes=0,
+    queue_size=4,
+    keep_augment_text=False,
+):
+    """Create the augmented dataset in streaming mode and write it to h5_path.
+
+    Instead of holding the whole corpus at every step of augmented_all, the rows
+    flow in chunks through the stages clean, language, split, augment, lemmatize
+    and stem (see pipeline.run_pipeline). The stages run concurrently and are
+    connected by bounded queues, the writer stores every finished chunk as parquet
+    part and the parts are appended to the HDF5 table at the end (the width of its
+    text column is only known then). Peak memory therefore depends on chunksize and
+    queue_size, not on the size of the datasets. The rows are the same as with augmented_all, but augmented rows
+    follow the chunk they were created from instead of being appended at the end.
+
+    Args:
+        h5_path (str): path of the .h5 file to write
+        use_textcomp19, use_weebit, use_dw (bool): datasets to use
+        backtrans, lemmatization, stemming, randword_swap, randword_del (bool): preprocessing steps, see augmented_all
+        test_size (float, optional): ratio of test to train set. Defaults to 0.1.
+        seed (int, optional): seed of the train-test split. Defaults to 0.
+        language_threshold (float, optional): minimal probability of a text being German. Defaults to None (keep all rows).
+        chunksize (int, optional): number of source rows per chunk. Defaults to 10000.
+        processes (int, optional): worker processes of each CPU-heavy stage. Defaults to 0 (one thread per stage).
+        queue_size (int, optional): maximal number of chunks waiting between two stages. Defaults to 4.
+        keep_augment_text (bool, optional): keep the train texts before lemmatization/stemming, see augmented_all. Defaults to False.
+    """
+    if not (use_textcomp19 or use_weebit or use_dw):
+        raise ValueError(
+            "No dataset selected. Please select at least one of the following datasets: 'TextComplexityDE19', 'Weebit', 'dw'"
+        )
+    if storage.get_backend(h5_path).extension != storage.HDF5Backend.extension:
+        raise ValueError(
+            "Streaming mode writes .h5 files only, {} is not supported.".format(h5_path)
         )
 
-        all_dataset_test["raw_text"] = all_dataset_test["raw_text"].apply(
-            lambda x: stemmer.stem(x)
+    # first pass: the manifest must contain every row before the chunks are split
+    manifest = _stream_manifest(
+        use_textcomp19,
+        use_weebit,
+        use_dw,
+        test_size,
+        seed,
+        language_threshold,
+        chunksize,
+    )
+
+    stages = [
+        pipeline.Stage(
+            "clean", functools.partial(clean_texts, verbose=False), processes
+        ),
+    ]
+    if language_threshold is not None:
+        # detection runs in worker processes itself and caches its results
+        stages.append(
+            pipeline.Stage(
+                "language",
+                functools.partial(
+                    language.filter_language,
+                    language="de",
+                    threshold=language_threshold,
+                ),
+            )
+        )
+    stages.append(
+        pipeline.Stage(
+            "split",
+            functools.partial(
+                _split_chunk,
+                manifest=manifest,
+                only_dw=use_dw and not use_textcomp19 and not use_weebit,
+            ),
+        )
+    )
+    if backtrans or randword_swap or randword_del:
+        stages.append(
+            pipeline.Stage(
+                "augment",
+                functools.partial(
+                    _augment_chunk,
+                    backtrans=backtrans,
+                    randword_swap=randword_swap,
+                    randword_del=randword_del,
+                    use_weebit=use_weebit,
+                ),
+                processes,
+            )
+        )
+    if keep_augment_text:
+        stages.append(pipeline.Stage("keep_augment_text", _keep_augment_text))
+    if lemmatization:
+        stages.append(pipeline.Stage("lemmatize", _lemmatize_chunk, processes))
+    if stemming:
+        stages.append(pipeline.Stage("stem", _stem_chunk, processes))
+    stages.append(pipeline.Stage("finish", _finish_chunk))
+
+    if exists(h5_path):
+        os.remove(h5_path)
+    # translated and lemmatized texts may be longer than the source texts, the
+    # chunks are kept as parquet parts until the longest text is known
+    parts_path = "{}.parts-{}".format(h5_path, uuid.uuid4().hex)
+    os.makedirs(parts_path)
+    parts = []
+    rows = {"train": 0, "test": 0}
+    longest = [0]
+    schema = {}
+
+    def write(frames):
+        for key, df in frames.items():
+            schema.setdefault(key, df.iloc[0:0])
+            if len(df) > 0:
+                part = join(parts_path, "part-{:06d}.parquet".format(len(parts)))
+                df.to_parquet(part, index=False)
+                parts.append((key, part))
+                for column in storage.HDF5Backend.text_columns:
+                    if column in df.columns:
+                        longest[0] = max(longest[0], storage.longest_text(df, column))
+                rows[key] += len(df)
+
+    try:
+        pipeline.run_pipeline(
+            iter_source_chunks(use_textcomp19, use_weebit, use_dw, chunksize),
+            stages,
+            write,
+            queue_size,
         )
 
-    return all_dataset_train, all_dataset_test
+        backend = storage.HDF5Backend()
+        backend.text_itemsize = max(longest[0], backend.text_itemsize)
+        for key, part in parts:
+            backend.append(h5_path, key, pd.read_parquet(part))
+        # e.g. the test set of a dataset without TextComplexityDE19
+        for key, empty in schema.items():
+            if rows[key] == 0:
+                backend.append(h5_path, key, empty)
+    finally:
+        shutil.rmtree(parts_path, ignore_errors=True)
+    print(
+        "Streamed {} train and {} test rows to {}".format(
+            rows["train"], rows["test"], h5_path
+        )
+    )
 
 
 def store_augmented_h5(
@@ -494,6 +1049,14 @@ def store_augmented_h5(
     randword_swap=False,
     randword_del=False,
     test_size=0.1,
+    seed=0,
+    quota=artifacts.DEFAULT_QUOTA,
+    num_shards=None,
+    streaming=False,
+    virtual_augmentation=False,
+    near_duplicates=None,
+    dedup_threshold=0.8,
+    language_threshold=None,
 ):
 
     """
@@ -508,40 +1071,224 @@ def store_augmented_h5(
     randword_swap : enables randomly swapping words around sentences
     randword_del : enables randomly deleting words from sentences
     test_size : gives the ratio of test to train set
-
-    The file is saved in the same data folder where the original data also resides.
+    seed : seed of the train-test split
+    quota : disk quota (in bytes) of all stored datasets, least recently used
+            datasets are removed when it is exceeded
+    num_shards : if given, the dataset is written as num_shards balanced shards
+                 (see storage.ShardedBackend and sharding.map_shards)
+    streaming : process the data in chunks with constant memory (see stream_augmented_h5)
+    virtual_augmentation : do not store the randword_swap/randword_del copies, the
+                           trainer applies them on the fly per epoch instead
+    near_duplicates : None, "drop" or "group" near-duplicate texts (see augmented_all)
+    dedup_threshold : minimal Jaccard similarity of near-duplicates
+    language_threshold : minimal probability of a text being German (default None, keep all rows)
+
+    The file is saved in the content-addressed artifact store (data/artifacts)
+    under a hash of the source datasets, the options above and the preprocessing
+    code. filename becomes an alias of the stored file. If a dataset with the same
+    hash was stored before, it is reused instead of preprocessing the data again.
     filename = "filename.h5", keys ="train","test"
     """
     # Ask user for filename
     if filename == "":
         filename = input("Please enter filename with .h5 at the end")
 
-    # define path of .HDF5 file
-    h5_path = join(dirname(dirname(dirname(abspath(__file__)))), "data", filename)
+    # the extension of filename selects the storage backend
+    extension = storage.get_backend(filename).extension
+
+    # content address of the dataset
+    store = artifacts.ArtifactStore(quota=quota)
+    source_paths = _selected_sources(use_textcomp19, use_weebit, use_dw)
+    options = {
+        "textcomp19": use_textcomp19,
+        "weebit": use_weebit,
+        "dw": use_dw,
+        "backtrans": backtrans,
+        "lemmatization": lemmatization,
+        "stemming": stemming,
+        "randword_swap": randword_swap,
+        "randword_del": randword_del,
+        "test_size": test_size,
+        "seed": seed,
+        "format": extension,
+        "num_shards": num_shards,
+        "streaming": streaming,
+        "virtual_augmentation": virtual_augmentation,
+        "near_duplicates": near_duplicates,
+        "dedup_threshold": dedup_threshold,
+        "language_threshold": language_threshold,
+    }
+
+    # reuse dataset stored before with the same sources, options and code
+    if all(exists(path) for path in source_paths):
+        key = artifacts.artifact_key(source_paths, options, _code_paths())
+        h5_path = store.lookup(key)
+        if h5_path is not None:
+            print("Found preprocessed dataset {}, skip preprocessing".format(h5_path))
+            store.alias(filename, key)
+            return
+
+    # virtual augmentation only stores the original rows, the trainer augments the
+    # texts kept before lemmatization/stemming and lemmatizes/stems them afterwards
+    keep_augment_text = (
+        virtual_augmentation
+        and (lemmatization or stemming)
+        and (randword_swap or randword_del)
+    )
+    if virtual_augmentation:
+        randword_swap = False
+        randword_del = False
+
+    if streaming:
+        if num_shards is not None:
+            raise ValueError("Streaming mode can not write sharded datasets.")
+        if near_duplicates is not None:
+            raise ValueError(
+                "Near-duplicates are found on the whole dataset, which is not possible in streaming mode."
+            )
+
+        # the key is known once the sources are downloaded, stream to a temporary
+        # file (unique, several runs may stream at the same time)
+        tmp_path = store.artifact_path(
+            "streaming-{}".format(uuid.uuid4().hex), extension
+        )
+        stream_augmented_h5(
+            tmp_path,
+            use_textcomp19,
+            use_weebit,
+            use_dw,
+            backtrans,
+            lemmatization,
+            stemming,
+            randword_swap,
+            randword_del,
+            test_size,
+            seed,
+            language_threshold,
+            keep_augment_text=keep_augment_text,
+        )
+        key = artifacts.artifact_key(source_paths, options, _code_paths())
+        h5_path = store.artifact_path(key, extension)
+        os.replace(tmp_path, h5_path)
+    else:
+        # Load augmented data into variables
+        all_dataset_train, all_dataset_test = augmented_all(
+            use_textcomp19,
+            use_weebit,
+            use_dw,
+            backtrans,
+            lemmatization,
+            stemming,
+            randword_swap,
+            randword_del,
+            test_size,
+            seed,
+            near_duplicates,
+            dedup_threshold,
+            language_threshold,
+            keep_augment_text,
+        )
 
-    # Load augmented data into variables
-    all_dataset_train, all_dataset_test = augmented_all(
-        use_textcomp19,
-        use_weebit,
-        use_dw,
-        backtrans,
-        lemmatization,
-        stemming,
-        randword_swap,
-        randword_del,
-        test_size,
+        # the source datasets were downloaded by augmented_all if they were missing
+        key = artifacts.artifact_key(source_paths, options, _code_paths())
+        if num_shards is None:
+            h5_path = store.artifact_path(key, extension)
+            backend = storage.get_backend(h5_path)
+        else:
+            h5_path = store.artifact_path(
+                key, extension + storage.ShardedBackend.extension
+            )
+            backend = storage.ShardedBackend(num_shards, extension)
+
+        # Write augmented data to the artifact path "h5_path"
+        backend.write(
+            h5_path,
+            {
+                "train": storable_dtypes(all_dataset_train),
+                "test": storable_dtypes(all_dataset_test),
+            },
+        )
+    # the options are needed to preprocess rows appended later (see append_new_rows)
+    storage.get_backend(h5_path).set_metadata(
+        h5_path, {"options": options, "version": 1}
     )
+    print("Save dataset {} to: {}".format(filename, h5_path))
 
-    # Write augmented data to h5 file at the above path "h5_path"
-    all_dataset_train.to_hdf(h5_path, key="train")
-    all_dataset_test.to_hdf(h5_path, key="test")
+    # register dataset and remove old datasets exceeding the disk quota
+    store.add(key, h5_path, options)
+    store.alias(filename, key)
+    store.evict()
 
 
-def read_augmented_h5(filename=""):
+def _selected_sources(use_textcomp19=False, use_weebit=False, use_dw=False):
+    """Files/folders of the selected source datasets."""
+    paths = []
+    if use_textcomp19:
+        paths += _text_comp19_sources()
+    if use_weebit:
+        paths += _weebit_sources()
+    if use_dw:
+        paths += _dw_sources()
+    return paths
+
+
+def _code_paths():
+    """Source files of the code that determines the content of a preprocessed dataset."""
+    # referred to by name, augmentation is not imported here (it needs torch)
+    utils_path = dirname(abspath(__file__))
+    return [
+        join(utils_path, name + ".py")
+        for name in [
+            "to_dataframe",
+            "exploration",
+            "split",
+            "dedup",
+            "language",
+            "normalization",
+            "augmentation",
+            "pipeline",
+            "storage",
+        ]
+    ]
+
+
+def dataset_path(filename):
+    """
+    Returns the path of a dataset file.
+    Filenames given to store_augmented_h5 resolve to their file in the
+    artifact store, all other filenames to the data folder.
     """
-    Args: filename (default empty, but will be prompted to enter name)
+    path = artifacts.ArtifactStore().resolve(filename)
+    if path is None:
+        path = join(dirname(dirname(dirname(abspath(__file__)))), "data", filename)
+    return path
 
-    Returns the augmented data from the stored .HDF5 file.
+
+def dataset_metadata(filename):
+    """
+    Returns the metadata of a stored dataset (preprocessing options and version,
+    empty for datasets created before the metadata was stored).
+
+    Args:
+    filename : name of the dataset, e.g. "example.h5"
+    """
+    h5_path = dataset_path(filename)
+    return storage.get_backend(h5_path).metadata(h5_path)
+
+
+def read_augmented_h5(
+    filename="", columns=None, sources=None, where=None, use_cache=True
+):
+    """
+    Args:
+    filename : (default empty, but will be prompted to enter name)
+    columns : only read these columns, e.g. ["raw_text", "rating"] (default all columns)
+    sources : only read rows of these datasets, e.g. [0, 2] (default all rows)
+    where : query on source and rating, e.g. "rating >= 2 & rating < 4" (.h5 files only)
+    use_cache : return the dataframes kept in memory by earlier reads of the
+                unchanged file (default True)
+
+    Returns the augmented data from the stored .HDF5 (or .parquet) file.
     Similar to augmented_all() with the difference that the
     data is not generated but read instead.
 
@@ -552,12 +1299,220 @@ def read_augmented_h5(filename=""):
         filename = input("Please enter filename with .h5 at the end")
 
     # define path of .HDF5 file
-    h5_path = join(dirname(dirname(dirname(abspath(__file__)))), "data", filename)
+    h5_path = dataset_path(filename)
+
+    # read in dataset file (or take it from the process-wide cache)
+    if use_cache:
+        reader = cache.datasets
+    else:
+        reader = storage.get_backend(h5_path)
+    train = reader.read(h5_path, "train", columns, sources, where)
+    test = reader.read(h5_path, "test", columns, sources, where)
+
+    return train, test
+
+
+def load_augmented(filename=""):
+    """
+    Returns lazy views on the train and test set of a stored augmented dataset.
+    Columns, row slices, per-source subsets and batches are only read from
+    the file when they are accessed, .to_pandas() materializes a whole view.
+
+    Args:
+    filename : name of the dataset file in the data folder (default empty, but will be prompted to enter name)
+
+    train_set, test_set = load_augmented("example.h5")
+    texts = train_set["raw_text"]
+    """
+    if filename == "":
+        filename = input("Please enter filename with .h5 at the end")
+
+    h5_path = dataset_path(filename)
+
+    return dataset.LazyDataset(h5_path, "train"), dataset.LazyDataset(h5_path, "test")
+
+
+def iter_augmented_h5(
+    filename, key="train", chunksize=10000, columns=None, sources=None, where=None
+):
+    """
+    Iterates over a stored augmented dataset in chunks without loading it whole.
+
+    Args:
+    filename : name of the dataset file in the data folder
+    key : "train" or "test"
+    chunksize : number of rows per chunk
+    columns : only read these columns (default all columns)
+    sources : only read rows of these datasets (default all rows)
+    where : query on source and rating (.h5 files only)
+
+    for chunk in iter_augmented_h5("example.h5"):
+        ...
+    """
+    h5_path = dataset_path(filename)
+
+    return storage.get_backend(h5_path).iterate(
+        h5_path, key, chunksize, columns, sources, where
+    )
+
+
+def append_augmented_h5(filename, train=None, test=None):
+    """
+    Appends rows to a stored augmented dataset (table format .h5 files only).
+
+    Args:
+    filename : name of the dataset file in the data folder
+    train : dataframe of rows to append to the train set
+    test : dataframe of rows to append to the test set
+    """
+    h5_path = dataset_path(filename)
+    backend = storage.get_backend(h5_path)
+
+    if train is not None and len(train) > 0:
+        backend.append(h5_path, "train", storable_dtypes(compact_dtypes(train)))
+    if test is not None and len(test) > 0:
+        backend.append(h5_path, "test", storable_dtypes(compact_dtypes(test)))
+
+
+def append_new_rows(filename, new_rows):
+    """
+    Appends new raw rows (e.g. newly published dw articles) to a stored dataset
+    without preprocessing the existing rows again.
+
+    The new rows are cleaned and assigned to train or test with the split manifest
+    of the dataset. Only the preprocessing steps enabled when the dataset was
+    created (stored in its metadata) are applied to them. Existing rows and their
+    row hashes do not change, so caches keyed by row hash stay valid.
+    The version stored in the metadata is increased by one.
+
+    Args:
+    filename : name of the stored dataset, e.g. "example.h5" (table format .h5 files only)
+    new_rows : dataframe with columns raw_text, rating, source
+
+    Returns the new version of the dataset.
+    """
+    h5_path = dataset_path(filename)
+    backend = storage.get_backend(h5_path)
+    # e.g. parquet files, rejected before the rows are preprocessed
+    backend.check_append(h5_path, "train", new_rows.iloc[0:0])
+
+    metadata = backend.metadata(h5_path)
+    if "options" not in metadata:
+        raise ValueError(
+            "{} has no preprocessing options stored. Please create it again with --create_h5.".format(
+                filename
+            )
+        )
+    options = metadata["options"]
+
+    selected = [
+        source
+        for source, used in enumerate(
+            [options["textcomp19"], options["weebit"], options["dw"]]
+        )
+        if used
+    ]
+    if not new_rows["source"].isin(selected).all():
+        raise ValueError(
+            "{} only contains rows of the sources {}.".format(filename, selected)
+        )
+
+    print("Preprocessing {} new rows".format(len(new_rows)))
+    chunk = clean_texts(new_rows[["raw_text", "rating", "source"]].copy())
+    if options.get("language_threshold") is not None:
+        chunk = language.filter_language(chunk, "de", options["language_threshold"])
+
+    # new TextComplexityDE19 rows follow the split policy of the existing rows,
+    # the manifest is only saved once the rows are known to fit into the dataset
+    text_comp = chunk[chunk["source"] == 0]
+    hashes = split.row_hashes(text_comp["raw_text"])
+    manifest = split.extend_manifest(
+        hashes,
+        text_comp["source"].values,
+        text_comp["rating"].values,
+        options["test_size"],
+        options["seed"],
+        save=False,
+    )
+    frames = _split_chunk(
+        chunk,
+        manifest,
+        only_dw=options["dw"] and not options["textcomp19"] and not options["weebit"],
+    )
+
+    # run only the stages enabled for the dataset (virtual augmentation is not stored)
+    virtual = options.get("virtual_augmentation", False)
+    randword_swap = options["randword_swap"] and not virtual
+    randword_del = options["randword_del"] and not virtual
+    if options["backtrans"] or randword_swap or randword_del:
+        frames = _augment_chunk(
+            frames, options["backtrans"], randword_swap, randword_del, options["weebit"]
+        )
+    if (
+        virtual
+        and (options["lemmatization"] or options["stemming"])
+        and (options["randword_swap"] or options["randword_del"])
+    ):
+        frames = _keep_augment_text(frames)
+    if options["lemmatization"]:
+        frames = _lemmatize_chunk(frames)
+    if options["stemming"]:
+        frames = _stem_chunk(frames)
+    frames = _finish_chunk(frames)
+
+    # e.g. texts longer than the text column of a .h5 file, raised before any change
+    for key, df in frames.items():
+        if len(df) > 0:
+            backend.check_append(h5_path, key, df)
+
+    split.extend_manifest(
+        hashes,
+        text_comp["source"].values,
+        text_comp["rating"].values,
+        options["test_size"],
+        options["seed"],
+    )
+    for key, df in frames.items():
+        if len(df) > 0:
+            backend.append(h5_path, key, df)
+
+    metadata["version"] = metadata.get("version", 1) + 1
+    backend.set_metadata(h5_path, metadata)
+    print(
+        "Appended {} train and {} test rows to {} (version {})".format(
+            len(frames["train"]), len(frames["test"]), filename, metadata["version"]
+        )
+    )
+
+    # the content changed, so the dataset moves to a new content address
+    artifacts.ArtifactStore().rekey(
+        filename,
+        artifacts.appended_key(
+            h5_path, np.concatenate([df["row_hash"].values for df in frames.values()])
+        ),
+    )
+
+    return metadata["version"]
+
+
+def convert_augmented_h5(filename, target_filename=None):
+    """
+    Converts a stored augmented dataset to another storage format.
+
+    Args:
+    filename : name of the existing dataset file in the data folder, e.g. "example.h5"
+    target_filename : name of the converted dataset (default: filename with .parquet extension)
+
+    Returns the name of the converted dataset.
+    """
+    if target_filename is None:
+        target_filename = os.path.splitext(filename)[0] + ".parquet"
 
-    # read in .HDF5 file
-    data = pd.HDFStore(h5_path)
+    data_path = join(dirname(dirname(dirname(abspath(__file__)))), "data")
+    print("Converting {} to {}".format(filename, target_filename))
+    storage.convert(dataset_path(filename), join(data_path, target_filename))
 
-    return data["train"], data["test"]
+    return target_filename
 
 
 if __name__ == "__main__":
@@ -0,0 +1,148 @@
+import json
+import os
+from os.path import exists, join
+
+import nltk
+import numpy as np
+import spacy
+from utils import cache
+
+# version of the tokens, part of the key of cached corpora (see tokenize).
+# Increase it whenever _token_lists changes.
+TOKENS_VERSION = 1
+
+
+class TokenCorpus:
+    def __init__(self, vocabulary, ids, offsets):
+        """Tokenized texts stored as int32 token ids.
+
+        The tokens of text i are vocabulary[ids[offsets[i] : offsets[i + 1]]].
+
+        Args:
+            vocabulary (list): token of every token id
+            ids (numpy array): int32 token ids of all texts, concatenated
+            offsets (numpy array): int64 start of every text in ids, followed by len(ids)
+        """
+        self.vocabulary = vocabulary
+        self.ids = ids
+        self.offsets = offsets
+
+    def __len__(self):
+        return len(self.offsets) - 1
+
+    @classmethod
+    def from_documents(cls, documents):
+        """Build a corpus from token lists (2d list or generator of token lists)."""
+        vocabulary = {}
+        ids = []
+        offsets = [0]
+        for tokens in documents:
+            ids.extend(
+                vocabulary.setdefault(token, len(vocabulary)) for token in tokens
+            )
+            offsets.append(len(ids))
+
+        return cls(
+            list(vocabulary),
+            np.array(ids, dtype=np.int32),
+            np.array(offsets, dtype=np.int64),
+        )
+
+    def documents(self):
+        """Return the texts as 2d list of tokens (list containing list of tokens for each text)."""
+        tokens = np.array(self.vocabulary, dtype=object)[self.ids]
+        return [
+            tokens[start:end].tolist()
+            for start, end in zip(self.offsets[:-1], self.offsets[1:])
+        ]
+
+    def save(self, path):
+        """Save the corpus to the folder path, vocabulary.json is written last."""
+        if not exists(path):
+            os.makedirs(path)
+        np.save(join(path, "ids.npy"), self.ids)
+        np.save(join(path, "offsets.npy"), self.offsets)
+        with open(join(path, "vocabulary.json"), "w", encoding="utf-8") as file:
+            json.dump(self.vocabulary, file, ensure_ascii=False)
+
+    @classmethod
+    def load(cls, path):
+        """Load a corpus saved by save, token ids are memory-mapped."""
+        with open(join(path, "vocabulary.json"), encoding="utf-8") as file:
+            vocabulary = json.load(file)
+        return cls(
+            vocabulary,
+            np.load(join(path, "ids.npy"), mmap_mode="r"),
+            np.load(join(path, "offsets.npy"), mmap_mode="r"),
+        )
+
+
+class Pretokenized:
+    def __init__(self, stopwords=None):
+        """Analyzer for sklearn vectorizers whose documents are token lists (see TokenCorpus.documents).
+
+        Replaces the regex tokenization of sklearn, so every vectorizer sees the
+        tokens of the shared tokenization layer. Stopwords are removed here,
+        because sklearn ignores stop_words if an analyzer is given.
+
+        Args:
+            stopwords (list, optional): List of stopwords. Defaults to None.
+        """
+        self.stopwords = frozenset(stopwords or [])
+
+    def __call__(self, tokens):
+        return [token for token in tokens if token not in self.stopwords]
+
+    def __repr__(self):
+        # stable representation, part of the cache key of fitted vectorizers
+        return "Pretokenized(stopwords={})".format(sorted(self.stopwords))
+
+
+def _token_lists(texts, method="spacy"):
+    """Yield the lower case tokens of every text."""
+    data = (str(text).lower() for text in texts)
+    if method == "nltk":
+        for line in data:
+            yield nltk.word_tokenize(line, language="german")
+    elif method == "spacy":
+        nlp = spacy.load("de_core_news_sm", disable=["tagger", "parser", "ner"])
+        # the remaining pipeline components do not change the tokens
+        for doc in nlp.tokenizer.pipe(data, batch_size=1000):
+            yield [token.text for token in doc if len(token.text) > 1]
+    else:
+        raise ValueError(
+            "method {} is not implemented. Please select one of following options: 'ntlk', 'spacy'".format(
+                method
+            )
+        )
+
+
+def tokenize(texts, method="spacy", persist=True):
+    """Tokenize texts once and share the result between all vectorizers.
+
+    The corpus is persisted in data/cache/tokens keyed by the checksum of the
+    texts, method and TOKENS_VERSION, later calls with the same texts (e.g. every
+    regression and vectorizer of benchmark_all) load it memory-mapped.
+
+    Args:
+        texts (array-like): sentences/documents
+        method (str, optional): packages to use for tokenization (options: 'nltk', 'spacy'). Defaults to 'spacy'.
+        persist (bool, optional): persist the corpus. Defaults to True (False for chunks of streamed data, which are seen once and would fill the cache with a copy of the corpus).
+
+    Return:
+        corpus (TokenCorpus): int32 token ids and vocabulary of texts
+    """
+    if not persist:
+        return TokenCorpus.from_documents(_token_lists(texts, method))
+
+    path = join(
+        cache.SOURCE_CACHE_PATH,
+        "tokens",
+        "{}-v{}-{}".format(method, TOKENS_VERSION, cache.texts_checksum(texts)[:16]),
+    )
+    if exists(join(path, "vocabulary.json")):
+        return TokenCorpus.load(path)
+
+    corpus = TokenCorpus.from_documents(_token_lists(texts, method))
+    corpus.save(path)
+    return corpus
@@ -1,3 +1,4 @@
+import functools
 import os
 from os.path import abspath, dirname, join, exists
 import multiprocessing
@@ -10,7 +11,7 @@ from sklearn.metrics import r2_score
 from torch.utils.data import DataLoader, TensorDataset
 import torch.optim as opt
 import matplotlib.pyplot as plt
-from utils import BERT, evaluater, gpu, regression, to_dataframe, sentencestats, architectures
+from utils import BERT, augmentation, cache, evaluater, gpu, regression, to_dataframe, sentencestats, architectures
 from tqdm import tqdm
 
 
@@ -67,17 +68,23 @@ def train_model(
     print("Training on:", device)
     print("Number of CPU cores detected:", num_workers)
 
-    # read data
-    df_train, df_test = to_dataframe.read_augmented_h5(filename)
+    # lazy views on the data, columns are only read when they are used
+    df_train, df_test = to_dataframe.load_augmented(filename)
 
     # setup BERT model
     bert_model = BERT.BERT()
 
-    # prepare BERT input
+    # random swap/deletion of datasets created with --virtual_augmentation
+    options = to_dataframe.dataset_metadata(filename).get("options", {})
+    virtual = None
+    if options.get("virtual_augmentation"):
+        virtual = augmentation.VirtualAugmentation(
+            options["randword_swap"], options["randword_del"], options["seed"]
+        )
+        print("Augmenting train set on the fly (random word swap/deletion per epoch)")
+
     train_sentences = df_train.raw_text.values
     test_sentences = df_test.raw_text.values
-    train_input_tensor, train_segment_tensor = bert_model.preprocessing(train_sentences)
-    test_input_tensor, test_segment_tensor = bert_model.preprocessing(test_sentences)
 
     # extract labels and cast to PyTorch tensor
     train_labels = torch.tensor(
@@ -86,64 +93,68 @@ def train_model(
     test_labels = torch.tensor(
         list(df_test.rating.values), dtype=torch.float
     ).unsqueeze_(1)
+    train_tensors = [train_labels]
+    test_tensors = [test_labels]
 
-    # prepare dataset
-    if engineered_features and multiple_dataset:
-        extra_train_feat = torch.from_numpy(
-            np.nan_to_num(sentencestats.construct_features(df_train.raw_text).values)
-        ).float()
-        extra_test_feat = torch.from_numpy(
-            np.nan_to_num(sentencestats.construct_features(df_test.raw_text).values)
-        ).float()
-        train_dataset_label = torch.tensor(
-            list(df_train.source.values), dtype=torch.float
-        ).unsqueeze_(1)
-        test_dataset_label = torch.tensor(
-            list(df_test.source.values), dtype=torch.float
-        ).unsqueeze_(1)
-        trainset = TensorDataset(
-            train_input_tensor,
-            train_segment_tensor,
-            train_labels,
-            extra_train_feat,
-            train_dataset_label,
-        )
-        testset = TensorDataset(
-            test_input_tensor,
-            test_segment_tensor,
-            test_labels,
-            extra_test_feat,
-            test_dataset_label,
+    # add engineered features
+    if engineered_features:
+        for sentences, tensors in [
+            (df_train.raw_text, train_tensors),
+            (df_test.raw_text, test_tensors),
+        ]:
+            tensors.append(
+                torch.from_numpy(
+                    np.nan_to_num(
+                        cache.cached_features(
+                            "sentencestats",
+                            sentences,
+                            sentencestats.construct_features,
+                        ).values
+                    )
+                ).float()
+            )
+
+    # add dataset label
+    if multiple_dataset:
+        train_tensors.append(
+            torch.tensor(list(df_train.source.values), dtype=torch.float).unsqueeze_(1)
         )
-    elif engineered_features:
-        extra_train_feat = torch.from_numpy(
-            np.nan_to_num(sentencestats.construct_features(df_train.raw_text).values)
-        ).float()
-        extra_test_feat = torch.from_numpy(
-            np.nan_to_num(sentencestats.construct_features(df_test.raw_text).values)
-        ).float()
-        trainset = TensorDataset(
-            train_input_tensor, train_segment_tensor, train_labels, extra_train_feat
+        test_tensors.append(
+            torch.tensor(list(df_test.source.values), dtype=torch.float).unsqueeze_(1)
         )
-        testset = TensorDataset(
-            test_input_tensor, test_segment_tensor, test_labels, extra_test_feat
+
+    # prepare dataset (input, segment, label, [extra features], [dataset label])
+    if virtual is None:
+        train_input_tensor, train_segment_tensor = bert_model.preprocessing(
+            train_sentences
         )
-    elif multiple_dataset:
-        train_dataset_label = torch.tensor(
-            list(df_train.source.values), dtype=torch.float
-        ).unsqueeze_(1)
-        test_dataset_label = torch.tensor(
-            list(df_test.source.values), dtype=torch.float
-        ).unsqueeze_(1)
         trainset = TensorDataset(
-            train_input_tensor, train_segment_tensor, train_labels, train_dataset_label
-        )
-        testset = TensorDataset(
-            test_input_tensor, test_segment_tensor, test_labels, test_dataset_label
+            train_input_tensor, train_segment_tensor, *train_tensors
         )
     else:
-        trainset = TensorDataset(train_input_tensor, train_segment_tensor, train_labels)
-        testset = TensorDataset(test_input_tensor, test_segment_tensor, test_labels)
+        # texts are augmented and encoded per epoch when they are loaded,
+        # engineered features are those of the original texts
+        augment_texts = None
+        postprocess = None
+        if "augment_text" in df_train.columns:
+            # lemmatized/stemmed dataset: augment the texts before lemmatization/stemming
+            # and lemmatize/stem them afterwards, like the stored augmented copies
+            augment_texts = df_train.augment_text.values
+            postprocess = functools.partial(
+                to_dataframe.postprocess_text,
+                lemmatization=options["lemmatization"],
+                stemming=options["stemming"],
+            )
+        trainset = augmentation.AugmentedTextDataset(
+            train_sentences,
+            train_tensors,
+            virtual,
+            functools.partial(BERT.encode_sentence, bert_model.tokenizer),
+            augment_texts=augment_texts,
+            postprocess=postprocess,
+        )
+    test_input_tensor, test_segment_tensor = bert_model.preprocessing(test_sentences)
+    testset = TensorDataset(test_input_tensor, test_segment_tensor, *test_tensors)
 
     # dataloader
     trainloader = DataLoader(
@@ -164,7 +175,7 @@ def train_model(
     # setup pretask
     if pretask_epoch is not None and pretask_file is not None:
         # read data
-        df_pretask, _ = to_dataframe.read_augmented_h5(pretask_file)
+        df_pretask, _ = to_dataframe.load_augmented(pretask_file)
         
         # prepare BERT input
         pretask_sentences = df_pretask.raw_text.values
@@ -178,8 +189,14 @@ def train_model(
         # prepare dataset
         if engineered_features:
             extra_pretask_feat = torch.from_numpy(
-                sentencestats.construct_features(pretask_sentences)
-            )
+                np.nan_to_num(
+                    cache.cached_features(
+                        "sentencestats",
+                        pretask_sentences,
+                        sentencestats.construct_features,
+                    ).values
+                )
+            ).float()
             pretask_set = TensorDataset(
                 pretask_input_tensor, pretask_segment_tensor, pretask_labels, extra_pretask_feat
             )
@@ -247,6 +264,8 @@ def train_model(
     for epoch in range(num_epoch):
         start = time.time()
         reg_model.train()
+        if virtual is not None:
+            trainset.set_epoch(epoch)
 
         print("Training:")
 
@@ -33,7 +33,9 @@ def traverser(
     """
 
     # read data
-    df_train, df_test = to_dataframe.read_augmented_h5(filename)
+    df_train, df_test = to_dataframe.read_augmented_h5(
+        filename, columns=["raw_text", "rating", "source"]
+    )
     df_train = df_train[
         df_train["source"] == "text_comp19"
     ]  # TODO: remove once Raoul fixes his dataloader
@@ -177,7 +179,7 @@ def traverser(
                 )
 
             # apply trained word2vec on testset
-            X_test = vec_object.vectorize(df_test.raw_text.values)
+            X_test = vec_object.transform(df_test.raw_text.values)
 
             # train linear regression
             reg = regression.baseline(features, y_train, "linear")
@@ -1,11 +1,56 @@
+import itertools
+
 from sklearn.feature_extraction.text import (
     CountVectorizer,
     HashingVectorizer,
     TfidfVectorizer,
 )
-from utils import preprocessing, to_dataframe, word2vec
+import scipy.sparse as sp
+from utils import (
+    cache,
+    parallel_vectorizer,
+    preprocessing,
+    to_dataframe,
+    tokenization,
+    word2vec,
+)
 import numpy as np
 
+# dtype policy of all vectorized features: float32 values, int32 indices
+FLOAT_DTYPE = np.float32
+INDEX_DTYPE = np.int32
+
+# version of the vectorized features, part of the cache key of fitted vectorizers
+# (see cache.cached_vectorizer). Increase it whenever the features change.
+# 2: float32 values and int32 indices
+# 3: tokens of the shared tokenization layer instead of the sklearn regex
+# 4: vectorized word2vec mean embedding, zero vector for texts without known words
+# 5: word2vec vectors saved next to the pickled vectorizer instead of inside it
+FEATURES_VERSION = 5
+
+
+def compact(features):
+    """Convert features to float32 values (and int32 indices for sparse matrices).
+
+    Halves memory and bandwidth of float64 features. Sparse matrices keep int64
+    indices only if they have more non-zeros or columns than int32 can index.
+
+    Args:
+        features [scipy sparse matrix or array-like]: vectorized features
+
+    Return:
+        features [scipy sparse matrix (csr) or 2d array]: features in the dtype policy
+    """
+    if not sp.issparse(features):
+        return np.asarray(features, dtype=FLOAT_DTYPE)
+
+    features = features.tocsr().astype(FLOAT_DTYPE, copy=False)
+    limit = np.iinfo(INDEX_DTYPE).max
+    if features.nnz <= limit and features.shape[1] <= limit:
+        features.indices = features.indices.astype(INDEX_DTYPE, copy=False)
+        features.indptr = features.indptr.astype(INDEX_DTYPE, copy=False)
+    return features
+
 
 def vectorizer_wrapper(
     data,
@@ -16,6 +61,7 @@ def vectorizer_wrapper(
     print_path=False,
 ):
     """Wrapper to combine word2vec wrapper with the count/tfidf/hashing vectorizer wrapper.
+       Fitted vectorizers and features are cached (see cache.cached_vectorizer), transform test data with transform.
 
        Written by Leo Nguyen. Contact Xenovortex, if problems arises.
 
@@ -30,25 +76,49 @@ def vectorizer_wrapper(
     """
 
     if vectorizer == "word2vec":
-        # tokenization + stopword removal
-        corpus = preprocessing.tokenizer(data, method="spacy")
 
-        # vectorization
-        return NN_vectorizer_wrapper(
-            corpus,
-            10,
-            0.05,
-            0.0001,
-            120,
-            10,
-            7,
-            "skip-gram",
+        def fit(texts):
+            # tokenization + stopword removal
+            corpus = preprocessing.tokenizer(texts, method="spacy")
+
+            # vectorization
+            features, model = NN_vectorizer_wrapper(
+                corpus,
+                10,
+                0.05,
+                0.0001,
+                120,
+                10,
+                7,
+                "skip-gram",
+                vectorizer,
+                "train",
+                True,
+                False,
+                print_path,
+            )
+            return compact(features), model
+
+        features, vec = cache.cached_vectorizer(
             vectorizer,
-            "train",
-            return_vectorizer,
-            False,
-            print_path,
+            data,
+            {
+                "version": FEATURES_VERSION,
+                "tokenizer": "spacy",
+                "epochs": 10,
+                "lr": 0.05,
+                "min_lr": 0.0001,
+                "num_features": 120,
+                "window_size": 10,
+                "min_count": 7,
+                "algorithm": "skip-gram",
+            },
+            fit,
         )
+        if return_vectorizer:
+            return features, vec
+        else:
+            return features
     elif vectorizer == "pretrained_word2vec":
         # tokenization + stopword removal
         corpus = preprocessing.tokenizer(data, method="spacy")
@@ -78,6 +148,8 @@ def ML_vectorizer_wrapper(
 ):
     """Takes in a numpy array of sentences and perform the selected vectorizer on the data.
        Returns a numpy array of sentence features represented by number vectors.
+       The vectorizers are fitted in parallel processes (see parallel_vectorizer) on the
+       tokens of the shared tokenization layer (see tokenization.tokenize).
 
        Written by Leo Nguyen. Contact Xenovortex, if problems arises.
 
@@ -85,7 +157,7 @@ def ML_vectorizer_wrapper(
         data (numpy array): 1d array containing sentences
         vectorizer (str, optional): Select the vectorizer type. Implemented so far are: 'tfidf', 'count', 'hash'. Defaults to 'tfidf'.
         stop_words (list, optional): List of stopwords. Defaults to None.
-        return_vectorizer (bool, optional): Return vectorizer model if true. Defaults to False.
+        return_vectorizer (bool, optional): Return vectorizer model (TextVectorizer) if true. Defaults to False.
 
     Returns:
         features [scipy sparse matrix (csr)]: document-term matrix with dimension (number of sentences, features per sentence)
@@ -93,14 +165,19 @@ def ML_vectorizer_wrapper(
 
     # apply selected vectorizer
     if vectorizer == "tfidf":
-        vec = TfidfVectorizer(encoding="ISO-8859-1", stop_words=stopwords)
-        features = vec.fit_transform(data)
+        model = TfidfVectorizer(
+            encoding="ISO-8859-1",
+            analyzer=tokenization.Pretokenized(stopwords),
+            dtype=FLOAT_DTYPE,
+        )
     elif vectorizer == "count":
-        vec = CountVectorizer(encoding="ISO-8859-1", stop_words=stopwords)
-        features = vec.fit_transform(data)
+        model = CountVectorizer(
+            encoding="ISO-8859-1",
+            analyzer=tokenization.Pretokenized(stopwords),
+            dtype=FLOAT_DTYPE,
+        )
     elif vectorizer == "hash":
-        vec = HashingVectorizer(encoding="ISO-8859-1", stop_words=stopwords)
-        features = vec.fit_transform(data)
+        model = hashing_vectorizer(stopwords)
     else:
         raise ValueError(
             "Vectorizer {} not implemented. Please select one of the following options: 'tfidf', 'count', 'hash'.".format(
@@ -108,12 +185,102 @@ def ML_vectorizer_wrapper(
             )
         )
 
+    # the parameters include the stopwords (part of the analyzer)
+    vec = TextVectorizer(model)
+    features, vec = cache.cached_vectorizer(
+        vectorizer,
+        data,
+        dict(model.get_params(), version=FEATURES_VERSION),
+        lambda texts: (vec.fit_transform(texts), vec),
+    )
+
     if return_vectorizer:
         return features, vec
     else:
         return features
 
 
+class TextVectorizer:
+    def __init__(self, model):
+        """Raw-text interface of a sklearn vectorizer analyzing token lists (see tokenization.Pretokenized).
+
+        Offers fit, transform and fit_transform on raw sentences like word2vec.word2vec,
+        texts are tokenized by the shared tokenization layer. Fitting and transforming
+        run in parallel processes (see parallel_vectorizer), features follow the dtype
+        policy (see compact).
+
+        Args:
+            model (object): sklearn CountVectorizer, TfidfVectorizer or HashingVectorizer
+        """
+        self.model = model
+
+    def fit(self, texts):
+        """Fit the vectorizer on raw texts."""
+        self.fit_transform(texts)
+        return self
+
+    def fit_transform(self, texts):
+        """Fit the vectorizer on raw texts and return their document-term matrix."""
+        tokens = tokenization.tokenize(texts).documents()
+        if isinstance(self.model, HashingVectorizer):
+            return compact(parallel_vectorizer.transform(self.model, tokens))
+        return compact(parallel_vectorizer.fit_transform(self.model, tokens))
+
+    def transform(self, texts, batch_size=100000, persist=True):
+        """Return the document-term matrix of raw texts (tokenized in batches of batch_size).
+        Set persist to False for chunks of streamed data (see tokenization.tokenize)."""
+        features = list(self.iter_transform(texts, batch_size, persist))
+        if len(features) == 0:
+            return compact(parallel_vectorizer.transform(self.model, []))
+        return compact(sp.vstack(features, format="csr"))
+
+    def iter_transform(self, texts, batch_size=100000, persist=False):
+        """Yield the document-term matrices of raw texts batch by batch.
+        texts can be any iterable (e.g. a generator reading a large file), only one batch is held in memory.
+        The tokens of the batches are only cached if persist is True."""
+        texts = iter(texts)
+        while True:
+            batch = list(itertools.islice(texts, batch_size))
+            if len(batch) == 0:
+                return
+            tokens = tokenization.tokenize(batch, persist=persist).documents()
+            yield compact(parallel_vectorizer.transform(self.model, tokens))
+
+
+def transform(vec_object, data):
+    """Vectorize data with a vectorizer returned by vectorizer_wrapper(..., return_vectorizer=True).
+       Features of data seen before by the same fitted vectorizer are read from the cache.
+
+    Args:
+        vec_object (object): fitted vectorizer (TextVectorizer or word2vec)
+        data (pandas series): 1d series containing sentences
+
+    Return:
+        features [scipy sparse matrix (csr) or 2d array]: features with dimension (number of sentences, features per sentence)
+    """
+    return cache.cached_transform(
+        vec_object, data, lambda texts: compact(vec_object.transform(texts))
+    )
+
+
+def hashing_vectorizer(stopwords=None):
+    """Hashing vectorizer with the settings of ML_vectorizer_wrapper.
+       It is stateless (no vocabulary is fitted), so chunks of a dataset can be transformed independently.
+       Transform token lists (see tokenization.TokenCorpus.documents) or wrap it into a TextVectorizer.
+
+    Args:
+        stopwords (list, optional): List of stopwords. Defaults to None.
+
+    Return:
+        vec (HashingVectorizer): vectorizer, call transform on every chunk
+    """
+    return HashingVectorizer(
+        encoding="ISO-8859-1",
+        analyzer=tokenization.Pretokenized(stopwords),
+        dtype=FLOAT_DTYPE,
+    )
+
+
 def NN_vectorizer_wrapper(
     corpus,
     epochs,
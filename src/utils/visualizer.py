@@ -30,7 +30,9 @@ def visualize_vectorizer(
     print("Visualize {} vectorizer with {} projection".format(vec, dim_reduc))
 
     # read data
-    df_train, df_test = to_dataframe.read_augmented_h5(filename)
+    df_train, df_test = to_dataframe.read_augmented_h5(
+        filename, columns=["raw_text", "rating"]
+    )
 
     # feature extraction
     if stopword is not None:
@@ -1,11 +1,16 @@
+import hashlib
+import itertools
+import json
 import multiprocessing
 import os
+import shutil
 from os.path import abspath, dirname, exists, join
 
 import numpy as np
+import scipy.sparse as sp
 from gensim.models import KeyedVectors
 from gensim.models.word2vec import Word2Vec
-from utils import downloader
+from utils import artifacts, downloader, tokenization
 
 
 class word2vec:
@@ -20,6 +25,7 @@ class word2vec:
         min_count=5,
         algorithm="skip-gram",
         pretrained=False,
+        top_n=100000,
     ):
         """Gensim Word2Vec wrapper class
 
@@ -35,6 +41,7 @@ class word2vec:
             min_count (int, optional): ignore words that occur less than min_count. Defaults to 5.
             algorithm (str, optional): choose between "CBOW" and "skip-gram". Defaults to "skip-gram".
             pretrained(bool, optional): will finetune a pretrained model instead from training from scratch
+            top_n (int, optional): restrict the pretrained vocabulary to the corpus and the top_n most frequent pretrained words (None: load the full vocabulary). Defaults to 100000.
         """
         self.corpus = corpus
         self.epochs = epochs
@@ -44,6 +51,7 @@ class word2vec:
         self.window_size = window_size
         self.min_count = min_count
         self.pretrained = pretrained
+        self.top_n = top_n
         self.model_path = join(
             dirname(dirname(dirname(abspath(__file__)))),
             "model",
@@ -63,6 +71,14 @@ class word2vec:
             "pretrained",
             "model.bin",
         )
+        # pretrained model in native gensim format (see convert_pretrained)
+        self.pretrained_native_path = join(
+            dirname(dirname(dirname(abspath(__file__)))),
+            "model",
+            "word2vec",
+            "pretrained",
+            "model.kv",
+        )
 
         if algorithm == "skip-gram":
             self.algorithm = 1
@@ -75,18 +91,41 @@ class word2vec:
                 )
             )
 
+    def __getstate__(self):
+        """Pickle the settings only (see cache.cached_vectorizer).
+
+        The training corpus, its features and the trainable gensim model are dropped,
+        the word vectors are saved separately with save_vectors.
+        """
+        state = dict(self.__dict__)
+        for name in ["corpus", "features", "model", "wv"]:
+            state.pop(name, None)
+        return state
+
+    def __setstate__(self, state):
+        self.__dict__.update(state)
+        self.corpus = None
+
+    def save_vectors(self, path):
+        """Save the word vectors in the native gensim format with separate .npy file."""
+        self.wv.save(path, sep_limit=0)
+
+    def load_vectors(self, path):
+        """Load word vectors saved with save_vectors (memory-mapped)."""
+        self.wv = KeyedVectors.load(path, mmap="r")
+
     def train(self, print_path=True):
         """Train Word2Vec model on corpus."""
         if self.pretrained:
             """Just load pretrained word2vec (finetuning not possible)"""
-            if not exists(self.pretrained_path):
+            if not exists(self.pretrained_native_path) and not exists(
+                self.pretrained_path
+            ):
                 downloader.download_file_from_google_drive(
                     "1aoblaJyK_nUpXMR_jP6EgKiY9MDGjY2W", self.pretrained_path
                 )
-            self.load_model(pretrained=True, print_path=False)
-            self.wv = self.model.wv
-            self.model.init_sims(replace=True)
-            self.save_model(print_path=print_path)
+            # normalized and memory-mapped, nothing to save
+            self.load_pretrained(print_path)
         else:
             self.model = Word2Vec(
                 self.corpus,
@@ -104,25 +143,74 @@ class word2vec:
             # self.model.init_sims(replace=True)
             self.save_model(print_path=print_path)
 
-    def transform(self, corpus=None):
-        """Vectorize the corpus with word2vec model"""
-        if corpus is None:
-            self.features = [
-                np.mean(
-                    [self.wv[word] for word in line if word in self.wv.vocab], axis=0
-                )
-                for line in self.corpus
-            ]
-        else:
-            return np.array(
-                [
-                    np.mean(
-                        [self.wv[word] for word in line if word in self.wv.vocab],
-                        axis=0,
-                    )
-                    for line in corpus
-                ]
-            )
+    def fit(self, texts, print_path=False):
+        """Tokenize raw texts and train Word2Vec model on them."""
+        self.corpus = tokenization.tokenize(texts).documents()
+        self.train(print_path)
+        return self
+
+    def fit_transform(self, texts, print_path=False):
+        """Train Word2Vec model on raw texts and return their sentence vectors."""
+        self.fit(texts, print_path)
+        return self.transform()
+
+    def transform(self, texts=None, batch_size=100000, persist=True):
+        """Vectorize raw texts with word2vec model (tokenized in batches of batch_size).
+        Without texts, the training corpus is vectorized and stored in self.features.
+        Set persist to False for chunks of streamed data (see tokenization.tokenize)."""
+        if texts is None:
+            self.features = self.embed(self.corpus)
+            return self.features
+
+        features = list(self.iter_transform(texts, batch_size, persist))
+        if len(features) == 0:
+            return np.empty((0, self.wv.vector_size), dtype=np.float32)
+        return np.concatenate(features)
+
+    def iter_transform(self, texts, batch_size=100000, persist=False):
+        """Yield the sentence vectors of raw texts batch by batch.
+        texts can be any iterable (e.g. a generator reading a large file), only one batch is held in memory.
+        The tokens of the batches are only cached if persist is True."""
+        texts = iter(texts)
+        while True:
+            batch = list(itertools.islice(texts, batch_size))
+            if len(batch) == 0:
+                return
+            yield self.embed(tokenization.tokenize(batch, persist=persist))
+
+    def embed(self, corpus):
+        """Mean word vector of every text of corpus (TokenCorpus or 2d list of tokens).
+
+        Every distinct token is looked up in the vocabulary once. The word vectors
+        are averaged per text by one sparse matrix product of the (texts x words)
+        token counts with wv.vectors, divided by the number of known words.
+        Texts without any known word get the zero vector.
+
+        Return:
+            features (numpy array): float32 array with dimension (number of texts, vector size)
+        """
+        if not isinstance(corpus, tokenization.TokenCorpus):
+            corpus = tokenization.TokenCorpus.from_documents(corpus)
+
+        # row in wv.vectors of every token id, -1 for unknown words
+        rows = np.fromiter(
+            (
+                self.wv.vocab[word].index if word in self.wv.vocab else -1
+                for word in corpus.vocabulary
+            ),
+            dtype=np.int64,
+            count=len(corpus.vocabulary),
+        )[corpus.ids]
+        known = rows >= 0
+        text_ids = np.repeat(np.arange(len(corpus)), np.diff(corpus.offsets))[known]
+        counts = sp.csr_matrix(
+            (np.ones(len(text_ids), dtype=np.float32), (text_ids, rows[known])),
+            shape=(len(corpus), len(self.wv.vectors)),
+        )
+
+        features = np.ascontiguousarray(counts @ self.wv.vectors, dtype=np.float32)
+        features /= np.maximum(np.bincount(text_ids, minlength=len(corpus)), 1)[:, None]
+        return features
 
     def save_model(self, print_path=True):
         """Save word2vec model and wordvectors"""
@@ -137,16 +225,129 @@ class word2vec:
             print("Save trained word2vec model to: {}".format(self.model_path))
             print("Save wordvectors of word2vec model to: {}".format(self.wv_path))
 
+    def convert_pretrained(self, print_path=True):
+        """Convert the pretrained word2vec binary once to the native gensim format.
+
+        The vectors are L2-normalized before saving (like init_sims(replace=True)) and
+        stored as separate .npy file, so load_model can memory-map them: processes
+        using the pretrained model share the same physical pages instead of parsing
+        and normalizing the binary every time.
+        """
+        model = KeyedVectors.load_word2vec_format(self.pretrained_path, binary=True)
+        model.init_sims(replace=True)
+
+        # write under a temporary name, concurrent processes only see complete files
+        tmp_path = "{}.tmp-{}".format(self.pretrained_native_path, os.getpid())
+        model.save(tmp_path, sep_limit=0)
+        os.replace(
+            tmp_path + ".vectors.npy", self.pretrained_native_path + ".vectors.npy"
+        )
+        os.replace(tmp_path, self.pretrained_native_path)
+        if print_path:
+            print(
+                "Convert pretrained word2vec model to: {}".format(
+                    self.pretrained_native_path
+                )
+            )
+
+    def restrict_pretrained(
+        self, corpus, top_n=100000, print_path=True, quota=artifacts.DEFAULT_QUOTA
+    ):
+        """Save the pretrained vectors of the corpus vocabulary as compact subset model.
+
+        The pretrained vocabulary is far larger than the vocabulary of our corpora.
+        The subset keeps the rows of all corpus words known to the pretrained model
+        and the top_n most frequent pretrained words (the pretrained model is ordered
+        by frequency), so words of unseen texts are still covered. It is saved in
+        the native format with separate .npy file (memory-mappable) in the artifact
+        store (see artifacts.ArtifactStore), keyed by the corpus vocabulary and top_n.
+        The full model is only loaded to create it, subsets of corpora not used
+        recently are evicted together with old datasets when the quota is exceeded.
+
+        Args:
+            corpus (2d list): 2d list of tokens for each sentence
+            top_n (int, optional): number of most frequent pretrained words to keep in addition. Defaults to 100000.
+            print_path (bool, optional): print path and corpus coverage of the subset. Defaults to True.
+            quota (int, optional): disk quota in bytes of the artifact store. Defaults to 20 GB.
+
+        Return:
+            path (str): path of the subset model
+        """
+        corpus = tokenization.TokenCorpus.from_documents(corpus)
+        key = "word2vec-subset-{}".format(
+            hashlib.sha1(
+                json.dumps([sorted(corpus.vocabulary), top_n]).encode("utf-8")
+            ).hexdigest()[:16]
+        )
+        store = artifacts.ArtifactStore(quota=quota)
+        folder = store.lookup(key)
+        if folder is not None:
+            return join(folder, "subset.kv")
+
+        self.load_model(pretrained=True, print_path=print_path)
+        full = self.model
+        known = np.array([word in full.vocab for word in corpus.vocabulary], dtype=bool)
+        corpus_rows = [
+            full.vocab[word].index
+            for word, is_known in zip(corpus.vocabulary, known)
+            if is_known
+        ]
+        rows = np.union1d(
+            np.array(corpus_rows, dtype=np.int64),
+            np.arange(min(top_n, len(full.vectors)), dtype=np.int64),
+        )
+
+        # rows stay in the order of the pretrained model (most frequent first)
+        subset = KeyedVectors(full.vector_size)
+        subset.add([full.index2word[row] for row in rows], full.vectors[rows])
+
+        # write to a temporary folder, concurrent processes only see complete subsets
+        folder = store.artifact_path(key, "")
+        tmp_folder = "{}.tmp-{}".format(folder, os.getpid())
+        os.makedirs(tmp_folder, exist_ok=True)
+        subset.save(join(tmp_folder, "subset.kv"), sep_limit=0)
+        if exists(folder):
+            shutil.rmtree(folder, ignore_errors=True)
+        os.replace(tmp_folder, folder)
+        path = join(folder, "subset.kv")
+        if print_path:
+            counts = np.bincount(corpus.ids, minlength=len(corpus.vocabulary))
+            print(
+                "Save pretrained subset of {} words ({:.1%} of corpus tokens known) to: {}".format(
+                    len(rows), counts[known].sum() / max(counts.sum(), 1), path
+                )
+            )
+
+        # register the subset and remove old artifacts exceeding the disk quota
+        store.add(key, folder)
+        store.evict()
+        return path
+
+    def load_pretrained(self, print_path=True):
+        """Load the pretrained wordvectors, restricted to the corpus vocabulary and top_n most frequent words (see restrict_pretrained)."""
+        if self.top_n is None or self.corpus is None:
+            self.load_model(pretrained=True, print_path=print_path)
+        else:
+            path = self.restrict_pretrained(self.corpus, self.top_n, print_path)
+            self.model = KeyedVectors.load(path, mmap="r")
+            # vectors are normalized already, similarity queries must not copy them
+            self.model.vectors_norm = self.model.vectors
+            if print_path:
+                print("Load pretrained word2vec subset from: {}".format(path))
+        self.wv = self.model.wv
+
     def load_model(self, pretrained=False, print_path=True):
         """Load word2vec model"""
         if pretrained:
-            self.model = KeyedVectors.load_word2vec_format(
-                self.pretrained_path, binary=True
-            )
+            if not exists(self.pretrained_native_path):
+                self.convert_pretrained(print_path)
+            self.model = KeyedVectors.load(self.pretrained_native_path, mmap="r")
+            # vectors are normalized already, similarity queries must not copy them
+            self.model.vectors_norm = self.model.vectors
             if print_path:
                 print(
                     "Load pretrained word2vec model from: {}".format(
-                        self.pretrained_path
+                        self.pretrained_native_path
                     )
                 )
         else:
@@ -155,7 +356,10 @@ class word2vec:
                 print("Load word2vec model from: {}".format(self.model_path))
 
     def load_wv(self, pretrained=False, print_path=True):
-        """Load wordvectors"""
+        """Load wordvectors (memory-mapped)"""
+        if pretrained or self.pretrained:
+            self.load_pretrained(print_path)
+            return
 
         self.wv = KeyedVectors.load(self.wv_path, mmap="r")
         if print_path:
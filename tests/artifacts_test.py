@@ -0,0 +1,92 @@
+import os
+import shutil
+import sys
+import tempfile
+import unittest
+from os.path import abspath, dirname, exists, join
+
+sys.path.insert(0, join(dirname(dirname(abspath(__file__))), "src"))
+
+from utils import artifacts  # noqa: E402
+
+
+class ArtifactStoreTest(unittest.TestCase):
+    def setUp(self):
+        self.folder = tempfile.mkdtemp()
+        self.store = artifacts.ArtifactStore(self.folder, quota=1000)
+
+    def tearDown(self):
+        shutil.rmtree(self.folder, ignore_errors=True)
+
+    def write_artifact(self, key, size=100):
+        path = self.store.artifact_path(key)
+        with open(path, "wb") as file:
+            file.write(b"0" * size)
+        self.store.add(key, path, {"test_size": 0.1})
+        return path
+
+    def test_lookup(self):
+        """Added artifacts are found by their key and their aliases."""
+        self.assertIsNone(self.store.lookup("abc"))
+        path = self.write_artifact("abc")
+
+        self.assertEqual(self.store.lookup("abc"), path)
+        self.assertIsNone(self.store.resolve("example.h5"))
+        self.store.alias("example.h5", "abc")
+        self.assertEqual(self.store.resolve("example.h5"), path)
+
+        # artifacts deleted by hand are not found
+        os.remove(path)
+        self.assertIsNone(self.store.lookup("abc"))
+        self.assertIsNone(self.store.resolve("example.h5"))
+
+    def test_rekey(self):
+        """Rekeyed artifacts are moved and all their aliases follow them."""
+        old_path = self.write_artifact("abc")
+        self.store.alias("example.h5", "abc")
+        self.store.alias("other.h5", "abc")
+
+        path = self.store.rekey("example.h5", "def", {"test_size": 0.2})
+        self.assertEqual(path, join(self.folder, "def.h5"))
+        self.assertTrue(exists(path))
+        self.assertFalse(exists(old_path))
+
+        self.assertIsNone(self.store.lookup("abc"))
+        self.assertEqual(self.store.lookup("def"), path)
+        self.assertEqual(self.store.resolve("example.h5"), path)
+        self.assertEqual(self.store.resolve("other.h5"), path)
+        self.assertEqual(
+            self.store._load_index()["artifacts"]["def"]["options"], {"test_size": 0.2}
+        )
+
+        self.assertIsNone(self.store.rekey("missing.h5", "ghi"))
+
+    def test_appended_key(self):
+        """Appending rows changes the key, appending the same rows gives the same key."""
+        path = join(self.folder, "abc.h5")
+        key = artifacts.appended_key(path, ["1", "2"])
+        self.assertEqual(key, artifacts.appended_key(path, ["1", "2"]))
+        self.assertNotEqual(key, artifacts.appended_key(path, ["1", "3"]))
+        self.assertNotEqual(key, "abc")
+
+    def test_evict(self):
+        """Least recently used artifacts are removed until the quota is met."""
+        paths = [self.write_artifact(key, 400) for key in ["a", "b", "c"]]
+        self.store.alias("a.h5", "a")
+        self.store.lookup("a")
+
+        self.store.evict()
+        self.assertFalse(exists(paths[1]))
+        self.assertIsNone(self.store.lookup("b"))
+        self.assertEqual(self.store.resolve("a.h5"), paths[0])
+        self.assertEqual(self.store.lookup("c"), paths[2])
+
+        # the most recently used artifact is kept even if it exceeds the quota
+        self.store.lookup("c")
+        self.store.evict(quota=0)
+        self.assertEqual(list(self.store._load_index()["artifacts"]), ["c"])
+        self.assertTrue(exists(paths[2]))
+
+
+if __name__ == "__main__":
+    unittest.main()
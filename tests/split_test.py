@@ -0,0 +1,115 @@
+import shutil
+import sys
+import tempfile
+import unittest
+from os.path import abspath, dirname, exists, join
+
+import numpy as np
+import pandas as pd
+
+sys.path.insert(0, join(dirname(dirname(abspath(__file__))), "src"))
+
+from utils import split  # noqa: E402
+
+
+def example_rows(num_rows, offset=0):
+    """Row hashes, sources and ratings of num_rows sentences."""
+    hashes = split.row_hashes(["Satz {}".format(i + offset) for i in range(num_rows)])
+    sources = np.zeros(num_rows, dtype=np.int8)
+    ratings = 1 + (np.arange(offset, offset + num_rows) * 0.37) % 6
+    return hashes, sources, ratings
+
+
+class SplitManifestTest(unittest.TestCase):
+    def setUp(self):
+        self.split_path = split.SPLIT_PATH
+        split.SPLIT_PATH = tempfile.mkdtemp()
+
+    def tearDown(self):
+        shutil.rmtree(split.SPLIT_PATH, ignore_errors=True)
+        split.SPLIT_PATH = self.split_path
+
+    def test_stratified(self):
+        """Every rating bin gets round(test_size * size) test rows."""
+        hashes, sources, ratings = example_rows(1000)
+        rows = split.assign_splits(hashes, sources, ratings, 0.1, 0)
+
+        self.assertEqual(list(rows["row_hash"].sort_values()), sorted(hashes))
+        for _, stratum in rows.groupby(["source", "bin"]):
+            self.assertEqual(
+                (stratum["split"] == "test").sum(), np.floor(0.1 * len(stratum) + 0.5)
+            )
+
+    def test_deterministic(self):
+        """The split only depends on the rows and the seed, not on their order."""
+        hashes, sources, ratings = example_rows(500)
+        manifest = split.assign_splits(hashes, sources, ratings, 0.1, 0).set_index(
+            "row_hash"
+        )["split"]
+        order = np.random.RandomState(1).permutation(500)
+        shuffled = split.assign_splits(
+            hashes[order], sources[order], ratings[order], 0.1, 0
+        ).set_index("row_hash")["split"]
+        other_seed = split.assign_splits(hashes, sources, ratings, 0.1, 1).set_index(
+            "row_hash"
+        )["split"]
+
+        self.assertTrue(manifest.equals(shuffled.reindex(manifest.index)))
+        self.assertFalse(manifest.equals(other_seed.reindex(manifest.index)))
+
+    def test_extend_manifest(self):
+        """Rows already in the manifest keep their split when rows are added."""
+        hashes, sources, ratings = example_rows(600)
+        manifest = split.extend_manifest(hashes, sources, ratings, 0.1, 0)
+        self.assertTrue(manifest.equals(split.load_manifest(0.1, 0)))
+
+        new_hashes, new_sources, new_ratings = example_rows(400, offset=600)
+        extended = split.extend_manifest(
+            np.concatenate([hashes, new_hashes]),
+            np.concatenate([sources, new_sources]),
+            np.concatenate([ratings, new_ratings]),
+            0.1,
+            0,
+        )
+        self.assertEqual(len(extended), 1000)
+        self.assertTrue(manifest.equals(extended.reindex(manifest.index)))
+
+        # the strata are still stratified (up to the rounding of both batches)
+        rows = split._load_rows(0.1, 0)
+        for _, stratum in rows.groupby(["source", "bin"]):
+            num_test = (stratum["split"] == "test").sum()
+            self.assertLessEqual(abs(num_test - 0.1 * len(stratum)), 1)
+
+    def test_extend_manifest_unsaved(self):
+        """save=False returns the same assignment without writing the manifest."""
+        hashes, sources, ratings = example_rows(100)
+        unsaved = split.extend_manifest(hashes, sources, ratings, 0.1, 0, save=False)
+        self.assertFalse(exists(split.manifest_path(0.1, 0)))
+        self.assertEqual(len(split.load_manifest(0.1, 0)), 0)
+
+        saved = split.extend_manifest(hashes, sources, ratings, 0.1, 0)
+        self.assertTrue(unsaved.equals(saved))
+
+    def test_split_rows(self):
+        """Only rows of source 0 are split, the other rows are always trained on."""
+        df = pd.DataFrame(
+            {
+                "raw_text": ["Satz {}".format(i) for i in range(200)],
+                "rating": np.linspace(1, 7, 200),
+                "source": np.array([0, 1] * 100, dtype=np.int8),
+            }
+        )
+        splits = split.split_rows(df, 0.1, 0)
+
+        self.assertTrue((splits[df["source"] == 1] == "train").all())
+        bins = split.rating_bins(df["rating"][df["source"] == 0])
+        self.assertEqual(
+            (splits == "test").sum(),
+            sum(np.floor(0.1 * count + 0.5) for count in np.bincount(bins) if count),
+        )
+        self.assertEqual(len(split.load_manifest(0.1, 0)), 100)
+        np.testing.assert_array_equal(split.split_rows(df, 0.1, 0), splits)
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,266 @@
+import shutil
+import sys
+import tempfile
+import unittest
+from os.path import abspath, dirname, join
+
+import numpy as np
+import pandas as pd
+
+sys.path.insert(0, join(dirname(dirname(abspath(__file__))), "src"))
+
+from utils import dataset, storage  # noqa: E402
+
+
+def example_frame(num_rows, offset=0):
+    """Dataframe with the columns of a stored dataset and alternating sources."""
+    return pd.DataFrame(
+        {
+            "raw_text": ["Satz {}".format(i + offset) for i in range(num_rows)],
+            "rating": np.linspace(1, 7, num_rows).astype(np.float32),
+            "source": np.array([0, 2] * num_rows, dtype=np.int8)[:num_rows],
+        }
+    )
+
+
+class BackendTests:
+    """Round trip tests run for every storage backend (see the subclasses)."""
+
+    filename = None
+
+    def backend(self):
+        return storage.get_backend(self.filename)
+
+    def setUp(self):
+        self.folder = tempfile.mkdtemp()
+        self.path = join(self.folder, self.filename)
+        self.train = example_frame(100)
+        self.test = example_frame(10, offset=100)
+        self.backend().write(self.path, {"train": self.train, "test": self.test})
+
+    def tearDown(self):
+        shutil.rmtree(self.folder, ignore_errors=True)
+
+    def stored(self, df):
+        """Return df in the row order of the backend."""
+        return df
+
+    def assertTexts(self, df, expected):
+        self.assertEqual(list(df["raw_text"]), list(expected["raw_text"]))
+
+    def test_write_read(self):
+        """All rows and columns are read back in the written order."""
+        backend = storage.get_backend(self.path)
+        self.assertEqual(backend.keys(self.path), ["test", "train"])
+        self.assertEqual(backend.columns(self.path, "train"), list(self.train.columns))
+        self.assertEqual(backend.nrows(self.path, "train"), 100)
+
+        df = backend.read(self.path, "train")
+        self.assertTexts(df, self.stored(self.train))
+        np.testing.assert_allclose(df["rating"], self.stored(self.train)["rating"])
+        self.assertTexts(backend.read(self.path, "test"), self.stored(self.test))
+
+    def test_read_columns_sources(self):
+        """Only the selected columns and sources are read."""
+        backend = storage.get_backend(self.path)
+        df = backend.read(self.path, "train", columns=["raw_text"], sources=[2])
+        self.assertEqual(list(df.columns), ["raw_text"])
+        self.assertTexts(df, self.train[self.train["source"] == 2])
+        self.assertEqual(backend.nrows(self.path, "train", sources=[2]), 50)
+
+    def test_read_slice(self):
+        """start and stop select rows of the whole dataframe."""
+        df = storage.get_backend(self.path).read(self.path, "train", start=95)
+        self.assertTexts(df, self.stored(self.train).iloc[95:])
+
+    def test_read_sources_slice(self):
+        """start and stop refer to the rows of the selected sources."""
+        backend = storage.get_backend(self.path)
+        expected = self.train[self.train["source"] == 2]
+        for start, stop in [(10, 15), (0, 1), (45, None), (None, 3), (-5, None)]:
+            df = backend.read(self.path, "train", sources=[2], start=start, stop=stop)
+            self.assertTexts(df, expected.iloc[start:stop])
+
+    def test_read_empty_slice(self):
+        """Empty slices of the selected sources return no rows."""
+        backend = storage.get_backend(self.path)
+        for sources, start, stop in [([0], 50, None), ([1], 0, 10), ([0], 5, 3)]:
+            df = backend.read(
+                self.path, "train", sources=sources, start=start, stop=stop
+            )
+            self.assertEqual(len(df), 0)
+        self.assertEqual(backend.nrows(self.path, "train", sources=[1]), 0)
+
+    def test_lazy_dataset(self):
+        """Row slices of a per-source view only contain rows of the source."""
+        view = dataset.LazyDataset(self.path, "train").by_source(0)
+        self.assertEqual(len(view), 50)
+        self.assertTexts(
+            view.rows(10, 20), self.train[self.train["source"] == 0][10:20]
+        )
+        self.assertEqual(len(view.rows(50, 60)), 0)
+
+    def test_iterate(self):
+        """Chunks contain every (selected) row exactly once."""
+        backend = storage.get_backend(self.path)
+        chunks = list(backend.iterate(self.path, "train", 30))
+        self.assertTrue(all(len(chunk) <= 30 for chunk in chunks))
+        self.assertEqual(
+            sorted(pd.concat(chunks)["raw_text"]), sorted(self.train["raw_text"])
+        )
+
+        chunks = list(backend.iterate(self.path, "train", 30, ["raw_text"], [0]))
+        df = pd.concat(chunks)
+        self.assertEqual(list(df.columns), ["raw_text"])
+        self.assertEqual(
+            sorted(df["raw_text"]),
+            sorted(self.train[self.train["source"] == 0]["raw_text"]),
+        )
+
+    def test_metadata(self):
+        backend = storage.get_backend(self.path)
+        backend.set_metadata(self.path, {"version": 2})
+        self.assertEqual(backend.metadata(self.path), {"version": 2})
+
+
+class HDF5BackendTest(BackendTests, unittest.TestCase):
+    filename = "example.h5"
+
+    def test_append(self):
+        """Appended rows follow the existing rows."""
+        backend = storage.get_backend(self.path)
+        new_rows = example_frame(5, offset=200)
+        backend.check_append(self.path, "train", new_rows)
+        backend.append(self.path, "train", new_rows)
+
+        self.assertTexts(
+            backend.read(self.path, "train"),
+            pd.concat([self.train, new_rows], ignore_index=True),
+        )
+        self.assertEqual(backend.nrows(self.path, "train"), 105)
+
+    def test_append_empty(self):
+        """Empty frames create an empty table with the columns of the frame."""
+        backend = storage.get_backend(self.path)
+        backend.append(self.path, "empty", self.train.iloc[0:0])
+        self.assertIn("empty", backend.keys(self.path))
+        self.assertEqual(len(backend.read(self.path, "empty")), 0)
+        self.assertEqual(backend.columns(self.path, "empty"), list(self.train.columns))
+
+    def test_check_append(self):
+        """Texts longer than the text column are refused before appending."""
+        backend = storage.get_backend(self.path)
+        long_text = example_frame(1, offset=200).assign(raw_text="lang " * 2000)
+        with self.assertRaises(ValueError):
+            backend.check_append(self.path, "train", long_text)
+        self.assertEqual(backend.nrows(self.path, "train"), 100)
+
+
+class ParquetBackendTest(BackendTests, unittest.TestCase):
+    filename = "example.parquet"
+
+    def stored(self, df):
+        # rows are grouped by source
+        return df.sort_values("source", kind="mergesort")
+
+    def test_check_append(self):
+        """Parquet files can not be appended to, which is known before appending."""
+        with self.assertRaises(ValueError):
+            storage.get_backend(self.path).check_append(
+                self.path, "train", example_frame(2, offset=200)
+            )
+
+    def test_read_row_groups(self):
+        """Slices spanning several row groups of several sources."""
+        storage.ParquetBackend(row_group_size=7).write(self.path, {"train": self.train})
+        backend = storage.get_backend(self.path)
+        stored = self.stored(self.train)
+        self.assertTexts(
+            backend.read(self.path, "train", start=5, stop=60), stored.iloc[5:60]
+        )
+        self.assertTexts(
+            backend.read(self.path, "train", sources=[0, 2], start=40, stop=70),
+            stored.iloc[40:70],
+        )
+        self.assertTexts(
+            backend.read(self.path, "train", sources=[2], start=3, stop=20),
+            stored[stored["source"] == 2].iloc[3:20],
+        )
+
+
+class ShardedBackendTest(BackendTests, unittest.TestCase):
+    filename = "example.h5.shards"
+
+    def backend(self):
+        return storage.ShardedBackend(num_shards=3)
+
+    def test_append(self):
+        """Appended rows follow the existing rows and update the manifest."""
+        backend = storage.get_backend(self.path)
+        new_rows = example_frame(5, offset=200)
+        backend.check_append(self.path, "train", new_rows)
+        backend.append(self.path, "train", new_rows)
+
+        expected = pd.concat([self.train, new_rows], ignore_index=True)
+        self.assertTexts(backend.read(self.path, "train"), expected)
+        self.assertEqual(backend.nrows(self.path, "train"), 105)
+
+        # the shards hold 34, 34 and 32 rows, the next rows go to the smallest shard
+        more_rows = example_frame(2, offset=300)
+        backend.append(self.path, "train", more_rows)
+        self.assertTexts(
+            backend.read(self.path, "train", columns=["raw_text"]),
+            pd.concat([expected, more_rows], ignore_index=True),
+        )
+        self.assertEqual(
+            sorted(backend._load_manifest(self.path)["rows"]["train"]), [34, 36, 37]
+        )
+
+    def test_shards(self):
+        """Shards are balanced and keep the source proportions."""
+        backend = storage.get_backend(self.path)
+        for index in range(3):
+            shard = backend.read_shard(self.path, index, "train")
+            self.assertIn(len(shard), [32, 34])
+            self.assertLessEqual(abs((shard["source"] == 0).sum() * 2 - len(shard)), 2)
+
+
+class ShardedParquetBackendTest(BackendTests, unittest.TestCase):
+    filename = "example.parquet.shards"
+
+    def backend(self):
+        return storage.ShardedBackend(num_shards=3, shard_extension=".parquet")
+
+    def test_check_append(self):
+        """Sharded parquet files can not be appended to either."""
+        backend = storage.get_backend(self.path)
+        with self.assertRaises(ValueError):
+            backend.check_append(self.path, "train", example_frame(2, offset=200))
+        with self.assertRaises(ValueError):
+            backend.append(self.path, "train", example_frame(2, offset=200))
+        self.assertEqual(backend.nrows(self.path, "train"), 100)
+
+
+class ConvertTest(unittest.TestCase):
+    def test_convert(self):
+        """Converted datasets contain the same rows and metadata."""
+        folder = tempfile.mkdtemp()
+        try:
+            src_path = join(folder, "example.h5")
+            dst_path = join(folder, "example.parquet")
+            storage.HDF5Backend().write(src_path, {"train": example_frame(20)})
+            storage.HDF5Backend().set_metadata(src_path, {"version": 3})
+            storage.convert(src_path, dst_path)
+
+            backend = storage.get_backend(dst_path)
+            self.assertEqual(
+                sorted(backend.read(dst_path, "train")["raw_text"]),
+                sorted(example_frame(20)["raw_text"]),
+            )
+            self.assertEqual(backend.metadata(dst_path), {"version": 3})
+        finally:
+            shutil.rmtree(folder, ignore_errors=True)
+
+
+if __name__ == "__main__":
+    unittest.main()